@@ -1,7 +1,15 @@
+import asyncio
 import os
+from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from bot.utils.states import AdminStates
+from bot.services.delivery import PREVIEW_FILE_ID_FIELD, send_request_file
+from bot.services.lazy_files import UPLOAD_LAZY
+from bot.services.uploads import UploadRejected
+from bot.services.export import EXPORT_FORMATS, FORMAT_COLUMNAR, FORMAT_CSV, FORMAT_XLSX
+from bot.services.render_cache import VIEW_REQUESTS, VIEW_ARCHIVE
+from bot.services.query import offset_cursor
 
 async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Главное меню администратора"""
@@ -18,7 +26,8 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [InlineKeyboardButton("📋 Текущие заявки", callback_data='view_requests')],
         [InlineKeyboardButton("📦 Архив заявок", callback_data='view_archive')],
-        [InlineKeyboardButton("📤 Выгрузить в Excel", callback_data='export_excel')],
+        [InlineKeyboardButton("🖨 Принтеры", callback_data='view_printers')],
+        [InlineKeyboardButton("📤 Выгрузка", callback_data='export_menu')],
         [InlineKeyboardButton("🗑️ Очистить старые заявки", callback_data='cleanup_requests')],
         [InlineKeyboardButton("📝 Управление группами", callback_data='manage_groups')],
         [InlineKeyboardButton("🎯 Управление целями печати", callback_data='manage_purposes')],
@@ -32,6 +41,142 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return AdminStates.VIEW_REQUESTS
 
+# Состояние списка заявок в callback_data: rq:<статус>.<группа>.<цель>.<порядок>.<курсор>
+LIST_STATUSES = {'-': None, 'q': 'В очереди', 'w': 'В работе', 'd': 'Готово'}
+LIST_STATUS_LABELS = {'-': 'все', 'q': '⚪', 'w': '🟡', 'd': '🟢'}
+DEFAULT_LIST_STATE = '-.-.-.a.'
+CALLBACK_DATA_LIMIT = 64
+
+def _parse_list_state(state: str) -> dict:
+    status, group, purpose, order, cursor = state.split('.', 4)
+    return {'status': status, 'group': group, 'purpose': purpose, 'order': order, 'cursor': cursor}
+
+def _check_callback(data: str) -> str:
+    if len(data.encode()) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {data}")
+    return data
+
+def _list_callback(state: dict, **changes) -> str:
+    """callback_data экрана списка с изменёнными параметрами (смена фильтра сбрасывает курсор)"""
+    new_state = {**state, 'cursor': '', **changes}
+    return _check_callback("rq:" + '.'.join(new_state[k] for k in ('status', 'group', 'purpose', 'order', 'cursor')))
+
+def _page_callback(make, cursor: str, offset: int) -> str:
+    """Кнопка соседней страницы; курсор с длинным id заявки не влезает в 64 байта — тогда смещение"""
+    try:
+        return make(cursor)
+    except ValueError:
+        return make(offset_cursor(offset))
+
+def _lists_changed(context: ContextTypes.DEFAULT_TYPE):
+    """Группы или цели изменились: фильтры в кнопках списка — их номера, кэш страниц устарел"""
+    context.bot_data['render_cache'].invalidate(VIEW_REQUESTS)
+
+def _cycle(value: str, options: list) -> str:
+    """Следующее значение фильтра по кругу: все → первое → … → последнее → все"""
+    if value == '-':
+        return options[0] if options else '-'
+    index = options.index(value) + 1 if value in options else len(options)
+    return options[index] if index < len(options) else '-'
+
+def _list_filters(state: dict, groups: list, purposes: list) -> dict:
+    def pick(values, index):
+        return values[int(index)] if index != '-' and int(index) < len(values) else None
+
+    return {
+        'status': LIST_STATUSES.get(state['status']),
+        'group': pick(groups, state['group']),
+        'purpose': pick(purposes, state['purpose']),
+    }
+
+async def _render_requests_page(db, state: dict, groups: list, purposes: list):
+    """Текст и кнопки одной страницы списка заявок (из БД берётся только эта страница)"""
+    filters = _list_filters(state, groups, purposes)
+    result = await db.query(
+        filters,
+        order='asc' if state['order'] == 'a' else 'desc',
+        cursor=state['cursor'] or None,
+        limit=5
+    )
+    
+    text = f"📋 Список заявок ({result['total']} шт.):\n"
+    active = [v for v in (filters['status'], filters['group'], filters['purpose']) if v]
+    if active:
+        text += f"🔎 {' | '.join(active)}\n"
+    text += "\n"
+    
+    if not result['items']:
+        text += "Заявок нет."
+    
+    keyboard = []
+    
+    for req in result['items']:
+        status_emoji = {
+            'В очереди': '⚪',
+            'В работе': '🟡',
+            'Готово': '🟢'
+        }.get(req.get('status', ''), '⚪')
+        
+        user_info = f"@{req.get('username', 'нет')}" if req.get('username') else "нет username"
+        
+        text += (
+            f"{status_emoji} #{req.get('id')[:8]}\n"
+            f"👤 {req.get('first_name')} {req.get('last_name')}\n"
+            f"🔗 {user_info}\n"
+            f"📚 {req.get('group')} | 🎯 {req.get('purpose')}\n"
+            f"📅 {req.get('date')}\n"
+            f"───────────────\n"
+        )
+        
+        # Кнопка для детального просмотра
+        keyboard.append([
+            InlineKeyboardButton(
+                f"📄 Детали #{req.get('id')[:6]}",
+                callback_data=f"detail_{req.get('id')}"
+            )
+        ])
+    
+    # Навигация
+    nav_buttons = []
+    make = lambda cursor: _list_callback(state, cursor=cursor)
+    if result['prev']:
+        prev_data = _page_callback(make, result['prev'], max(result['offset'] - 5, 0))
+        nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=prev_data))
+    if result['next']:
+        next_data = _page_callback(make, result['next'], result['offset'] + len(result['items']))
+        nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=next_data))
+    
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    
+    # Фильтры переключаются по кругу
+    group_indexes = [str(i) for i in range(len(groups))]
+    purpose_indexes = [str(i) for i in range(len(purposes))]
+    keyboard.append([
+        InlineKeyboardButton(
+            f"Статус: {LIST_STATUS_LABELS[state['status']]}",
+            callback_data=_list_callback(state, status=_cycle(state['status'], ['q', 'w', 'd']))
+        ),
+        InlineKeyboardButton(
+            "Сначала новые" if state['order'] == 'a' else "Сначала старые",
+            callback_data=_list_callback(state, order='d' if state['order'] == 'a' else 'a')
+        ),
+    ])
+    keyboard.append([
+        InlineKeyboardButton(
+            f"Группа: {filters['group'] or 'все'}",
+            callback_data=_list_callback(state, group=_cycle(state['group'], group_indexes))
+        ),
+        InlineKeyboardButton(
+            f"Цель: {filters['purpose'] or 'все'}",
+            callback_data=_list_callback(state, purpose=_cycle(state['purpose'], purpose_indexes))
+        ),
+    ])
+    
+    keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')])
+    
+    return text, keyboard
+
 async def view_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Просмотр текущих заявок"""
     query = update.callback_query
@@ -44,68 +189,26 @@ async def view_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     try:
-        requests = db.get_all_requests()
-        
-        if not requests:
-            keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')]]
-            await query.edit_message_text(
-                "📋 Заявок пока нет.",
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            return AdminStates.VIEW_REQUESTS
-        
-        page = context.user_data.get('page', 0)
-        items_per_page = 5
-        
-        start_idx = page * items_per_page
-        end_idx = start_idx + items_per_page
-        page_requests = requests[start_idx:end_idx]
-        
-        text = "📋 Список заявок:\n\n"
-        
-        keyboard = []
-        
-        for req in page_requests:
-            status_emoji = {
-                'В очереди': '⚪',
-                'В работе': '🟡',
-                'Готово': '🟢'
-            }.get(req.get('status', ''), '⚪')
-            
-            user_info = f"@{req.get('username', 'нет')}" if req.get('username') else "нет username"
-            
-            text += (
-                f"{status_emoji} #{req.get('id')[:8]}\n"
-                f"👤 {req.get('first_name')} {req.get('last_name')}\n"
-                f"🔗 {user_info}\n"
-                f"📚 {req.get('group')} | 🎯 {req.get('purpose')}\n"
-                f"📅 {req.get('date')}\n"
-                f"───────────────\n"
-            )
-            
-            # Кнопка для детального просмотра
-            keyboard.append([
-                InlineKeyboardButton(
-                    f"📄 Детали #{req.get('id')[:6]}",
-                    callback_data=f"detail_{req.get('id')}"
-                )
-            ])
-        
-        # Навигация
-        nav_buttons = []
-        if page > 0:
-            nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data='prev_page'))
-        if end_idx < len(requests):
-            nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data='next_page'))
+        # Фильтры и курсор приходят в callback_data; иначе возвращаемся туда, где админ был
+        if query.data.startswith('rq:'):
+            context.user_data['requests_view'] = query.data[3:]
+        state = _parse_list_state(context.user_data.get('requests_view', DEFAULT_LIST_STATE))
+        groups = context.bot_data.get('groups', [])
+        purposes = context.bot_data.get('purposes', [])
         
-        if nav_buttons:
-            keyboard.append(nav_buttons)
+        cache = context.bot_data['render_cache']
+        filters = _list_filters(state, groups, purposes)
+        owner = (filters['status'], filters['group'], filters['purpose'], state['order'])
         
-        keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        # Страница общая для всех админов и сбрасывается при изменении заявок
+        rendered = cache.get(VIEW_REQUESTS, owner, state['cursor'])
+        if rendered is None:
+            generation = cache.generation(VIEW_REQUESTS)
+            rendered = await _render_requests_page(db, state, groups, purposes)
+            cache.put(VIEW_REQUESTS, owner, state['cursor'], rendered, generation)
+        text, keyboard = rendered
         
-        await query.edit_message_text(text, reply_markup=reply_markup)
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
         
     except Exception as e:
         print(f"Ошибка при просмотре заявок: {e}")
@@ -113,6 +216,20 @@ async def view_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return AdminStates.VIEW_REQUESTS
 
+def format_model_stats(stats: dict) -> str:
+    """Геометрия модели для карточки заявки"""
+    x, y, z = stats.get('size_mm', [0, 0, 0])
+    minutes = stats.get('estimated_minutes', 0)
+    text = (
+        f"\n📐 Габариты: {x} × {y} × {z} мм\n"
+        f"🧊 Объём: {stats.get('volume_cm3')} см³ | Площадь: {stats.get('area_cm2')} см²\n"
+        f"🔺 Треугольников: {stats.get('triangles')}\n"
+        f"⏱ Оценка печати: ~{minutes // 60} ч {minutes % 60} мин\n"
+    )
+    if stats.get('fits_printer') is False:
+        text += "⚠️ Модель не помещается на стол принтера!\n"
+    return text
+
 async def view_request_detail(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Детальный просмотр заявки"""
     query = update.callback_query
@@ -121,7 +238,7 @@ async def view_request_detail(update: Update, context: ContextTypes.DEFAULT_TYPE
     request_id = query.data.split('_')[1]
     db = context.bot_data.get('db')
     
-    request_data = db.get_request_by_id(request_id)
+    request_data = await db.get_request_by_id(request_id)
     
     if not request_data:
         await query.answer("Заявка не найдена!")
@@ -147,6 +264,25 @@ async def view_request_detail(update: Update, context: ContextTypes.DEFAULT_TYPE
         f"📎 Файл: {request_data.get('file_name', 'нет')}\n"
     )
     
+    stats = request_data.get('model_stats')
+    if stats:
+        text += format_model_stats(stats)
+    if request_data.get('fetch_error'):
+        text += f"⚠️ Файл не прошёл проверку: {request_data['fetch_error']}\n"
+    elif request_data.get('upload_mode') == UPLOAD_LAZY and not request_data.get('file_hash'):
+        text += "☁️ Модель ещё в Telegram — скачается для превью или перед печатью\n"
+    
+    if request_data.get('printer'):
+        text += f"🖨 Принтер: {request_data['printer']}\n"
+    # Место и ожидаемое начало — та же оценка, что видит пользователь
+    queue_info = context.bot_data['queue_scheduler'].position(request_id)
+    if queue_info:
+        printer = f"{queue_info['printer']} " if queue_info['printer'] else ""
+        text += (
+            f"🔢 Место в очереди: {queue_info['position'] + 1}, "
+            f"{printer}~{queue_info['start']:%d.%m %H:%M}\n"
+        )
+    
     if comment:
         text += f"\n💬 Комментарий: {comment}\n"
     
@@ -164,6 +300,8 @@ async def view_request_detail(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Кнопки для всех статусов
     # СТАЛО:
+    if request_data.get('file_hash') or (request_data.get('upload_mode') == UPLOAD_LAZY and not request_data.get('fetch_error')):
+        keyboard.append([InlineKeyboardButton("🖼 Превью модели", callback_data=f"preview_{request_id}")])
     keyboard.append([InlineKeyboardButton("📥 Получить файл", callback_data=f"send_file_admin_{request_id}")])
     keyboard.append([InlineKeyboardButton("💬 Добавить комментарий", callback_data=f"add_comment_{request_id}")])
     
@@ -178,6 +316,16 @@ async def view_request_detail(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     return AdminStates.VIEW_REQUESTS
 
+async def open_request_from_notification(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Открыть заявку по кнопке из уведомления (вход в панель администратора)"""
+    from bot.utils.config import ADMIN_CHAT_IDS
+
+    if update.effective_user.id not in ADMIN_CHAT_IDS:
+        await update.callback_query.answer("У вас нет прав администратора.")
+        return ConversationHandler.END
+
+    return await view_request_detail(update, context)
+
 async def accept_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Принять заявку в работу"""
     query = update.callback_query
@@ -187,9 +335,15 @@ async def accept_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db = context.bot_data.get('db')
     
     try:
-        db.update_status(request_id, 'В работе')
+        # Второй админ мог уже сменить статус — тогда ничего не трогаем
+        if not await db.update_status(request_id, 'В работе', expected_status='В очереди'):
+            await query.answer("⚠️ Статус заявки уже изменён другим администратором.")
+            await view_request_detail(update, context)
+            return AdminStates.VIEW_REQUESTS
         
-        request_data = db.get_request_by_id(request_id)
+        await _assign_printer(context, request_id)
+        
+        request_data = await db.get_request_by_id(request_id)
         if request_data and request_data.get('telegram_id'):
             try:
                 await context.bot.send_message(
@@ -220,9 +374,13 @@ async def complete_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db = context.bot_data.get('db')
     
     try:
-        db.update_status(request_id, 'Готово')
+        # Второй админ мог уже сменить статус — тогда ничего не трогаем
+        if not await db.update_status(request_id, 'Готово', expected_status='В работе'):
+            await query.answer("⚠️ Статус заявки уже изменён другим администратором.")
+            await view_request_detail(update, context)
+            return AdminStates.VIEW_REQUESTS
         
-        request_data = db.get_request_by_id(request_id)
+        request_data = await db.get_request_by_id(request_id)
         if request_data and request_data.get('telegram_id'):
             try:
                 comment = request_data.get('comment', '')
@@ -258,7 +416,7 @@ async def archive_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     db = context.bot_data.get('db')
     
     try:
-        if db.archive_request(request_id):
+        if await db.archive_request(request_id):
             await query.answer("📦 Заявка перемещена в архив!")
             await view_requests(update, context)
         else:
@@ -287,37 +445,98 @@ async def send_file_to_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.answer("Ошибка: база данных недоступна.")
         return AdminStates.VIEW_REQUESTS
 
-    request_data = db.get_request_by_id(request_id)
+    request_data = await db.get_request_by_id(request_id)
     if not request_data:
         await query.answer("Заявка не найдена!")
         return AdminStates.VIEW_REQUESTS
 
-    file_path = request_data.get('file_path')
-    if not file_path or not os.path.exists(file_path):
-        await query.answer("Файл не найден на сервере!")
-        return AdminStates.VIEW_REQUESTS
-
     admin_chat_id = update.effective_user.id  # Тот, кто нажал кнопку
 
     try:
-        with open(file_path, 'rb') as f:
-            await context.bot.send_document(
-                chat_id=admin_chat_id,
-                document=f,
-                caption=(
-                    f"📎 Файл заявки #{request_id[:8]}\n"
-                    f"👤 {request_data.get('first_name', '')} {request_data.get('last_name', '')}\n"
-                    f"📚 Группа: {request_data.get('group', '—')}\n"
-                    f"🎯 Цель: {request_data.get('purpose', '—')}"
-                )
+        # По file_id из заявки — без повторной загрузки файла с сервера
+        await send_request_file(
+            context.bot,
+            db,
+            request_data,
+            admin_chat_id,
+            caption=(
+                f"📎 Файл заявки #{request_id[:8]}\n"
+                f"👤 {request_data.get('first_name', '')} {request_data.get('last_name', '')}\n"
+                f"📚 Группа: {request_data.get('group', '—')}\n"
+                f"🎯 Цель: {request_data.get('purpose', '—')}"
             )
+        )
         await query.answer("✅ Файл отправлен вам!")
+    except FileNotFoundError:
+        await query.answer("Файл не найден на сервере!")
     except Exception as e:
         print(f"Ошибка при отправке файла админу: {e}")
         await query.answer(f"❌ Ошибка: {e}")
 
     return AdminStates.VIEW_REQUESTS
 
+async def send_model_preview(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отправить админу картинку модели вместо самого .stl"""
+    query = update.callback_query
+    await query.answer()
+
+    request_id = query.data.split('_', 1)[1]
+    db = context.bot_data.get('db')
+
+    request_data = await db.get_request_by_id(request_id)
+    if not request_data:
+        await query.answer("Заявка не найдена!")
+        return AdminStates.VIEW_REQUESTS
+
+    try:
+        lazy_files = context.bot_data.get('lazy_files')
+        if lazy_files and not request_data.get('file_hash'):
+            # Режим lazy: модель ещё не скачана из Telegram
+            request_data = await lazy_files.fetch(request_id)
+        if not request_data.get('file_hash'):
+            await query.answer("Модель недоступна.")
+            return AdminStates.VIEW_REQUESTS
+        file_hash = request_data['file_hash']
+
+        preview_path = None
+        if not request_data.get(PREVIEW_FILE_ID_FIELD):
+            preview_path = context.bot_data['preview_cache'].get(file_hash)
+        if not preview_path and not request_data.get(PREVIEW_FILE_ID_FIELD):
+            # Превью вытеснено из кэша или ещё не готово — строим в пуле процессов
+            file_path = request_data.get('file_path')
+            if (not file_path or not os.path.exists(file_path)) and lazy_files:
+                request_data = await lazy_files.fetch(request_id)
+                file_path = request_data.get('file_path')
+            if not file_path or not os.path.exists(file_path):
+                await query.answer("Файл модели уже удалён с сервера.")
+                return AdminStates.VIEW_REQUESTS
+            future = context.bot_data['model_jobs'].render_preview(
+                file_path, file_hash, request_data.get('stl_format')
+            )
+            preview_path = await asyncio.wrap_future(future)
+
+        await send_request_file(
+            context.bot,
+            db,
+            request_data,
+            update.effective_user.id,
+            caption=(
+                f"🖼 Заявка #{request_id[:8]}\n"
+                f"📎 {request_data.get('file_name', '')}"
+            ),
+            file_path=preview_path,
+            photo=True
+        )
+    except UploadRejected as e:
+        await query.answer(f"❌ Файл не прошёл проверку: {e}")
+    except FileNotFoundError:
+        await query.answer("Превью недоступно, попробуйте ещё раз.")
+    except Exception as e:
+        print(f"Ошибка при отправке превью: {e}")
+        await query.answer(f"❌ Ошибка: {e}")
+
+    return AdminStates.VIEW_REQUESTS
+
 async def start_add_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начать добавление комментария"""
     query = update.callback_query
@@ -343,7 +562,7 @@ async def save_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     db = context.bot_data.get('db')
     
-    if db.add_comment(request_id, comment):
+    if await db.add_comment(request_id, comment):
         await update.message.reply_text(f"✅ Комментарий добавлен!\n\n💬 {comment}")
         
         # Показываем кнопку возврата
@@ -366,7 +585,7 @@ async def start_message_user(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data['message_request_id'] = request_id
     
     db = context.bot_data.get('db')
-    request_data = db.get_request_by_id(request_id)
+    request_data = await db.get_request_by_id(request_id)
     
     user_name = f"{request_data.get('first_name')} {request_data.get('last_name')}"
     
@@ -386,7 +605,7 @@ async def send_message_to_user(update: Update, context: ContextTypes.DEFAULT_TYP
         return ConversationHandler.END
     
     db = context.bot_data.get('db')
-    request_data = db.get_request_by_id(request_id)
+    request_data = await db.get_request_by_id(request_id)
     
     if not request_data or not request_data.get('telegram_id'):
         await update.message.reply_text("Ошибка: не удалось найти пользователя.")
@@ -417,37 +636,123 @@ async def view_archive(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
-    db = context.bot_data.get('db')
-    archive = db.get_archive()
+    # Курсор страницы: ar:<курсор>, новые заявки сверху
+    cursor = query.data[3:] if query.data.startswith('ar:') else ''
     
-    if not archive:
-        keyboard = [[InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')]]
-        await query.edit_message_text(
-            "📦 Архив пуст.",
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        return AdminStates.VIEW_REQUESTS
+    cache = context.bot_data['render_cache']
+    rendered = cache.get(VIEW_ARCHIVE, None, cursor)
+    if rendered is None:
+        generation = cache.generation(VIEW_ARCHIVE)
+        rendered = await _render_archive(context.bot_data.get('db'), cursor)
+        cache.put(VIEW_ARCHIVE, None, cursor, rendered, generation)
+    text, keyboard = rendered
+    
+    await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    return AdminStates.VIEW_REQUESTS
+
+async def _render_archive(db, cursor: str):
+    """Текст и кнопки страницы архива"""
+    result = await db.query(order='desc', cursor=cursor or None, limit=10, archived=True)
+    keyboard = []
     
-    text = f"📦 Архив заявок ({len(archive)} шт.):\n\n"
+    if not result['total']:
+        keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')])
+        return "📦 Архив пуст.", keyboard
+    
+    text = f"📦 Архив заявок ({result['total']} шт.):\n\n"
     
-    for req in archive[-10:]:  # Последние 10 заявок
+    for req in result['items']:
         text += (
             f"#{req.get('id')[:8]} | {req.get('first_name')} {req.get('last_name')}\n"
             f"📅 {req.get('archived_date', 'н/д')}\n"
             f"───────────────\n"
         )
     
-    if len(archive) > 10:
-        text += f"\n... и еще {len(archive) - 10} заявок"
+    nav_buttons = []
+    make = lambda cursor: _check_callback(f"ar:{cursor}")
+    if result['prev']:
+        prev_data = _page_callback(make, result['prev'], max(result['offset'] - 10, 0))
+        nav_buttons.append(InlineKeyboardButton("◀️ Новее", callback_data=prev_data))
+    if result['next']:
+        next_data = _page_callback(make, result['next'], result['offset'] + len(result['items']))
+        nav_buttons.append(InlineKeyboardButton("Старее ▶️", callback_data=next_data))
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    
+    keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')])
+    return text, keyboard
+
+async def _assign_printer(context: ContextTypes.DEFAULT_TYPE, request_id: str, printer: str = None):
+    """Запомнить в заявке принтер и время начала (переживают перезапуск бота)"""
+    printer = printer or context.bot_data['queue_scheduler'].printer_of(request_id)
+    await context.bot_data['db'].update_fields(request_id, {
+        'printer': printer,
+        'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+async def view_printers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Загрузка принтеров и запуск следующей заявки из очереди"""
+    query = update.callback_query
+    await query.answer()
+    
+    scheduler = context.bot_data['queue_scheduler']
+    text = f"🖨 Принтеры (очередь: {scheduler.policy})\n\n"
+    keyboard = []
     
-    keyboard = [
-        [InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')]
-    ]
+    for index, printer in enumerate(scheduler.printers_status()):
+        if printer['free_at']:
+            jobs = ', '.join(f"#{i[:8]}" for i in printer['requests'])
+            text += f"🟡 {printer['name']} — занят до ~{printer['free_at']:%H:%M} ({jobs})\n"
+        elif printer['requests']:
+            jobs = ', '.join(f"#{i[:8]}" for i in printer['requests'])
+            text += f"🟠 {printer['name']} — печать затянулась ({jobs})\n"
+        else:
+            text += f"🟢 {printer['name']} — свободен\n"
+        keyboard.append([InlineKeyboardButton(
+            f"▶️ Следующая на {printer['name']}", callback_data=f"dispatch_{index}"
+        )])
     
+    next_id = scheduler.next_pending()
+    text += f"\nСледующая заявка: #{next_id[:8]}" if next_id else "\nОчередь пуста."
+    
+    keyboard.append([InlineKeyboardButton("🔙 Главное меню", callback_data='admin_main_menu')])
     await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
     
     return AdminStates.VIEW_REQUESTS
 
+async def dispatch_next(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Взять следующую по политике заявку в работу на выбранном принтере"""
+    query = update.callback_query
+    
+    scheduler = context.bot_data['queue_scheduler']
+    db = context.bot_data['db']
+    printer = scheduler.printers[int(query.data.split('_')[1])]
+    
+    request_id = scheduler.next_pending()
+    if not request_id:
+        await query.answer("Очередь пуста.")
+        return AdminStates.VIEW_REQUESTS
+    
+    if not await db.update_status(request_id, 'В работе', expected_status='В очереди'):
+        await query.answer("⚠️ Статус заявки уже изменён другим администратором.")
+        return await view_printers(update, context)
+    
+    await _assign_printer(context, request_id, printer)
+    
+    request_data = await db.get_request_by_id(request_id)
+    if request_data and request_data.get('telegram_id'):
+        try:
+            await context.bot.send_message(
+                chat_id=int(request_data['telegram_id']),
+                text=f"📢 Ваша заявка #{request_id[:8]} принята в работу!"
+            )
+        except Exception as e:
+            print(f"Не удалось отправить уведомление пользователю: {e}")
+    
+    await query.answer(f"▶️ Заявка #{request_id[:8]} запущена на {printer}")
+    return await view_printers(update, context)
+
 async def cleanup_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ручная очистка старых заявок"""
     query = update.callback_query
@@ -455,7 +760,7 @@ async def cleanup_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     db = context.bot_data.get('db')
     
-    result = db.manual_cleanup()
+    result = await db.manual_cleanup()
     
     text = (
         f"🗑️ Очистка завершена!\n\n"
@@ -469,30 +774,18 @@ async def cleanup_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return AdminStates.VIEW_REQUESTS
 
-async def navigate_pages(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Навигация по страницам"""
-    query = update.callback_query
-    await query.answer()
-    
-    if query.data == 'next_page':
-        context.user_data['page'] = context.user_data.get('page', 0) + 1
-    elif query.data == 'prev_page':
-        context.user_data['page'] = max(0, context.user_data.get('page', 0) - 1)
-    
-    await view_requests(update, context)
-    
-    return AdminStates.VIEW_REQUESTS
-
 async def back_to_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Вернуться в главное меню админа"""
     query = update.callback_query
     await query.answer()
     
-    context.user_data['page'] = 0
+    context.user_data.pop('requests_view', None)
     
     keyboard = [
         [InlineKeyboardButton("📋 Текущие заявки", callback_data='view_requests')],
         [InlineKeyboardButton("📦 Архив заявок", callback_data='view_archive')],
+        [InlineKeyboardButton("🖨 Принтеры", callback_data='view_printers')],
+        [InlineKeyboardButton("📤 Выгрузка", callback_data='export_menu')],
         [InlineKeyboardButton("🗑️ Очистить старые заявки", callback_data='cleanup_requests')],
         [InlineKeyboardButton("📝 Управление группами", callback_data='manage_groups')],
         [InlineKeyboardButton("🎯 Управление целями печати", callback_data='manage_purposes')],
@@ -506,6 +799,78 @@ async def back_to_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     return AdminStates.VIEW_REQUESTS
 
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Нагрузка на бота: очередь апдейтов и выполняющиеся обработчики"""
+    from bot.utils.config import ADMIN_CHAT_IDS
+
+    if update.effective_user.id not in ADMIN_CHAT_IDS:
+        await update.message.reply_text("У вас нет прав администратора.")
+        return
+
+    processor = context.bot_data.get('update_processor')
+    if not processor:
+        await update.message.reply_text("Статистика недоступна.")
+        return
+
+    m = processor.metrics()
+    text = (
+        f"📈 Обработка апдейтов\n\n"
+        f"⏳ В очереди: {m['queued']} (максимум {m['max_queued']})\n"
+        f"⚙️ Выполняется: {m['in_flight']} из {m['limit']}\n"
+        f"💬 Активных чатов: {m['active_chats']}\n"
+        f"✅ Обработано: {m['processed']}"
+    )
+
+    sheets_sync = context.bot_data.get('sheets_sync')
+    if sheets_sync:
+        s = sheets_sync.metrics()
+        text += (
+            f"\n\n📊 Google Таблица\n"
+            f"⏳ Ждут отправки: {s['pending']}\n"
+            f"✅ Отправлено: {s['flushed']} (запросов к API: {s['api_calls']})"
+        )
+        if s['failures']:
+            text += f"\n⚠️ Ошибок подряд: {s['failures']} — {s['last_error']}"
+
+    await update.message.reply_text(text)
+
+async def find_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск заявок и архива: /find <фамилия, группа, файл…>"""
+    from bot.utils.config import ADMIN_CHAT_IDS
+
+    if update.effective_user.id not in ADMIN_CHAT_IDS:
+        await update.message.reply_text("У вас нет прав администратора.")
+        return
+
+    text = ' '.join(context.args or [])
+    if not text:
+        await update.message.reply_text(
+            "🔍 Использование: /find <запрос>\n\n"
+            "Ищет по имени, фамилии, группе, цели, файлу, комментарию и username — "
+            "в текущих заявках и архиве. Можно вводить начало слова, опечатки допускаются."
+        )
+        return
+
+    results = context.bot_data['search_index'].search(text, limit=10)
+    if not results:
+        await update.message.reply_text(f"🔍 По запросу «{text}» ничего не найдено.")
+        return
+
+    status_emoji = {'В очереди': '⚪', 'В работе': '🟡', 'Готово': '🟢'}
+    reply = f"🔍 Найдено по запросу «{text}»:\n\n"
+    keyboard = []
+    for req in results:
+        emoji = '📦' if req['archived'] else status_emoji.get(req.get('status'), '⚪')
+        reply += (
+            f"{emoji} #{req['id'][:8]} | {req.get('first_name')} {req.get('last_name')}\n"
+            f"📚 {req.get('group')} | 📅 {req.get('date')}\n"
+        )
+        # Карточка есть только у активных заявок
+        if not req['archived']:
+            keyboard.append([InlineKeyboardButton(f"📄 Детали #{req['id'][:6]}", callback_data=f"detail_{req['id']}")])
+
+    await update.message.reply_text(reply, reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None)
+
 # Управление группами и целями (оставляем как было)
 
 async def manage_groups(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -575,6 +940,7 @@ async def save_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if group_name not in groups:
         groups.append(group_name)
         context.bot_data['groups'] = groups
+        _lists_changed(context)
         await update.message.reply_text(f"✅ Группа '{group_name}' добавлена!")
     else:
         await update.message.reply_text(f"Группа '{group_name}' уже существует.")
@@ -617,6 +983,7 @@ async def delete_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if group_name in groups:
         groups.remove(group_name)
         context.bot_data['groups'] = groups
+        _lists_changed(context)
         await query.answer(f"Группа '{group_name}' удалена!")
     
     await manage_groups(update, context)
@@ -638,6 +1005,7 @@ async def save_purpose(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if purpose_name not in purposes:
         purposes.append(purpose_name)
         context.bot_data['purposes'] = purposes
+        _lists_changed(context)
         await update.message.reply_text(f"✅ Цель '{purpose_name}' добавлена!")
     else:
         await update.message.reply_text(f"Цель '{purpose_name}' уже существует.")
@@ -680,112 +1048,122 @@ async def delete_purpose(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if purpose_name in purposes:
         purposes.remove(purpose_name)
         context.bot_data['purposes'] = purposes
+        _lists_changed(context)
         await query.answer(f"Цель '{purpose_name}' удалена!")
     
     await manage_purposes(update, context)
     
     return AdminStates.MANAGE_PURPOSES
-import pandas as pd
-import os
-from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
-from openpyxl.utils.dataframe import dataframe_to_rows
 
-async def export_to_excel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Выгрузить заявки в Excel с цветовой индикацией статусов"""
+EXPORT_FORMAT_LABELS = {
+    FORMAT_XLSX: "📊 Excel",
+    FORMAT_CSV: "📄 CSV",
+    FORMAT_COLUMNAR: "🗜 Колоночный",
+}
+# Получатель в ExportService: у всех админов общая отметка «прошлой выгрузки»
+EXPORT_CONSUMER = 'admin'
+
+async def _send_export(context: ContextTypes.DEFAULT_TYPE, chat_id: int, fmt: str, delta: bool) -> int:
+    """Собрать выгрузку в пуле БД и отправить файлом; вернуть число строк"""
+    db = context.bot_data['db']
+    export_service = context.bot_data['export_service']
+
+    filepath = None
+    try:
+        # Файл пишется потоком в пуле БД — цикл событий не ждёт
+        filepath, count, partial = await db.run(export_service.export, fmt, EXPORT_CONSUMER, delta)
+        if count:
+            scope = "изменения с прошлой выгрузки" if partial else "все заявки и архив"
+            with open(filepath, 'rb') as f:
+                await context.bot.send_document(
+                    chat_id=chat_id,
+                    document=f,
+                    caption=f"{EXPORT_FORMAT_LABELS[fmt]}: {scope} ({count} шт.)"
+                )
+        return count
+    finally:
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+
+async def export_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выбор формата выгрузки: всё или только изменения"""
     query = update.callback_query
     await query.answer()
 
-    db = context.bot_data.get('db')
-    if not db:
-        await query.edit_message_text("❌ База данных не доступна.")
-        return AdminStates.VIEW_REQUESTS
+    pending = context.bot_data['export_service'].pending_changes(EXPORT_CONSUMER)
+    if pending is None:
+        changes = "выгрузок ещё не было — будет выгружено всё"
+    else:
+        changes = f"изменилось заявок: {pending}"
 
-    try:
-        active = db.get_all_requests() or []
-        archive = db.get_archive() or []
-        all_requests = active + archive
+    keyboard = []
+    for fmt, label in EXPORT_FORMAT_LABELS.items():
+        keyboard.append([
+            InlineKeyboardButton(f"{label} — всё", callback_data=f"export:{fmt}:full"),
+            InlineKeyboardButton(f"{label} — изменения", callback_data=f"export:{fmt}:delta"),
+        ])
+    keyboard.append([InlineKeyboardButton("⬅️ Назад", callback_data='admin_main_menu')])
 
-        if not all_requests:
-            await query.edit_message_text("📭 Нет заявок для выгрузки.")
-            return AdminStates.VIEW_REQUESTS
+    await query.edit_message_text(
+        "📤 Выгрузка заявок\n\n"
+        "«Всё» — активные заявки и архив.\n"
+        f"«Изменения» — только заявки, изменённые после прошлой выгрузки ({changes}).\n\n"
+        "Excel — с цветами статусов, CSV — для таблиц и скриптов, "
+        "колоночный — самый компактный (gzip).",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return AdminStates.VIEW_REQUESTS
 
-        # Подготовка данных
-        rows = []
-        for req in all_requests:
-            rows.append({
-                "ID": req.get('id', '')[:8],
-                "Статус": req.get('status', ''),
-                "Имя": req.get('first_name', ''),
-                "Фамилия": req.get('last_name', ''),
-                "Группа": req.get('group', ''),
-                "Цель": req.get('purpose', ''),
-                "Файл": req.get('file_name', ''),
-                "Комментарий": req.get('comment', ''),
-                "Дата подачи": req.get('date', ''),
-                "Telegram ID": req.get('telegram_id', ''),
-                "Username": f"@{req.get('username')}" if req.get('username') else "",
-            })
-
-        df = pd.DataFrame(rows)
-
-        # Путь к файлу
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"3d_print_requests_{timestamp}.xlsx"
-        filepath = os.path.join("data", filename)
-        os.makedirs("data", exist_ok=True)
-
-        # Создаём Excel вручную через openpyxl (чтобы добавить цвета)
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Заявки"
-
-        # Записываем заголовки
-        for col_num, column_title in enumerate(df.columns, 1):
-            cell = ws.cell(row=1, column=col_num, value=column_title)
-            cell.font = Font(bold=True)
-
-        # Записываем данные
-        for row_num, row_data in enumerate(dataframe_to_rows(df, index=False, header=False), 2):
-            for col_num, value in enumerate(row_data, 1):
-                ws.cell(row=row_num, column=col_num, value=value)
-
-        # Цвета для статусов
-        status_colors = {
-            "В очереди": "FFFFCC",   # светло-жёлтый
-            "В работе": "FFFF00",    # жёлтый
-            "Готово": "CCFFCC",      # светло-зелёный
-            "Архив": "DDDDDD",       # серый
-        }
-
-        # Применяем цвета к строкам по статусу (столбец B = "Статус")
-        for row in range(2, len(df) + 2):
-            status_cell = ws[f"B{row}"]
-            status = status_cell.value
-            if status in status_colors:
-                fill = PatternFill(start_color=status_colors[status], end_color=status_colors[status], fill_type="solid")
-                for col in range(1, len(df.columns) + 1):
-                    ws.cell(row=row, column=col).fill = fill
-
-        # Сохраняем
-        wb.save(filepath)
-
-        # Отправляем админу
-        admin_id = update.effective_user.id
-        with open(filepath, 'rb') as f:
-            await context.bot.send_document(
-                chat_id=admin_id,
-                document=f,
-                caption="📊 Выгрузка заявок с цветовой индикацией статусов"
+async def export_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузить заявки в выбранном формате"""
+    query = update.callback_query
+    await query.answer()
+
+    _, fmt, kind = query.data.split(':')
+    try:
+        count = await _send_export(context, update.effective_user.id, fmt, kind == 'delta')
+        if not count:
+            await query.edit_message_text(
+                "📭 Нет заявок для выгрузки.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data='export_menu')]])
             )
+            return AdminStates.VIEW_REQUESTS
 
-        os.remove(filepath)
         await back_to_admin_menu(update, context)
 
     except Exception as e:
-        print(f"Ошибка выгрузки Excel: {e}")
+        print(f"Ошибка выгрузки: {e}")
         await query.edit_message_text(f"❌ Ошибка: {e}")
         return AdminStates.VIEW_REQUESTS
 
     return AdminStates.VIEW_REQUESTS
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Выгрузка командой: /export [xlsx|csv|columnar] [delta]"""
+    from bot.utils.config import ADMIN_CHAT_IDS
+
+    if update.effective_user.id not in ADMIN_CHAT_IDS:
+        await update.message.reply_text("У вас нет прав администратора.")
+        return
+
+    fmt, delta = FORMAT_XLSX, False
+    for arg in context.args or []:
+        arg = arg.lower()
+        if arg in EXPORT_FORMATS:
+            fmt = arg
+        elif arg in ('delta', 'изменения'):
+            delta = True
+        else:
+            await update.message.reply_text(
+                "📤 Использование: /export [xlsx|csv|columnar] [delta]\n\n"
+                "delta — только заявки, изменённые после прошлой выгрузки."
+            )
+            return
+
+    try:
+        count = await _send_export(context, update.effective_chat.id, fmt, delta)
+        if not count:
+            await update.message.reply_text("📭 Нет заявок для выгрузки.")
+    except Exception as e:
+        print(f"Ошибка выгрузки: {e}")
+        await update.message.reply_text(f"❌ Ошибка: {e}")
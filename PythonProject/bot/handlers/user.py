@@ -1,9 +1,14 @@
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from bot.utils.states import UserStates
-from bot.utils.config import GROUPS, PRINT_PURPOSES
+from bot.utils.config import GROUPS, PRINT_PURPOSES, MAX_STL_SIZE_MB, UPLOAD_MODE
+from bot.services.uploads import download_stl, UploadRejected
+from bot.services.delivery import FILE_ID_FIELD
+from bot.services.lazy_files import UPLOAD_LAZY
+from bot.services.render_cache import TELEGRAM_TEXT_LIMIT, VIEW_MY_REQUESTS, paginate_blocks
 import os
 import uuid
+from datetime import datetime, timedelta
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
@@ -109,12 +114,40 @@ async def get_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         request_id = str(uuid.uuid4())[:8]
         
-        file = await context.bot.get_file(document.file_id)
+        if document.file_size and document.file_size > MAX_STL_SIZE_MB * 1024 * 1024:
+            await update.message.reply_text(
+                f"Файл слишком большой (максимум {MAX_STL_SIZE_MB} МБ). Прикрепите другой .stl файл."
+            )
+            return UserStates.FILE
         
-        os.makedirs('uploads', exist_ok=True)
         final_filename = f"{request_id}_{document.file_name}"
-        file_path = f"uploads/{final_filename}"
-        await file.download_to_drive(file_path)
+        
+        if UPLOAD_MODE == UPLOAD_LAZY:
+            # Модель остаётся у Telegram: скачается (и проверится), когда понадобится
+            file_path = None
+            file_info = {'file_size': document.file_size, 'upload_mode': UPLOAD_LAZY}
+        else:
+            file = await context.bot.get_file(document.file_id)
+            
+            os.makedirs('uploads/tmp', exist_ok=True)
+            tmp_path = f"uploads/tmp/{request_id}.stl"
+            
+            # Скачиваем с проверкой STL на лету: битый файл не попадёт в очередь
+            try:
+                file_info = await download_stl(
+                    file,
+                    tmp_path,
+                    max_size=MAX_STL_SIZE_MB * 1024 * 1024,
+                    expected_size=document.file_size
+                )
+            except UploadRejected as e:
+                await update.message.reply_text(
+                    f"❌ Файл не принят: {e}\n\nПрикрепите корректный .stl файл."
+                )
+                return UserStates.FILE
+            
+            # Одинаковые модели (одна лабораторная на группу) хранятся один раз
+            file_path = context.bot_data['blob_store'].put(tmp_path, file_info['file_hash'], request_id)
         
         request_data = {
             'id': request_id,
@@ -124,36 +157,38 @@ async def get_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'purpose': context.user_data['purpose'],
             'file_path': file_path,
             'file_name': final_filename,
+            # Оригинал остаётся у Telegram: админам пересылается по id, без загрузки с Pi
+            FILE_ID_FIELD: document.file_id,
             'telegram_id': update.effective_user.id,
-            'username': update.effective_user.username or ''
+            'username': update.effective_user.username or '',
+            **file_info
         }
         
-        db.add_request(request_data)
+        await db.add_request(request_data)
         
-        pending_count = db.get_pending_count()
-        queue_position = pending_count
+        # Место и время считаются по расписанию всех принтеров с учётом политики очереди
+        queue_info = context.bot_data['queue_scheduler'].position(request_id) or {'position': 0, 'start': None}
         
         await update.message.reply_text(
             f"✅ Заявка принята!\n\n"
             f"ID заявки: {request_id}\n"
-            f"Перед вами в очереди: {queue_position-1} человек(а)\n\n"
+            f"Перед вами в очереди: {queue_info['position']} человек(а)\n"
+            f"{format_eta(queue_info['start'])}\n\n"
             f"Вы получите уведомление при изменении статуса."
         )
         
-        from bot.utils.config import ADMIN_CHAT_IDS
-
-        for admin_id in ADMIN_CHAT_IDS:
-            try:
-                await context.bot.send_message(
-                    chat_id=admin_id,
-                    text=f"📬 Новая заявка #{request_id}\n"
-                         f"От: {request_data['first_name']} {request_data['last_name']}\n"
-                         f"Группа: {request_data['group']}\n"
-                         f"Цель: {request_data['purpose']}\n"
-                         f"Файл: {final_filename}"
-                )
-            except Exception as e:
-                print(f"Не удалось отправить админу {admin_id}: {e}")
+        # Геометрия и превью модели считаются в пуле процессов и появятся в карточке заявки у админа
+        if file_path:
+            await db.run(
+                context.bot_data['model_jobs'].submit,
+                request_id,
+                file_path,
+                file_info['stl_format'],
+                file_info['file_hash']
+            )
+        
+        # Уведомление админам уходит в фоне (сразу или в сводке) и не задерживает ответ пользователю
+        context.bot_data['admin_digest'].add(request_data)
                 
     except Exception as e:
         print(f"Ошибка при обработке заявки: {e}")
@@ -169,27 +204,20 @@ async def get_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return ConversationHandler.END
 
-async def my_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Просмотр своих заявок"""
-    user_id = update.effective_user.id
-    db = context.bot_data.get('db')
-    
-    if not db:
-        await update.message.reply_text("Ошибка: база данных не инициализирована.")
-        return
-    
-    all_requests = db.get_all_requests()
-    user_requests = [req for req in all_requests if str(req.get('telegram_id')) == str(user_id)]
-    
-    if not user_requests:
-        await update.message.reply_text(
-            "📋 У вас пока нет заявок.\n\n"
-            "Используйте /new_request чтобы создать новую заявку."
-        )
-        return
-    
-    text = "📋 Ваши заявки:\n\n"
-    
+def format_eta(start) -> str:
+    """Ожидаемое начало печати для пользователя"""
+    if start is None or start <= datetime.now() + timedelta(minutes=1):
+        return "⏱ Печать может начаться сразу после проверки администратором"
+    if start.date() == datetime.now().date():
+        return f"⏱ Ожидаемое начало печати: сегодня около {start:%H:%M}"
+    return f"⏱ Ожидаемое начало печати: {start:%d.%m} около {start:%H:%M}"
+
+# Место под строки очереди, дописываемые к заявке при показе
+QUEUE_LINES_RESERVE = 120
+
+def _render_my_requests(user_requests) -> list:
+    """Разбить заявки пользователя на страницы в пределах лимита Telegram"""
+    entries = []
     for req in user_requests:
         status_emoji = {
             'В очереди': '⚪',
@@ -197,7 +225,7 @@ async def my_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'Готово': '🟢'
         }.get(req.get('status', ''), '⚪')
         
-        text += (
+        head = (
             f"{status_emoji} Заявка #{req.get('id')[:8]}\n"
             f"📚 Группа: {req.get('group')}\n"
             f"🎯 Цель: {req.get('purpose')}\n"
@@ -205,13 +233,97 @@ async def my_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"📊 Статус: {req.get('status')}\n"
         )
         
+        tail = ""
         comment = req.get('comment', '')
         if comment:
-            text += f"💬 Комментарий: {comment}\n"
+            tail += f"💬 Комментарий: {comment}\n"
         
-        text += "───────────────\n"
+        tail += "───────────────\n"
+        entries.append((req.get('id'), head, tail))
+    
+    pages = paginate_blocks(
+        [head + tail for _, head, tail in entries],
+        TELEGRAM_TEXT_LIMIT - 100,
+        [QUEUE_LINES_RESERVE] * len(entries)
+    )
+    return [{'entries': [entries[i] for i in page], 'pages': len(pages)} for page in pages]
+
+async def _my_requests_message(context: ContextTypes.DEFAULT_TYPE, user_id: int, page: int):
+    """Текст и кнопки страницы /my_requests (статичная часть — из кэша)"""
+    cache = context.bot_data['render_cache']
+    owner = str(user_id)
+    
+    rendered = cache.get(VIEW_MY_REQUESTS, owner, page)
+    if rendered is None:
+        generation = cache.generation(VIEW_MY_REQUESTS)
+        user_requests = await context.bot_data['db'].get_user_requests(user_id)
+        if not user_requests:
+            return None, None
+        pages = _render_my_requests(user_requests)
+        for i, value in enumerate(pages):
+            cache.put(VIEW_MY_REQUESTS, owner, i, value, generation)
+        # После удаления заявок страниц могло стать меньше
+        page = min(page, len(pages) - 1)
+        rendered = pages[page]
+    
+    text = "📋 Ваши заявки:\n\n"
+    if rendered['pages'] > 1:
+        text = f"📋 Ваши заявки (стр. {page + 1}/{rendered['pages']}):\n\n"
+    
+    # Место в очереди меняется от чужих заявок, поэтому считается при каждом показе (O(log n))
+    scheduler = context.bot_data['queue_scheduler']
+    for request_id, head, tail in rendered['entries']:
+        text += head
+        queue_info = scheduler.position(request_id)
+        if queue_info:
+            text += (
+                f"🔢 Перед вами в очереди: {queue_info['position']}\n"
+                f"{format_eta(queue_info['start'])}\n"
+            )
+        text += tail
+    
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"my_requests_{page - 1}"))
+    if page + 1 < rendered['pages']:
+        nav_buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"my_requests_{page + 1}"))
+    reply_markup = InlineKeyboardMarkup([nav_buttons]) if nav_buttons else None
+    
+    return text, reply_markup
+
+async def my_requests(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Просмотр своих заявок"""
+    user_id = update.effective_user.id
+    db = context.bot_data.get('db')
+    
+    if not db:
+        await update.message.reply_text("Ошибка: база данных не инициализирована.")
+        return
+    
+    text, reply_markup = await _my_requests_message(context, user_id, 0)
+    
+    if not text:
+        await update.message.reply_text(
+            "📋 У вас пока нет заявок.\n\n"
+            "Используйте /new_request чтобы создать новую заявку."
+        )
+        return
+    
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+async def my_requests_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание /my_requests"""
+    query = update.callback_query
+    await query.answer()
+    
+    page = int(query.data.rsplit('_', 1)[1])
+    text, reply_markup = await _my_requests_message(context, update.effective_user.id, page)
+    
+    if not text:
+        await query.edit_message_text("📋 У вас пока нет заявок.")
+        return
     
-    await update.message.reply_text(text)
+    await query.edit_message_text(text, reply_markup=reply_markup)
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
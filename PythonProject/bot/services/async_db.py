@@ -0,0 +1,43 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncLocalDatabase:
+    """Асинхронный фасад над LocalDatabase/SQLiteDatabase для обработчиков бота.
+
+    Любой публичный метод синхронной БД доступен как корутина: вызов выполняется
+    в отдельном пуле потоков, поэтому запись на диск не блокирует цикл событий.
+    Синхронный объект остаётся доступен как .db (для планировщика и других потоков).
+    Синхронные БД потокобезопасны, поэтому пул может выполнять вызовы параллельно.
+    """
+
+    def __init__(self, db, max_workers: int = 4):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+        self._methods = {}
+
+    async def run(self, func, *args, **kwargs):
+        """Выполнить произвольную синхронную функцию в пуле БД"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        method = self._methods.get(name)
+        if method is None:
+            sync_method = getattr(self.db, name)
+            if not callable(sync_method):
+                return sync_method
+
+            @functools.wraps(sync_method)
+            async def method(*args, **kwargs):
+                return await self.run(sync_method, *args, **kwargs)
+
+            self._methods[name] = method
+        return method
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.db.close()
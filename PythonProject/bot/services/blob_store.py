@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+class BlobStore:
+    """Хранилище загруженных моделей по содержимому.
+
+    Каждый файл лежит один раз под своим SHA-256 (uploads/blobs/<hash>.stl).
+    Для каждого хеша хранится список заявок, которые на него ссылаются;
+    файл удаляется, только когда уходит последняя ссылка.
+    """
+
+    def __init__(self, root: str = 'uploads/blobs', refs_file: str = 'data/blob_refs.json'):
+        self.root = root
+        self.refs_file = refs_file
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        os.makedirs(os.path.dirname(refs_file), exist_ok=True)
+        self._refs: Dict[str, List[str]] = self._load_refs()
+
+    def _load_refs(self) -> Dict[str, List[str]]:
+        try:
+            with open(self.refs_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_refs(self):
+        tmp_path = self.refs_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._refs, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.refs_file)
+
+    def path_for(self, file_hash: str) -> str:
+        return os.path.join(self.root, f"{file_hash}.stl")
+
+    def put(self, tmp_path: str, file_hash: str, request_id: str) -> str:
+        """Положить скачанный файл под его хешем и записать ссылку заявки.
+
+        Если такой файл уже есть, временная копия удаляется.
+        """
+        blob_path = self.path_for(file_hash)
+        with self._lock:
+            if os.path.exists(blob_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, blob_path)
+
+            refs = self._refs.setdefault(file_hash, [])
+            if request_id not in refs:
+                refs.append(request_id)
+                self._save_refs()
+        return blob_path
+
+    def release(self, file_hash: str, request_id: str) -> bool:
+        """Убрать ссылку заявки; вернуть True, если файл удалён"""
+        with self._lock:
+            refs = self._refs.get(file_hash)
+            if refs is None or request_id not in refs:
+                return False
+
+            refs.remove(request_id)
+            if refs:
+                self._save_refs()
+                return False
+
+            del self._refs[file_hash]
+            self._save_refs()
+            blob_path = self.path_for(file_hash)
+            if os.path.exists(blob_path):
+                os.remove(blob_path)
+            return True
+
+    def ref_count(self, file_hash: str) -> int:
+        with self._lock:
+            return len(self._refs.get(file_hash, []))
+
+    def is_blob(self, file_path: Optional[str]) -> bool:
+        return bool(file_path) and os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(self.root)
+
+    def on_db_event(self, event: str, request: Dict):
+        """Подписчик БД: заявка удалена совсем — освобождаем её файл"""
+        if event in ('delete', 'purge_archive') and request.get('file_hash'):
+            if self.is_blob(request.get('file_path')):
+                self.release(request['file_hash'], request.get('id'))
@@ -0,0 +1,58 @@
+import asyncio
+import os
+from typing import Dict, Optional
+
+from telegram import InputFile
+from telegram.error import BadRequest
+
+# Поля заявки с Telegram file_id: по нему файл пересылается без повторной загрузки
+FILE_ID_FIELD = 'tg_file_id'
+PREVIEW_FILE_ID_FIELD = 'tg_preview_file_id'
+
+DELIVERY_CACHED = 'cached'
+DELIVERY_UPLOADED = 'uploaded'
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+async def send_request_file(bot, db, request: Dict, chat_id: int, caption: str,
+                            file_path: Optional[str] = None, photo: bool = False) -> str:
+    """Отправить файл заявки (модель или превью при photo=True).
+
+    Сначала — по сохранённому в заявке file_id: Telegram пересылает файл
+    со своей стороны, с Pi ничего не загружается. Если id нет или он
+    недействителен, файл читается с диска в пуле потоков и загружается,
+    а file_id из ответа записывается в заявку для следующих отправок.
+    Возвращает DELIVERY_CACHED или DELIVERY_UPLOADED;
+    FileNotFoundError — если нет ни id, ни файла на диске.
+    """
+    field = PREVIEW_FILE_ID_FIELD if photo else FILE_ID_FIELD
+    send = bot.send_photo if photo else bot.send_document
+    media = 'photo' if photo else 'document'
+
+    file_id = request.get(field)
+    if file_id:
+        try:
+            await send(chat_id=chat_id, caption=caption, **{media: file_id})
+            return DELIVERY_CACHED
+        except BadRequest as e:
+            print(f"file_id заявки {request.get('id')} недействителен, загружаем файл: {e}")
+
+    if file_path is None and not photo:
+        file_path = request.get('file_path')
+    if not file_path or not os.path.exists(file_path):
+        if file_id:
+            # Недействительный id не пробуем снова: в следующий раз файл будет искаться на диске
+            await db.update_fields(request['id'], {field: None})
+        raise FileNotFoundError("Файл не найден на сервере")
+
+    # Чтение с SD-карты не должно останавливать цикл событий
+    data = await asyncio.to_thread(_read_file, file_path)
+    filename = None if photo else request.get('file_name') or os.path.basename(file_path)
+    message = await send(chat_id=chat_id, caption=caption, **{media: InputFile(data, filename=filename)})
+
+    sent = message.photo[-1] if photo else message.document
+    if sent is not None:
+        await db.update_fields(request['id'], {field: sent.file_id})
+    return DELIVERY_UPLOADED
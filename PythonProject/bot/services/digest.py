@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Сколько заявок помещать в одно сообщение сводки (лимиты на текст и кнопки)
+DIGEST_CHUNK = 20
+
+class NewRequestDigest:
+    """Сводка новых заявок для админов.
+
+    Первая заявка после затишья отправляется сразу. Следующие в течение window
+    секунд копятся и уходят одним сообщением на админа с кнопками деталей.
+    window = 0 отключает группировку.
+    """
+
+    def __init__(self, notifier, admin_ids, window: float = 60):
+        self.notifier = notifier
+        self.admin_ids = list(admin_ids)
+        self.window = window
+        self._buffer: List[Dict] = []
+        self._last_event = 0.0
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def add(self, request_data: Dict):
+        now = time.monotonic()
+        idle = now - self._last_event >= self.window
+        self._last_event = now
+
+        if self.window <= 0 or (idle and not self._buffer and self._flush_task is None):
+            self._send([request_data])
+            return
+
+        self._buffer.append(request_data)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.window)
+        finally:
+            self._flush_task = None
+            self.flush()
+
+    def flush(self):
+        """Отправить накопленные заявки немедленно"""
+        buffer, self._buffer = self._buffer, []
+        for start in range(0, len(buffer), DIGEST_CHUNK):
+            self._send(buffer[start:start + DIGEST_CHUNK])
+
+    async def stop(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self.flush()
+
+    def _send(self, requests: List[Dict]):
+        if len(requests) == 1:
+            req = requests[0]
+            text = (
+                f"📬 Новая заявка #{req['id']}\n"
+                f"От: {req['first_name']} {req['last_name']}\n"
+                f"Группа: {req['group']}\n"
+                f"Цель: {req['purpose']}\n"
+                f"Файл: {req['file_name']}"
+            )
+        else:
+            text = f"📬 Новые заявки ({len(requests)}):\n\n"
+            for req in requests:
+                text += (
+                    f"#{req['id']} | {req['first_name']} {req['last_name']}\n"
+                    f"📚 {req['group']} | 🎯 {req['purpose']}\n"
+                    f"───────────────\n"
+                )
+
+        keyboard = [
+            [InlineKeyboardButton(f"📄 Детали #{req['id'][:6]}", callback_data=f"detail_{req['id']}")]
+            for req in requests
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+
+        for admin_id in self.admin_ids:
+            self.notifier.send_message(admin_id, text, reply_markup=reply_markup)
@@ -1,10 +1,11 @@
-from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
 import os
 import json
 import io
 
+from bot.services.google_endpoint import discovery_options, google_credentials
+
 class DriveService:
     def __init__(self, folder_id):
         self.folder_id = folder_id
@@ -12,23 +13,13 @@ class DriveService:
         self._authenticate()
     
     def _authenticate(self):
-        service_account_key = os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY', '')
-        
-        if not service_account_key:
-            raise ValueError("GOOGLE_SERVICE_ACCOUNT_KEY не найден в переменных окружения")
-        
-        try:
-            creds_dict = json.loads(service_account_key)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"GOOGLE_SERVICE_ACCOUNT_KEY содержит невалидный JSON: {e}")
-        
         scopes = [
             'https://www.googleapis.com/auth/drive',
             'https://www.googleapis.com/auth/drive.file'
         ]
         
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        self.service = build('drive', 'v3', credentials=creds)
+        creds = google_credentials(scopes)
+        self.service = build('drive', 'v3', credentials=creds, **discovery_options())
     
     def upload_file(self, file_path, file_name):
         file_metadata = {
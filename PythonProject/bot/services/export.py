@@ -0,0 +1,385 @@
+import csv
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, NamedStyle, PatternFill
+
+FORMAT_XLSX = 'xlsx'
+FORMAT_CSV = 'csv'
+FORMAT_COLUMNAR = 'columnar'
+# Формат → расширение файла
+EXPORT_FORMATS = {
+    FORMAT_XLSX: '.xlsx',
+    FORMAT_CSV: '.csv',
+    FORMAT_COLUMNAR: '.cols.jsonl.gz',
+}
+
+# Столбцы Excel-выгрузки: заголовок и как достать значение из заявки
+EXPORT_COLUMNS: List[Tuple[str, Callable[[Dict], object]]] = [
+    ("ID", lambda r: (r.get('id') or '')[:8]),
+    ("Статус", lambda r: r.get('status', '')),
+    ("Имя", lambda r: r.get('first_name', '')),
+    ("Фамилия", lambda r: r.get('last_name', '')),
+    ("Группа", lambda r: r.get('group', '')),
+    ("Цель", lambda r: r.get('purpose', '')),
+    ("Файл", lambda r: r.get('file_name', '')),
+    ("Комментарий", lambda r: r.get('comment', '')),
+    ("Дата подачи", lambda r: r.get('date', '')),
+    ("Telegram ID", lambda r: r.get('telegram_id', '')),
+    ("Username", lambda r: f"@{r.get('username')}" if r.get('username') else ""),
+]
+
+# Поля заявки в CSV и колоночном формате (для отчётов и загрузки в другие системы)
+DATA_FIELDS = (
+    'id', 'date', 'status', 'first_name', 'last_name', 'group', 'purpose', 'file_name',
+    'comment', 'telegram_id', 'username', 'completed_date', 'archived_date',
+)
+# Поля, которые добавляются в выгрузку изменений
+CHANGE_FIELDS = ('change', 'changed_at')
+CHANGE_LABELS = {
+    'add': 'Новая',
+    'set': 'Изменена',
+    'archive': 'В архиве',
+    'delete': 'Удалена',
+    'purge_archive': 'Удалена из архива',
+}
+
+# Цвета строк по статусу
+STATUS_COLORS = {
+    "В очереди": "FFFFCC",   # светло-жёлтый
+    "В работе": "FFFF00",    # жёлтый
+    "Готово": "CCFFCC",      # светло-зелёный
+    "Архив": "DDDDDD",       # серый
+}
+
+HEADER_STYLE = 'export_header'
+
+# Строк в одной группе колоночного файла: столько держится в памяти при записи
+COLUMNAR_ROW_GROUP = 1000
+
+def _status_style(status: str) -> str:
+    return f"export_status_{STATUS_COLORS[status]}"
+
+def _add_styles(wb: Workbook):
+    """Один именованный стиль на статус: в файле он хранится один раз, а не в каждой ячейке"""
+    wb.add_named_style(NamedStyle(name=HEADER_STYLE, font=Font(bold=True)))
+    for color in dict.fromkeys(STATUS_COLORS.values()):
+        wb.add_named_style(NamedStyle(
+            name=f"export_status_{color}",
+            fill=PatternFill(start_color=color, end_color=color, fill_type="solid"),
+        ))
+
+def write_xlsx(requests: Iterable[Dict], path: str, delta: bool = False) -> int:
+    """Записать заявки в Excel потоком (write-only): память не растёт с числом строк.
+
+    Возвращает число записанных заявок.
+    """
+    columns = list(EXPORT_COLUMNS)
+    if delta:
+        columns[:1] = [
+            ("Изменение", lambda r: CHANGE_LABELS.get(r.get('change'), r.get('change'))),
+            ("Когда", lambda r: r.get('changed_at', '')),
+            ("ID", lambda r: r.get('id', '')),
+        ]
+
+    wb = Workbook(write_only=True)
+    _add_styles(wb)
+    ws = wb.create_sheet("Изменения" if delta else "Заявки")
+
+    header = []
+    for title, _ in columns:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.style = HEADER_STYLE
+        header.append(cell)
+    ws.append(header)
+
+    count = 0
+    for request in requests:
+        status = request.get('status')
+        if status in STATUS_COLORS:
+            style = _status_style(status)
+            row = []
+            for _, value in columns:
+                cell = WriteOnlyCell(ws, value=value(request))
+                cell.style = style
+                row.append(cell)
+        else:
+            row = [value(request) for _, value in columns]
+        ws.append(row)
+        count += 1
+
+    wb.save(path)
+    return count
+
+def write_csv(requests: Iterable[Dict], path: str, delta: bool = False) -> int:
+    fields = (CHANGE_FIELDS if delta else ()) + DATA_FIELDS
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for request in requests:
+            writer.writerow(request)
+            count += 1
+    return count
+
+def _encode_column(values: List) -> Dict:
+    """Столбец группы строк: словарь + коды, если значений мало (статус, группа, цель)"""
+    distinct = list(dict.fromkeys(values))
+    if len(distinct) * 2 > len(values):
+        return {'values': values}
+    codes = {value: i for i, value in enumerate(distinct)}
+    return {'dict': distinct, 'codes': [codes[value] for value in values]}
+
+def write_columnar(requests: Iterable[Dict], path: str, delta: bool = False) -> int:
+    """Компактный колоночный формат (по образцу Parquet): gzip, JSON-строки.
+
+    Первая строка — заголовок с полями, дальше группы по COLUMNAR_ROW_GROUP заявок,
+    в каждой значения хранятся по столбцам, повторяющиеся — через словарь.
+    Прочитать обратно — read_columnar.
+    """
+    fields = (CHANGE_FIELDS if delta else ()) + DATA_FIELDS
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps({'format': 'requests-columnar', 'version': 1, 'fields': fields}, ensure_ascii=False) + '\n')
+
+        def flush(group: List[Dict]):
+            columns = {field: _encode_column([r.get(field) for r in group]) for field in fields}
+            f.write(json.dumps({'rows': len(group), 'columns': columns}, ensure_ascii=False) + '\n')
+
+        group = []
+        for request in requests:
+            group.append(request)
+            count += 1
+            if len(group) == COLUMNAR_ROW_GROUP:
+                flush(group)
+                group = []
+        if group:
+            flush(group)
+    return count
+
+def read_columnar(path: str) -> Iterator[Dict]:
+    """Заявки из файла write_columnar, по одной"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        fields = json.loads(f.readline())['fields']
+        for line in f:
+            group = json.loads(line)
+            columns = []
+            for field in fields:
+                column = group['columns'][field]
+                if 'dict' in column:
+                    columns.append([column['dict'][code] for code in column['codes']])
+                else:
+                    columns.append(column['values'])
+            for values in zip(*columns):
+                yield dict(zip(fields, values))
+
+WRITERS = {
+    FORMAT_XLSX: write_xlsx,
+    FORMAT_CSV: write_csv,
+    FORMAT_COLUMNAR: write_columnar,
+}
+
+class ExportService:
+    """Выгрузки заявок в Excel, CSV и колоночном формате — полные и «только изменения».
+
+    Подписан на события БД и ведёт журнал изменений: для каждой заявки —
+    последнее событие и её снимок. У каждого получателя (выгрузка админа,
+    бэкап) своя отметка — номер последнего выгруженного события, поэтому
+    выгрузка изменений стоит O(изменений с прошлого раза), а не O(всей истории).
+
+    Записи, которые уже выгружены всеми получателями, из журнала удаляются.
+    Чтобы один редкий получатель не держал журнал вечно, отметка, не
+    обновлявшаяся watermark_ttl_days дней, забывается, а журнал не бывает
+    длиннее max_changes заявок: самые старые записи отбрасываются. Получатель,
+    чья отметка старше оставшегося журнала, получает полную выгрузку.
+    """
+
+    def __init__(self, db, directory: str = 'data/exports',
+                 state_file: str = 'data/export_state.json',
+                 changes_file: str = 'data/export_changes.log',
+                 max_changes: int = 10000, watermark_ttl_days: int = 30):
+        self.db = db
+        self.directory = directory
+        self.state_file = state_file
+        self.changes_file = changes_file
+        self.max_changes = max_changes
+        self.watermark_ttl = timedelta(days=watermark_ttl_days)
+        self._lock = threading.Lock()
+        self._seq = 0
+        # id заявки → последнее изменение; порядок словаря — по seq
+        self._changes: Dict[str, Dict] = {}
+        # Строк в файле журнала (с повторами одной заявки) — когда пора переписать
+        self._log_lines = 0
+        os.makedirs(os.path.dirname(changes_file), exist_ok=True)
+        self._watermarks: Dict[str, int] = {}
+        # Когда получатель выгружал в последний раз
+        self._exported_at: Dict[str, str] = {}
+        # Изменения с seq <= _floor из журнала отброшены
+        self._floor = 0
+        self._load_state()
+        self._load_changes()
+        self._seq = max([self._seq, self._floor] + list(self._watermarks.values()))
+        self._log = open(changes_file, 'a', encoding='utf-8')
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if 'watermarks' not in state:
+            # Прежний формат: только отметки получателей
+            state = {'watermarks': state}
+        self._watermarks = state['watermarks']
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._exported_at = {c: state.get('exported_at', {}).get(c, now) for c in self._watermarks}
+        self._floor = state.get('floor', 0)
+
+    def _save_state(self):
+        tmp_path = self.state_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'watermarks': self._watermarks,
+                'exported_at': self._exported_at,
+                'floor': self._floor,
+            }, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    def _since(self, consumer: str) -> Optional[int]:
+        """Отметка получателя; None — выгрузок не было или журнал её уже не покрывает"""
+        since = self._watermarks.get(consumer)
+        if since is None or since < self._floor:
+            return None
+        return since
+
+    def _load_changes(self):
+        try:
+            with open(self.changes_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Недописанная строка после сбоя
+                        continue
+                    self._log_lines += 1
+                    if entry['seq'] <= self._floor:
+                        continue
+                    self._changes.pop(entry['id'], None)
+                    self._changes[entry['id']] = entry
+                    self._seq = max(self._seq, entry['seq'])
+        except FileNotFoundError:
+            pass
+
+    def on_db_event(self, event: str, request: Dict):
+        """Подписчик БД: записать изменение в журнал"""
+        with self._lock:
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'id': request.get('id'),
+                'change': event,
+                'changed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'request': request,
+            }
+            self._changes.pop(entry['id'], None)
+            self._changes[entry['id']] = entry
+            self._log.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._log.flush()
+            self._log_lines += 1
+            if self._log_lines > 2 * self.max_changes or len(self._changes) > self.max_changes:
+                self._compact()
+
+    def pending_changes(self, consumer: str) -> Optional[int]:
+        """Сколько заявок изменилось после прошлой выгрузки получателя (None — выгрузок ещё не было)"""
+        with self._lock:
+            since = self._since(consumer)
+            if since is None:
+                return None
+            return sum(1 for entry in self._changes.values() if entry['seq'] > since)
+
+    def export(self, fmt: str, consumer: str, delta: bool = False,
+               directory: Optional[str] = None, prefix: str = '3d_print_requests') -> Tuple[str, int, bool]:
+        """Выгрузить заявки в файл; синхронно, для пула потоков.
+
+        delta=True — только заявки, изменённые после прошлой выгрузки этого
+        получателя; если выгрузок ещё не было, выгружается всё.
+        Возвращает путь к файлу, число строк и была ли выгрузка частичной.
+        """
+        writer = WRITERS[fmt]
+        with self._lock:
+            mark = self._seq
+            since = self._since(consumer) if delta else None
+            entries = None
+            if since is not None:
+                entries = [entry for entry in self._changes.values() if entry['seq'] > since]
+
+        if entries is None:
+            rows = self._all_requests()
+        else:
+            rows = (
+                dict(entry['request'], change=entry['change'], changed_at=entry['changed_at'])
+                for entry in entries
+            )
+
+        directory = directory or self.directory
+        os.makedirs(directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        kind = '_delta' if entries is not None else ''
+        path = os.path.join(directory, f"{prefix}{kind}_{timestamp}{EXPORT_FORMATS[fmt]}")
+        try:
+            count = writer(rows, path, delta=entries is not None)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        with self._lock:
+            # Изменения во время полной выгрузки попадут и в следующую выгрузку изменений
+            self._watermarks[consumer] = max(mark, self._watermarks.get(consumer, 0))
+            self._exported_at[consumer] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._compact()
+        return path, count, entries is not None
+
+    def _all_requests(self) -> Iterator[Dict]:
+        yield from self.db.iter_requests(archived=False)
+        yield from self.db.iter_requests(archived=True)
+
+    def _compact(self):
+        """Убрать из журнала изменения, уже выгруженные всеми получателями, и переписать файл"""
+        # Давно не выгружавшие получатели журнал не держат — им будет полная выгрузка
+        expire = (datetime.now() - self.watermark_ttl).strftime('%Y-%m-%d %H:%M:%S')
+        for consumer in [c for c, at in self._exported_at.items() if at < expire]:
+            self._watermarks.pop(consumer, None)
+            del self._exported_at[consumer]
+
+        low = min(self._watermarks.values(), default=self._seq)
+        stale = [request_id for request_id, entry in self._changes.items() if entry['seq'] <= low]
+        for request_id in stale:
+            del self._changes[request_id]
+        # Предел длины: отбросить самые старые (с запасом, чтобы не переписывать файл на каждом событии);
+        # отметки ниже _floor больше не годятся
+        if len(self._changes) > self.max_changes:
+            while len(self._changes) > self.max_changes * 3 // 4:
+                request_id = next(iter(self._changes))
+                self._floor = max(self._floor, self._changes.pop(request_id)['seq'])
+        self._floor = max(self._floor, low)
+
+        tmp_path = self.changes_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in self._changes.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._log.close()
+        os.replace(tmp_path, self.changes_file)
+        self._log = open(self.changes_file, 'a', encoding='utf-8')
+        self._log_lines = len(self._changes)
+        self._save_state()
+
+    def close(self):
+        with self._lock:
+            self._log.close()
@@ -0,0 +1,72 @@
+import os
+from typing import List, Optional
+
+# Адреса Google, которые подменяются на GOOGLE_API_ENDPOINT
+GOOGLE_HOSTS = (
+    'https://sheets.googleapis.com',
+    'https://www.googleapis.com',
+)
+
+def api_endpoint() -> str:
+    """Куда вместо Google отправлять запросы (локальный стенд tools/fake_google.py); '' — в Google"""
+    return os.getenv('GOOGLE_API_ENDPOINT', '').rstrip('/')
+
+def rewrite_url(url: str, endpoint: Optional[str] = None) -> str:
+    endpoint = api_endpoint() if endpoint is None else endpoint
+    if endpoint:
+        for host in GOOGLE_HOSTS:
+            if url.startswith(host):
+                return endpoint + url[len(host):]
+    return url
+
+def google_credentials(scopes: List[str], credentials_json: Optional[str] = None):
+    """Учётные данные сервисного аккаунта.
+
+    С GOOGLE_API_ENDPOINT ключ не нужен и не используется: стенд не
+    проверяет токены, а обновление токена ушло бы в настоящий Google.
+    """
+    if api_endpoint():
+        from google.auth.credentials import AnonymousCredentials
+        return AnonymousCredentials()
+
+    import json
+    from google.oauth2.service_account import Credentials
+
+    service_account_key = credentials_json or os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY', '')
+    if not service_account_key:
+        raise ValueError("GOOGLE_SERVICE_ACCOUNT_KEY не найден в переменных окружения")
+    try:
+        creds_dict = json.loads(service_account_key)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"GOOGLE_SERVICE_ACCOUNT_KEY содержит невалидный JSON: {e}")
+    return Credentials.from_service_account_info(creds_dict, scopes=scopes)
+
+def discovery_options() -> dict:
+    """Дополнительные аргументы googleapiclient.discovery.build.
+
+    Описание API берётся из копии внутри библиотеки, поэтому подменить
+    нужно только адреса самих запросов (включая загрузку файлов в Drive).
+    """
+    endpoint = api_endpoint()
+    if not endpoint:
+        return {}
+
+    from googleapiclient.http import HttpRequest
+
+    class EndpointRequest(HttpRequest):
+        def __init__(self, http, postproc, uri, *args, **kwargs):
+            super().__init__(http, postproc, rewrite_url(uri, endpoint), *args, **kwargs)
+
+    return {'requestBuilder': EndpointRequest, 'static_discovery': True}
+
+def gspread_session():
+    """requests.Session для gspread, отправляющая запросы на GOOGLE_API_ENDPOINT"""
+    import requests
+
+    endpoint = api_endpoint()
+
+    class EndpointSession(requests.Session):
+        def request(self, method, url, *args, **kwargs):
+            return super().request(method, rewrite_url(url, endpoint), *args, **kwargs)
+
+    return EndpointSession()
@@ -1,130 +1,141 @@
-        import os
-        import json
-        from datetime import datetime
+import os
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
 
-        # Импорты Google — только если реально используется
-        service = None
-        if os.getenv('GOOGLE_SHEET_ID') and os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY'):
-            try:
-                from google.oauth2.service_account import Credentials
-                from googleapiclient.discovery import build
-                SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-                creds_json = json.loads(os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY'))
-                credentials = Credentials.from_service_account_info(creds_json, scopes=SCOPES)
-                service = build('sheets', 'v4', credentials=credentials)
-            except Exception as e:
-                print(f"⚠️ Ошибка инициализации Google Sheets: {e}")
+from bot.services.google_endpoint import api_endpoint, discovery_options, google_credentials
+from bot.services.sheet_rows import SheetRowIndex, parse_updated_range
+from bot.utils.config import SHEET_HEADERS, STATUS_COLORS
 
-        def find_row_by_request_id(request_id: str):
-            """Найти строку по ID заявки в столбце A"""
-            if not service:
-                return None
-            try:
-                sheet = service.spreadsheets()
-                result = sheet.values().get(
-                    spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
-                    range=f"{os.getenv('GOOGLE_SHEET_NAME', 'Заявки')}!A:A"
-                ).execute()
-                values = result.get('values', [])
-                for i, row in enumerate(values):
-                    if row and row[0] == request_id:
-                        return i + 1
-                return None
-            except Exception as e:
-                print(f"Ошибка поиска строки: {e}")
-                return None
+SHEET_COLUMNS = len(SHEET_HEADERS)
+# Последний столбец таблицы буквой (A…J)
+LAST_COLUMN = chr(ord('A') + SHEET_COLUMNS - 1)
+WHITE = {"red": 1.0, "green": 1.0, "blue": 1.0}
 
-        def update_sheet_row(request_ dict):
-            if not service:
-                return
-            row_index = find_row_by_request_id(request_data['id'])
-            if not row_index:
-                append_new_request_to_sheet(request_data)
-                return
+def build_service(credentials_json: Optional[str] = None):
+    """Клиент Sheets API v4; импорты Google — только если реально используется"""
+    from googleapiclient.discovery import build
+    SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+    credentials = google_credentials(SCOPES, credentials_json)
+    return build('sheets', 'v4', credentials=credentials, cache_discovery=False, **discovery_options())
 
-            row = [
-                request_data.get('id', ''),
-                request_data.get('first_name', ''),
-                request_data.get('last_name', ''),
-                request_data.get('group', ''),
-                request_data.get('purpose', ''),
-                request_data.get('file_name', ''),
-                request_data.get('status', ''),
-                request_data.get('comment', ''),
-                request_data.get('date', ''),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ]
+def request_to_row(request_data: Dict, status: Optional[str] = None) -> List:
+    """Строка таблицы в порядке SHEET_HEADERS"""
+    return [
+        request_data.get('id', ''),
+        request_data.get('first_name', ''),
+        request_data.get('last_name', ''),
+        request_data.get('group', ''),
+        request_data.get('purpose', ''),
+        request_data.get('file_name', ''),
+        status or request_data.get('status', 'В очереди'),
+        request_data.get('comment', ''),
+        request_data.get('date', ''),
+        datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    ]
 
-            sheet = service.spreadsheets()
-            range_name = f"{os.getenv('GOOGLE_SHEET_NAME', 'Заявки')}!A{row_index}:J{row_index}"
-            try:
-                sheet.values().update(
-                    spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
-                    range=range_name,
-                    valueInputOption="USER_ENTERED",
-                    body={"values": [row]}
-                ).execute()
-                _update_row_color(row_index, request_data.get('status', ''))
-            except Exception as e:
-                print(f"Ошибка обновления строки: {e}")
+def row_color_request(sheet_id: int, row_index: int, status: str) -> Dict:
+    """Запрос batchUpdate: цвет строки row_index (с 1) по статусу"""
+    return {
+        "repeatCell": {
+            "range": {
+                "sheetId": sheet_id,
+                "startRowIndex": row_index - 1,
+                "endRowIndex": row_index,
+                "startColumnIndex": 0,
+                "endColumnIndex": SHEET_COLUMNS
+            },
+            "cell": {"userEnteredFormat": {"backgroundColor": STATUS_COLORS.get(status, WHITE)}},
+            "fields": "userEnteredFormat.backgroundColor"
+        }
+    }
 
-        def append_new_request_to_sheet(request_ dict):
-            if not service:
-                return
-            row = [
-                request_data.get('id', ''),
-                request_data.get('first_name', ''),
-                request_data.get('last_name', ''),
-                request_data.get('group', ''),
-                request_data.get('purpose', ''),
-                request_data.get('file_name', ''),
-                request_data.get('status', 'В очереди'),
-                request_data.get('comment', ''),
-                request_data.get('date', ''),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            ]
-            try:
-                sheet = service.spreadsheets()
-                sheet.values().append(
-                    spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
-                    range=f"{os.getenv('GOOGLE_SHEET_NAME', 'Заявки')}!A:J",
-                    valueInputOption="USER_ENTERED",
-                    insertDataOption="INSERT_ROWS",
-                    body={"values": [row]}
-                ).execute()
-                row_index = find_row_by_request_id(request_data['id'])
-                if row_index:
-                    _update_row_color(row_index, request_data.get('status', 'В очереди'))
-            except Exception as e:
-                print(f"Ошибка добавления заявки в таблицу: {e}")
+service = None
+if os.getenv('GOOGLE_SHEET_ID') and (os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY') or api_endpoint()):
+    try:
+        service = build_service()
+    except Exception as e:
+        print(f"⚠️ Ошибка инициализации Google Sheets: {e}")
 
-        def _update_row_color(row_index: int, status: str):
-            if not service:
-                return
-            color = {
-                "В очереди": {"red": 1.0, "green": 1.0, "blue": 0.8},
-                "В работе": {"red": 1.0, "green": 0.92, "blue": 0.0},
-                "Готово": {"red": 0.85, "green": 1.0, "blue": 0.85},
-                "Архив": {"red": 0.93, "green": 0.93, "blue": 0.93},
-            }.get(status, {"red": 1.0, "green": 1.0, "blue": 1.0})
+def _sheet_name() -> str:
+    return os.getenv('GOOGLE_SHEET_NAME', 'Заявки')
 
-            requests = [{
-                "repeatCell": {
-                    "range": {
-                        "sheetId": 0,
-                        "startRowIndex": row_index - 1,
-                        "endRowIndex": row_index,
-                        "startColumnIndex": 0,
-                        "endColumnIndex": 10
-                    },
-                    "cell": {"userEnteredFormat": {"backgroundColor": color}},
-                    "fields": "userEnteredFormat.backgroundColor"
-                }
-            }]
-            try:
-                service.spreadsheets().batchUpdate(
-                    spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
-                    body={"requests": requests}
-                ).execute()
-            except Exception as e:
-                print(f"Ошибка раскраски: {e}")
\ No newline at end of file
+# Общий для этих функций и SheetsSyncEngine индекс строк
+sheet_rows = SheetRowIndex('data/sheet_rows.json', os.getenv('GOOGLE_SHEET_ID', ''), _sheet_name())
+
+def read_id_column(result: Dict) -> List[str]:
+    """Значения столбца A из ответа values.get (пустые строки таблицы — '')"""
+    return [row[0] if row else '' for row in result.get('values', [])]
+
+def rebuild_row_index():
+    """Прочитать столбец A и построить индекс строк заново"""
+    result = service.spreadsheets().values().get(
+        spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
+        range=f"{_sheet_name()}!A:A"
+    ).execute()
+    sheet_rows.rebuild(read_id_column(result))
+
+def find_row_by_request_id(request_id: str):
+    """Номер строки заявки по индексу; столбец A читается, только если индекса ещё нет"""
+    if not service:
+        return None
+    try:
+        if not sheet_rows.ready:
+            rebuild_row_index()
+        return sheet_rows.get(request_id)
+    except Exception as e:
+        print(f"Ошибка поиска строки: {e}")
+        return None
+
+def update_sheet_row(request_data: Dict):
+    if not service:
+        return
+    row_index = find_row_by_request_id(request_data['id'])
+    if not row_index:
+        append_new_request_to_sheet(request_data)
+        return
+
+    sheet = service.spreadsheets()
+    range_name = f"{_sheet_name()}!A{row_index}:{LAST_COLUMN}{row_index}"
+    try:
+        sheet.values().update(
+            spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
+            range=range_name,
+            valueInputOption="USER_ENTERED",
+            body={"values": [request_to_row(request_data)]}
+        ).execute()
+        _update_row_color(row_index, request_data.get('status', ''))
+    except Exception as e:
+        print(f"Ошибка обновления строки: {e}")
+
+def append_new_request_to_sheet(request_data: Dict):
+    if not service:
+        return
+    try:
+        sheet = service.spreadsheets()
+        result = sheet.values().append(
+            spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
+            range=f"{_sheet_name()}!A:{LAST_COLUMN}",
+            valueInputOption="USER_ENTERED",
+            insertDataOption="INSERT_ROWS",
+            body={"values": [request_to_row(request_data)]}
+        ).execute()
+        # Номер новой строки — из ответа, без повторного чтения столбца
+        row_number, _ = parse_updated_range(result['updates']['updatedRange'])
+        if not sheet_rows.appended([request_data['id']], row_number):
+            print("Строки таблицы сдвинулись, индекс строк строится заново")
+            rebuild_row_index()
+        _update_row_color(row_number, request_data.get('status', 'В очереди'))
+    except Exception as e:
+        print(f"Ошибка добавления заявки в таблицу: {e}")
+
+def _update_row_color(row_index: int, status: str):
+    if not service:
+        return
+    try:
+        service.spreadsheets().batchUpdate(
+            spreadsheetId=os.getenv('GOOGLE_SHEET_ID'),
+            body={"requests": [row_color_request(0, row_index, status)]}
+        ).execute()
+    except Exception as e:
+        print(f"Ошибка раскраски: {e}")
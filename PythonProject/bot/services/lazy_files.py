@@ -0,0 +1,190 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from bot.services.uploads import UploadRejected, download_stl
+
+UPLOAD_EAGER = 'eager'
+UPLOAD_LAZY = 'lazy'
+
+class LazyFileFetcher:
+    """Режим UPLOAD_MODE=lazy: модели остаются на серверах Telegram, пока не понадобятся.
+
+    При подаче в заявке сохраняются только file_id и размер. Байты скачиваются
+    (с той же проверкой STL на лету) по требованию — для превью — и заранее
+    для prefetch_count следующих заявок очереди, после чего модель уходит
+    в обычную обработку. Скачанные так файлы лежат в BlobStore; их общий
+    объём ограничен max_bytes: давно не нужные удаляются с диска, file_id
+    остаётся в заявке и файл можно скачать снова.
+    """
+
+    def __init__(self, bot, db, blob_store, model_jobs, queue_scheduler,
+                 max_bytes: int, max_size: int, prefetch_count: int = 3):
+        self.bot = bot
+        self.db = db
+        self.blob_store = blob_store
+        self.model_jobs = model_jobs
+        self.queue_scheduler = queue_scheduler
+        self.max_bytes = max_bytes
+        self.prefetch_count = prefetch_count
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # id заявки → размер скачанного файла; порядок — LRU
+        self._cached: OrderedDict = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loop = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task = None
+
+    def load(self, requests):
+        """Учесть файлы, скачанные до перезапуска (давно изменённые — первыми на удаление)"""
+        fetched = []
+        for request in requests:
+            file_path = request.get('file_path')
+            if request.get('upload_mode') == UPLOAD_LAZY and file_path and os.path.exists(file_path):
+                fetched.append((os.path.getmtime(file_path), request['id'], os.path.getsize(file_path)))
+        with self._lock:
+            for _, request_id, size in sorted(fetched):
+                self._cached[request_id] = size
+                self._size += size
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._prefetch_loop(), name='lazy-prefetch')
+        self._wakeup.set()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def on_db_event(self, event: str, request: Dict):
+        """Подписчик БД: очередь могла сдвинуться — разбудить предзагрузку.
+
+        Вызывается в потоке БД, поэтому будим через call_soon_threadsafe;
+        несколько событий подряд сливаются в один проход.
+        """
+        if event in ('delete', 'archive', 'purge_archive'):
+            with self._lock:
+                size = self._cached.pop(request.get('id'), None)
+                if size is not None:
+                    self._size -= size
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _prefetch_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                await self.prefetch()
+            except Exception as e:
+                print(f"Ошибка предзагрузки моделей: {e}")
+
+    async def prefetch(self):
+        """Скачать модели следующих заявок очереди, по одной (канал у Pi узкий)"""
+        for request_id in self.queue_scheduler.upcoming(self.prefetch_count):
+            request = await self.db.get_request_by_id(request_id)
+            if not request or self._is_local(request) or request.get('fetch_error'):
+                continue
+            try:
+                await self.fetch(request_id)
+            except Exception as e:
+                print(f"Ошибка предзагрузки модели заявки {request_id}: {e}")
+
+    @staticmethod
+    def _is_local(request: Dict) -> bool:
+        file_path = request.get('file_path')
+        return bool(file_path) and os.path.exists(file_path)
+
+    async def fetch(self, request_id: str) -> Dict:
+        """Скачать модель заявки, если её нет на диске; вернуть заявку с file_path.
+
+        Одновременные запросы одной заявки ждут одно скачивание.
+        UploadRejected — файл не прошёл проверку (причина сохраняется в заявке).
+        """
+        future = self._inflight.get(request_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(request_id))
+            self._inflight[request_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(request_id, None))
+        return await asyncio.shield(future)
+
+    async def _fetch(self, request_id: str) -> Dict:
+        request = await self.db.get_request_by_id(request_id)
+        if not request:
+            raise FileNotFoundError("Заявка не найдена")
+        if self._is_local(request):
+            self._touch(request_id, request['file_path'])
+            return request
+        if not request.get('tg_file_id'):
+            raise FileNotFoundError("Файл не найден ни на сервере, ни в Telegram")
+
+        os.makedirs('uploads/tmp', exist_ok=True)
+        tmp_path = f"uploads/tmp/{request_id}.stl"
+        file = await self.bot.get_file(request['tg_file_id'])
+        try:
+            file_info = await download_stl(
+                file,
+                tmp_path,
+                max_size=self.max_size,
+                expected_size=request.get('file_size')
+            )
+        except UploadRejected as e:
+            await self.db.update_fields(request_id, {'fetch_error': str(e)})
+            raise
+
+        file_path = self.blob_store.put(tmp_path, file_info['file_hash'], request_id)
+        fields = {'file_path': file_path, **file_info}
+        await self.db.update_fields(request_id, fields)
+        request.update(fields)
+        self._touch(request_id, file_path)
+
+        if not request.get('model_stats'):
+            await self.db.run(
+                self.model_jobs.submit, request_id, file_path, file_info['stl_format'], file_info['file_hash']
+            )
+        await self._evict(keep=request_id)
+        return request
+
+    def _touch(self, request_id: str, file_path: str):
+        with self._lock:
+            if request_id in self._cached:
+                self._cached.move_to_end(request_id)
+                return
+            size = os.path.getsize(file_path)
+            self._cached[request_id] = size
+            self._size += size
+
+    async def _evict(self, keep: str):
+        """Удалить с диска давно не нужные модели сверх max_bytes.
+
+        Только что скачанную модель и модели ближайших заявок очереди не трогаем,
+        иначе предзагрузка скачивала бы их по кругу.
+        """
+        protected = set(self.queue_scheduler.upcoming(self.prefetch_count))
+        protected.add(keep)
+        with self._lock:
+            victims = []
+            excess = self._size - self.max_bytes
+            for request_id, size in self._cached.items():
+                if excess <= 0:
+                    break
+                if request_id not in protected:
+                    victims.append(request_id)
+                    excess -= size
+            for request_id in victims:
+                self._size -= self._cached.pop(request_id)
+
+        for request_id in victims:
+            request = await self.db.get_request_by_id(request_id)
+            if not request or not request.get('file_hash'):
+                continue
+            # Файл общий с другими заявками — удалится вместе с последней ссылкой
+            self.blob_store.release(request['file_hash'], request_id)
+            await self.db.update_fields(request_id, {'file_path': None})
@@ -1,45 +1,290 @@
 import json
 import os
+import threading
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, Optional
+
+from bot.services.query import ORDER_ASC, ORDER_DESC, matches, paginate_rows
+
+STORAGE_JSON = 'json'
+STORAGE_JOURNAL = 'journal'
 
 class LocalDatabase:
-    def __init__(self, db_file='data/requests.json', archive_file='data/archive.json'):
+    """Локальная БД заявок.
+
+    Данные загружаются в память один раз при старте и держатся там вместе с индексами
+    (по id, по статусу, по telegram_id); каждое изменение сразу записывается на диск.
+    Все операции идут под одной блокировкой, читатели получают копии заявок,
+    поэтому БД можно использовать из нескольких потоков (обработчики, планировщик).
+
+    Режим 'json' перезаписывает requests.json/archive.json целиком на каждое изменение.
+    Режим 'journal' дописывает каждое изменение одной строкой в журнал (requests.log);
+    файлы JSON служат снимком, который периодически пересобирается в фоне,
+    а при старте снимок + журнал проигрываются заново.
+    """
+
+    def __init__(self, db_file='data/requests.json', archive_file='data/archive.json',
+                 storage_mode: str = STORAGE_JSON, compact_every: int = 500):
         self.db_file = db_file
         self.archive_file = archive_file
+        self.storage_mode = storage_mode
+        self.compact_every = compact_every
+        self.log_file = os.path.splitext(db_file)[0] + '.log'
+        self._compacting_file = self.log_file + '.compacting'
+        self._lock = threading.RLock()
+        self._log = None
+        self._log_records = 0
+        self._compaction_thread = None
+        self._listeners = []
+
+        # Резидентная модель: словари сохраняют порядок добавления
+        self._requests: Dict[str, Dict] = {}
+        self._archive: Dict[str, Dict] = {}
+        self._by_status: Dict[str, Dict[str, None]] = {}
+        self._by_user: Dict[str, Dict[str, None]] = {}
+
         os.makedirs(os.path.dirname(db_file), exist_ok=True)
         self._init_db()
-    
+
     def _init_db(self):
         if not os.path.exists(self.db_file):
-            self._save_data([])
+            self._write_json(self.db_file, [])
         if not os.path.exists(self.archive_file):
-            self._save_archive([])
-    
-    def _load_data(self) -> List[Dict]:
+            self._write_json(self.archive_file, [])
+
+        for request in self._read_json(self.db_file):
+            self._requests[request.get('id')] = request
+            self._index(request)
+        for request in self._read_json(self.archive_file):
+            self._archive[request.get('id')] = request
+
+        if self.storage_mode == STORAGE_JOURNAL:
+            # Хвост незавершённой компакции старше текущего журнала
+            for path in (self._compacting_file, self.log_file):
+                self._replay(path)
+            # Сворачиваем всё проигранное в снимок, чтобы начать с пустого журнала
+            self._write_snapshot(self._data_list(), self._archive_list())
+            for path in (self._compacting_file, self.log_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._log = open(self.log_file, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _read_json(path: str) -> List[Dict]:
         try:
-            with open(self.db_file, 'r', encoding='utf-8') as f:
+            with open(path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except (FileNotFoundError, json.JSONDecodeError):
             return []
-    
-    def _save_data(self, data: List[Dict]):
-        with open(self.db_file, 'w', encoding='utf-8') as f:
+
+    @staticmethod
+    def _write_json(path: str, data: List[Dict]):
+        with open(path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    def _load_archive(self) -> List[Dict]:
-        try:
-            with open(self.archive_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-    
-    def _save_archive(self, data: List[Dict]):
-        with open(self.archive_file, 'w', encoding='utf-8') as f:
+
+    @staticmethod
+    def _write_json_atomic(path: str, data: List[Dict]):
+        """Записать JSON через временный файл, чтобы обрыв не испортил снимок"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
-    
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _data_list(self) -> List[Dict]:
+        return list(self._requests.values())
+
+    def _archive_list(self) -> List[Dict]:
+        return list(self._archive.values())
+
+    def _save_data(self):
+        self._write_json_atomic(self.db_file, self._data_list())
+
+    def _save_archive(self):
+        self._write_json_atomic(self.archive_file, self._archive_list())
+
+    # --- Индексы ---
+
+    def _index(self, request: Dict):
+        request_id = request.get('id')
+        self._by_status.setdefault(request.get('status'), {})[request_id] = None
+        self._by_user.setdefault(str(request.get('telegram_id')), {})[request_id] = None
+
+    def _unindex(self, request: Dict):
+        request_id = request.get('id')
+        self._by_status.get(request.get('status'), {}).pop(request_id, None)
+        self._by_user.get(str(request.get('telegram_id')), {}).pop(request_id, None)
+
+    # --- Изменения ---
+
+    def _apply(self, op: Dict) -> List[Dict]:
+        """Применить изменение к данным в памяти (повторное применение безопасно).
+
+        Возвращает затронутые заявки; пустой список — изменение ничего не поменяло.
+        """
+        kind = op.get('op')
+        request_id = op.get('id')
+
+        if kind == 'add':
+            request = op['request']
+            if request.get('id') in self._requests:
+                return []
+            self._requests[request.get('id')] = request
+            self._index(request)
+            return [request]
+
+        if kind == 'set':
+            request = self._requests.get(request_id)
+            if request is None:
+                return []
+            fields = op['fields']
+            if 'status' in fields:
+                self._by_status.get(request.get('status'), {}).pop(request_id, None)
+                self._by_status.setdefault(fields['status'], {})[request_id] = None
+            request.update(fields)
+            return [request]
+
+        if kind == 'delete':
+            request = self._requests.pop(request_id, None)
+            if request is None:
+                return []
+            self._unindex(request)
+            return [request]
+
+        if kind == 'archive':
+            request = self._requests.pop(request_id, None)
+            if request is None:
+                return []
+            self._unindex(request)
+            request.setdefault('archived_date', op['archived_date'])
+            self._archive.setdefault(request_id, request)
+            return [request]
+
+        if kind == 'purge_archive':
+            removed = [self._archive.pop(i, None) for i in op['ids']]
+            return [r for r in removed if r is not None]
+
+        return []
+
+    def _commit(self, ops: List[Dict]):
+        """Записать применённые изменения на диск: строки в журнал или перезапись файлов"""
+        if not ops:
+            return
+        if self.storage_mode == STORAGE_JOURNAL:
+            for op in ops:
+                self._append(op)
+            return
+        kinds = {op['op'] for op in ops}
+        # Архив раньше заявок, как и в _write_snapshot: заявка не теряется между файлами
+        if kinds & {'archive', 'purge_archive'}:
+            self._save_archive()
+        if kinds & {'add', 'set', 'delete', 'archive'}:
+            self._save_data()
+
+    def _mutate(self, op: Dict) -> bool:
+        with self._lock:
+            affected = self._apply(op)
+            if not affected:
+                return False
+            self._commit([op])
+            self._emit(op['op'], affected)
+            return True
+
+    # --- Подписчики ---
+
+    def subscribe(self, callback):
+        """Подписаться на изменения: callback(event, request) после записи на диск.
+
+        event — вид изменения ('add', 'set', 'delete', 'archive', 'purge_archive'),
+        request — копия заявки после изменения (для удаления — последнее состояние).
+        Вызывается под блокировкой БД, поэтому должен быть быстрым.
+        """
+        self._listeners.append(callback)
+
+    def _emit(self, event: str, requests: List[Dict]):
+        for callback in self._listeners:
+            for request in requests:
+                try:
+                    callback(event, dict(request))
+                except Exception as e:
+                    print(f"Ошибка подписчика БД ({event}): {e}")
+
+    # --- Журнал ---
+
+    def _append(self, op: Dict):
+        self._log.write(json.dumps(op, ensure_ascii=False) + '\n')
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._log_records += 1
+
+        if self._log_records >= self.compact_every and not self._compaction_running():
+            self._compaction_thread = threading.Thread(target=self.compact, name='db-compaction', daemon=True)
+            self._compaction_thread.start()
+
+    def _compaction_running(self) -> bool:
+        return self._compaction_thread is not None and self._compaction_thread.is_alive()
+
+    def _replay(self, path: str):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    # Оборванная при падении последняя запись
+                    print(f"Пропущена повреждённая запись журнала в {path}")
+                    continue
+                self._apply(op)
+
+    def _write_snapshot(self, data: List[Dict], archive: List[Dict]):
+        # Сначала архив: при сбое между файлами заархивированная заявка останется
+        # в старом requests.json, и запись 'archive' из журнала перенесёт её снова
+        self._write_json_atomic(self.archive_file, archive)
+        self._write_json_atomic(self.db_file, data)
+
+    def compact(self):
+        """Свернуть журнал в снимок (requests.json/archive.json)"""
+        if self.storage_mode != STORAGE_JOURNAL:
+            return
+
+        with self._lock:
+            data = [dict(r) for r in self._requests.values()]
+            archive = [dict(r) for r in self._archive.values()]
+
+            self._log.close()
+            if os.path.exists(self._compacting_file):
+                # Прошлая компакция не завершилась — дописываем журнал к её хвосту
+                with open(self.log_file, 'r', encoding='utf-8') as src, \
+                        open(self._compacting_file, 'a', encoding='utf-8') as dst:
+                    dst.write(src.read())
+                os.remove(self.log_file)
+            else:
+                os.replace(self.log_file, self._compacting_file)
+            self._log = open(self.log_file, 'a', encoding='utf-8')
+            self._log_records = 0
+
+        try:
+            self._write_snapshot(data, archive)
+            os.remove(self._compacting_file)
+        except Exception as e:
+            print(f"Ошибка компакции журнала: {e}")
+
+    def close(self):
+        if self.storage_mode == STORAGE_JOURNAL and self._log:
+            if self._compaction_running():
+                self._compaction_thread.join()
+            self.compact()
+            self._log.close()
+            self._log = None
+
+    # --- Заявки ---
+
     def add_request(self, request_data: Dict):
-        data = self._load_data()
         request = {
             'id': request_data.get('id', ''),
             'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -50,131 +295,158 @@ class LocalDatabase:
             'status': 'В очереди',
             'file_name': request_data.get('file_name', ''),
             'file_path': request_data.get('file_path', ''),
+            'file_hash': request_data.get('file_hash', ''),
+            'file_size': request_data.get('file_size', 0),
+            'stl_format': request_data.get('stl_format', ''),
+            'triangles': request_data.get('triangles', 0),
+            'tg_file_id': request_data.get('tg_file_id', ''),
+            'upload_mode': request_data.get('upload_mode', 'eager'),
             'telegram_id': request_data.get('telegram_id', ''),
             'username': request_data.get('username', ''),
             'comment': '',
             'completed_date': None
         }
-        data.append(request)
-        self._save_data(data)
-    
-    def update_status(self, request_id: str, new_status: str) -> bool:
-        data = self._load_data()
-        for request in data:
-            if request.get('id') == request_id:
-                request['status'] = new_status
-                self._save_data(data)
-                return True
-        return False
-    
+        self._mutate({'op': 'add', 'request': request})
+
+    def update_status(self, request_id: str, new_status: str, expected_status: Optional[str] = None) -> bool:
+        """Сменить статус; с expected_status — только если заявка всё ещё в этом статусе"""
+        with self._lock:
+            request = self._requests.get(request_id)
+            if request is None:
+                return False
+            if expected_status is not None and request.get('status') != expected_status:
+                return False
+            return self._mutate({'op': 'set', 'id': request_id, 'fields': {'status': new_status}})
+
     def get_all_requests(self) -> List[Dict]:
-        return self._load_data()
-    
+        with self._lock:
+            return [dict(r) for r in self._requests.values()]
+
+    def _get_by_status(self, status: str) -> List[Dict]:
+        with self._lock:
+            return [dict(self._requests[i]) for i in self._by_status.get(status, {})]
+
     def get_pending_requests(self) -> List[Dict]:
-        data = self._load_data()
-        return [r for r in data if r.get('status') == 'В очереди']
-    
+        return self._get_by_status('В очереди')
+
     def get_in_progress_requests(self) -> List[Dict]:
-        data = self._load_data()
-        return [r for r in data if r.get('status') == 'В работе']
-    
+        return self._get_by_status('В работе')
+
     def get_completed_requests(self) -> List[Dict]:
-        data = self._load_data()
-        return [r for r in data if r.get('status') == 'Готово']
-    
+        return self._get_by_status('Готово')
+
     def get_pending_count(self) -> int:
-        return len(self.get_pending_requests())
-    
+        return len(self._by_status.get('В очереди', {}))
+
     def get_request_by_id(self, request_id: str) -> Optional[Dict]:
-        data = self._load_data()
-        for request in data:
-            if request.get('id') == request_id:
-                return request
-        return None
-    
+        with self._lock:
+            request = self._requests.get(request_id)
+            return dict(request) if request is not None else None
+
+    def get_user_requests(self, telegram_id) -> List[Dict]:
+        """Активные заявки пользователя"""
+        with self._lock:
+            return [dict(self._requests[i]) for i in self._by_user.get(str(telegram_id), {})]
+
+    def query(self, filters: Optional[Dict] = None, order: str = ORDER_ASC, cursor: Optional[str] = None,
+              limit: int = 5, archived: bool = False) -> Dict:
+        """Страница заявок с фильтрами (status, group, purpose, telegram_id) и курсором.
+
+        Активные сортируются по дате подачи, архив — по дате архивации.
+        Возвращает {'items', 'next', 'prev', 'offset', 'total'}; курсоры передаются обратно как есть,
+        offset — для offset_cursor, если курсор не влезает в callback_data.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        sort_field = 'archived_date' if archived else 'date'
+
+        with self._lock:
+            if archived:
+                source = self._archive.values()
+            elif 'status' in filters:
+                source = (self._requests[i] for i in self._by_status.get(filters['status'], {}))
+            elif 'telegram_id' in filters:
+                source = (self._requests[i] for i in self._by_user.get(str(filters['telegram_id']), {}))
+            else:
+                source = self._requests.values()
+
+            rows = [r for r in source if matches(r, filters)]
+            # Порядок вставки и так почти всегда совпадает с датой — сортировка за O(n)
+            rows.sort(key=lambda r: (r.get(sort_field) or '', r.get('id')), reverse=order == ORDER_DESC)
+
+            page = paginate_rows(rows, sort_field, order, cursor, limit)
+            page['items'] = [dict(r) for r in page['items']]
+            page['total'] = len(rows)
+            return page
+
+    def iter_requests(self, archived: bool = False, batch_size: int = 500) -> Iterator[Dict]:
+        """Все активные (или архивные) заявки порциями, без копии всей таблицы.
+
+        Блокировка берётся на одну порцию, поэтому долгая выгрузка не мешает записи.
+        """
+        with self._lock:
+            ids = list(self._archive if archived else self._requests)
+        for start in range(0, len(ids), batch_size):
+            with self._lock:
+                source = self._archive if archived else self._requests
+                batch = [dict(source[i]) for i in ids[start:start + batch_size] if i in source]
+            yield from batch
+
     def delete_request(self, request_id: str) -> bool:
-        data = self._load_data()
-        original_len = len(data)
-        data = [r for r in data if r.get('id') != request_id]
-        if len(data) < original_len:
-            self._save_data(data)
-            return True
-        return False
-    
+        return self._mutate({'op': 'delete', 'id': request_id})
+
+    def update_fields(self, request_id: str, fields: Dict) -> bool:
+        """Записать произвольные поля заявки (результаты обработки и т.п.)"""
+        return self._mutate({'op': 'set', 'id': request_id, 'fields': dict(fields)})
+
     def add_comment(self, request_id: str, comment: str) -> bool:
         """Добавить комментарий к заявке"""
-        data = self._load_data()
-        for request in data:
-            if request.get('id') == request_id:
-                request['comment'] = comment
-                self._save_data(data)
-                return True
-        return False
-    
+        return self._mutate({'op': 'set', 'id': request_id, 'fields': {'comment': comment}})
+
     def archive_request(self, request_id: str) -> bool:
         """Переместить заявку в архив"""
-        data = self._load_data()
-        archive = self._load_archive()
-        
-        for i, request in enumerate(data):
-            if request.get('id') == request_id:
-                # Добавляем дату архивации
-                request['archived_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                archive.append(request)
-                data.pop(i)
-                
-                self._save_data(data)
-                self._save_archive(archive)
-                return True
-        return False
-    
+        archived_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return self._mutate({'op': 'archive', 'id': request_id, 'archived_date': archived_date})
+
     def get_archive(self) -> List[Dict]:
         """Получить все архивные заявки"""
-        return self._load_archive()
-    
+        with self._lock:
+            return [dict(r) for r in self._archive.values()]
+
     def clean_old_archive(self, days: int = 14) -> int:
         """Очистить архив старше указанного количества дней"""
-        archive = self._load_archive()
         cutoff_date = datetime.now() - timedelta(days=days)
-        
-        cleaned_count = 0
-        new_archive = []
-        
-        for request in archive:
-            archived_date_str = request.get('archived_date')
-            if archived_date_str:
-                archived_date = datetime.strptime(archived_date_str, '%Y-%m-%d %H:%M:%S')
-                if archived_date >= cutoff_date:
-                    new_archive.append(request)
-                else:
-                    cleaned_count += 1
-            else:
-                new_archive.append(request)
-        
-        self._save_archive(new_archive)
-        return cleaned_count
-    
+
+        with self._lock:
+            removed_ids = []
+            for request in self._archive.values():
+                archived_date_str = request.get('archived_date')
+                if archived_date_str:
+                    archived_date = datetime.strptime(archived_date_str, '%Y-%m-%d %H:%M:%S')
+                    if archived_date < cutoff_date:
+                        removed_ids.append(request.get('id'))
+
+            if removed_ids:
+                self._mutate({'op': 'purge_archive', 'ids': removed_ids})
+            return len(removed_ids)
+
     def manual_cleanup(self) -> Dict[str, int]:
         """Ручная очистка старых заявок из основной БД"""
-        data = self._load_data()
-        archive = self._load_archive()
-        
-        # Переносим все "Готово" в архив
-        completed = [r for r in data if r.get('status') == 'Готово']
-        remaining = [r for r in data if r.get('status') != 'Готово']
-        
-        for request in completed:
-            if 'archived_date' not in request:
-                request['archived_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            archive.append(request)
-        
-        self._save_data(remaining)
-        self._save_archive(archive)
-        
-        # Очищаем старый архив
-        archived_cleaned = self.clean_old_archive(14)
-        
+        archived_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        with self._lock:
+            # Переносим все "Готово" в архив одной записью на диск
+            ops = [
+                {'op': 'archive', 'id': request_id, 'archived_date': archived_date}
+                for request_id in list(self._by_status.get('Готово', {}))
+            ]
+            affected = [r for op in ops for r in self._apply(op)]
+            self._commit(ops)
+            self._emit('archive', affected)
+
+            # Очищаем старый архив
+            archived_cleaned = self.clean_old_archive(14)
+
         return {
-            'moved_to_archive': len(completed),
+            'moved_to_archive': len(ops),
             'cleaned_from_archive': archived_cleaned
         }
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+from typing import Dict, Optional, Tuple
+
+from bot.services.preview import render_preview
+from bot.services.stl_analyzer import analyze_stl
+
+def process_model(file_path: str, stl_format: Optional[str], options: Dict,
+                  preview_path: Optional[str] = None) -> Dict:
+    """Обработка модели в процессе-воркере; возвращает поля для записи в заявку"""
+    stats = analyze_stl(
+        file_path,
+        stl_format,
+        options['rate_cm3_per_hour'],
+        options['overhead_minutes'],
+        options['bed_mm']
+    )
+    # Превью — необязательная часть: его ошибка не должна терять геометрию
+    if preview_path and not os.path.exists(preview_path):
+        try:
+            render_preview(file_path, preview_path, stl_format, options['preview_size'])
+        except Exception as e:
+            print(f"Ошибка построения превью {file_path}: {e}")
+    return {'model_stats': stats}
+
+class ModelJobQueue:
+    """Очередь тяжёлой обработки загруженных моделей в пуле процессов.
+
+    Состояние задачи хранится прямо в заявке (поле processing: queued/done/failed),
+    поэтому незавершённые задачи после перезапуска бота ставятся в очередь заново.
+    Число процессов по умолчанию — число ядер (на Raspberry Pi — 4).
+    """
+
+    def __init__(self, db, max_workers: Optional[int] = None,
+                 rate_cm3_per_hour: float = 10.0, overhead_minutes: float = 10.0,
+                 bed_mm: Optional[Tuple[float, float, float]] = None, max_attempts: int = 3,
+                 preview_cache=None, preview_size: int = 320):
+        self.db = db
+        self.preview_cache = preview_cache
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_attempts = max_attempts
+        self.options = {
+            'rate_cm3_per_hour': rate_cm3_per_hour,
+            'overhead_minutes': overhead_minutes,
+            'bed_mm': bed_mm,
+            'preview_size': preview_size,
+        }
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn: воркеры не наследуют потоки планировщика и пула БД
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def _submit(self, func, *args):
+        try:
+            return self._executor.submit(func, *args)
+        except BrokenProcessPool:
+            # Воркер упал (например, нехватка памяти) — пул больше не принимает задачи
+            self._executor = self._create_executor()
+            return self._executor.submit(func, *args)
+
+    def _preview_path(self, file_hash: Optional[str]) -> Optional[str]:
+        if self.preview_cache is None or not file_hash:
+            return None
+        return self.preview_cache.path_for(file_hash)
+
+    def submit(self, request_id: str, file_path: str, stl_format: Optional[str] = None,
+               file_hash: Optional[str] = None, attempt: int = 1):
+        """Поставить модель заявки в обработку"""
+        self.db.update_fields(request_id, {'processing': {
+            'state': 'queued',
+            'attempt': attempt,
+            'file_path': file_path,
+            'stl_format': stl_format,
+            'file_hash': file_hash,
+            'queued_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }})
+        future = self._submit(process_model, file_path, stl_format, self.options, self._preview_path(file_hash))
+        future.add_done_callback(partial(self._on_done, request_id, file_path, stl_format, file_hash, attempt))
+
+    def render_preview(self, file_path: str, file_hash: str, stl_format: Optional[str] = None):
+        """Построить превью вне очереди (например, вытесненное из кэша); возвращает Future пути"""
+        preview_path = self._preview_path(file_hash)
+        if preview_path is None:
+            raise ValueError("Кэш превью не подключён или у модели нет хэша")
+        future = self._submit(
+            render_preview, file_path, preview_path, stl_format, self.options['preview_size']
+        )
+        future.add_done_callback(partial(self._on_preview_done, file_hash))
+        return future
+
+    def _on_preview_done(self, file_hash: str, future):
+        if future.exception() is None and self.preview_cache is not None:
+            self.preview_cache.add(file_hash)
+
+    def _on_done(self, request_id: str, file_path: str, stl_format: Optional[str],
+                 file_hash: Optional[str], attempt: int, future):
+        finished_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            fields = future.result()
+        except Exception as e:
+            print(f"Ошибка обработки модели для заявки {request_id}: {e}")
+            self.db.update_fields(request_id, {'processing': {
+                'state': 'failed',
+                'attempt': attempt,
+                'file_path': file_path,
+                'stl_format': stl_format,
+                'file_hash': file_hash,
+                'error': str(e),
+                'finished_at': finished_at,
+            }})
+            return
+
+        fields['processing'] = {'state': 'done', 'attempt': attempt, 'finished_at': finished_at}
+        self.db.update_fields(request_id, fields)
+        if self.preview_cache is not None and file_hash:
+            self.preview_cache.add(file_hash)
+
+    def resume(self) -> int:
+        """Заново поставить задачи, не завершённые до перезапуска"""
+        resumed = 0
+        for request in self.db.get_all_requests():
+            processing = request.get('processing') or {}
+            if processing.get('state') != 'queued':
+                continue
+            attempt = processing.get('attempt', 1) + 1
+            if attempt > self.max_attempts:
+                self.db.update_fields(request['id'], {'processing': {
+                    **processing, 'state': 'failed', 'error': 'превышено число попыток'
+                }})
+                continue
+            self.submit(
+                request['id'],
+                processing.get('file_path'),
+                processing.get('stl_format'),
+                processing.get('file_hash') or request.get('file_hash'),
+                attempt
+            )
+            resumed += 1
+        return resumed
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
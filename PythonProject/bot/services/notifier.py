@@ -0,0 +1,186 @@
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional
+
+from telegram.error import RetryAfter, TimedOut, NetworkError
+
+class TokenBucket:
+    """Ведро токенов: не больше rate отправок в секунду со всплеском до capacity"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    def reserve(self) -> float:
+        """Занять токен заранее (в долг); вернуть, через сколько секунд им можно воспользоваться"""
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class NotificationDispatcher:
+    """Фоновая отправка уведомлений с учётом лимитов Telegram.
+
+    send_message только ставит сообщение в очередь; несколько воркеров отправляют
+    параллельно, соблюдая общий лимит бота и лимит на чат. Сообщение, которому
+    лимит чата пока не позволяет уйти, не ждёт в воркере, а откладывается до
+    своего времени — воркер берёт сообщения других чатов. На 429 (RetryAfter)
+    все отправки ставятся на паузу на указанное Telegram время и сообщение
+    повторяется; сетевые ошибки повторяются с экспоненциальной задержкой.
+    Отложенные сообщения и повторы считаются неотправленными, пока stop() их ждёт.
+    """
+
+    def __init__(self, bot, global_rate: float = 25, per_chat_rate: float = 1,
+                 workers: int = 4, max_retries: int = 3):
+        self.bot = bot
+        self.per_chat_rate = per_chat_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        # Отложенные сообщения: (когда можно отправить, порядковый номер, сообщение)
+        self._delayed: List[tuple] = []
+        self._delayed_seq = itertools.count()
+        self._delayed_changed: Optional[asyncio.Event] = None
+        # Сообщения, ещё не отправленные и не брошенные (в очереди, отложенные, в отправке)
+        self._unfinished = 0
+        self._drained: Optional[asyncio.Event] = None
+        self._tasks = []
+        self._paused_until = 0.0
+        self.sent = 0
+        self.failed = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._delayed_changed = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f'notifier-{i}')
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._release_delayed(), name='notifier-delayed'))
+
+    async def stop(self, timeout: float = 10):
+        """Дождаться отправки очереди и повторов (не дольше timeout) и остановить воркеров"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Не отправлено уведомлений при остановке: {self._unfinished}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def send_message(self, chat_id: int, text: str, **kwargs):
+        """Поставить сообщение в очередь отправки"""
+        self._unfinished += 1
+        self._drained.clear()
+        self._queue.put_nowait((chat_id, text, kwargs, 0, False))
+
+    def pending(self) -> int:
+        return self._unfinished
+
+    def _finished(self):
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._drained.set()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 1000:
+                # Выбрасываем вёдра простаивающих чатов
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.is_full()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    def _delay(self, delay: float, message: tuple):
+        heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._delayed_seq), message))
+        self._delayed_changed.set()
+
+    async def _release_delayed(self):
+        """Возвращать в очередь отложенные сообщения, чьё время пришло"""
+        while True:
+            self._delayed_changed.clear()
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                self._queue.put_nowait(heapq.heappop(self._delayed)[2])
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            try:
+                await asyncio.wait_for(self._delayed_changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._send(*message)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, chat_id: int, text: str, kwargs: dict, attempt: int, reserved: bool):
+        if not reserved:
+            # Токен чата занимается сразу: следующие сообщения чата встают за этим
+            wait = self._chat_bucket(chat_id).reserve()
+            if wait > 0:
+                self._delay(wait, (chat_id, text, kwargs, attempt, True))
+                return
+        await self._global_bucket.acquire()
+
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            self.sent += 1
+        except RetryAfter as e:
+            delay = e.retry_after
+            if isinstance(delay, timedelta):
+                delay = delay.total_seconds()
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._retry(chat_id, text, kwargs, attempt, delay, e)
+            return
+        except (TimedOut, NetworkError) as e:
+            self._retry(chat_id, text, kwargs, attempt, 2 ** attempt, e)
+            return
+        except Exception as e:
+            self.failed += 1
+            print(f"Не удалось отправить сообщение в чат {chat_id}: {e}")
+        self._finished()
+
+    def _retry(self, chat_id: int, text: str, kwargs: dict, attempt: int, delay: float, error: Exception):
+        if attempt >= self.max_retries:
+            self.failed += 1
+            print(f"Не удалось отправить сообщение в чат {chat_id} после {attempt + 1} попыток: {error}")
+            self._finished()
+            return
+        self._delay(delay, (chat_id, text, kwargs, attempt + 1, False))
@@ -0,0 +1,213 @@
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from bot.services.stl_analyzer import CHUNK_TRIANGLES, load_triangles
+
+# Направление на камеру (спереди-справа-сверху) и на источник света в координатах камеры
+VIEW_DIRECTION = (1.0, -1.0, 0.9)
+LIGHT_DIRECTION = (-0.4, 0.6, 1.0)
+BACKGROUND = (245, 245, 245)
+MODEL_COLOR = (70, 130, 200)
+# Точек на пиксель площади треугольника: при 8 незакрашенными остаются доли процента
+SAMPLES_PER_PIXEL = 8
+SAMPLE_BUDGET = 4_000_000
+
+def _camera_basis() -> np.ndarray:
+    """Строки матрицы — оси камеры: вправо, вверх, на зрителя"""
+    forward = np.array(VIEW_DIRECTION, dtype=np.float64)
+    forward /= np.linalg.norm(forward)
+    right = np.cross([0.0, 0.0, 1.0], forward)
+    right /= np.linalg.norm(right)
+    up = np.cross(forward, right)
+    return np.stack([right, up, forward])
+
+def render_preview(stl_path: str, out_path: str, stl_format: Optional[str] = None, size: int = 320) -> str:
+    """Нарисовать модель в PNG size×size без графических библиотек.
+
+    Ортографическая проекция с z-буфером: треугольники заполняются
+    случайными точками (число точек пропорционально площади на экране),
+    для каждого пикселя остаётся ближайшая точка с плоской заливкой.
+    """
+    triangles = load_triangles(stl_path, stl_format)
+    basis = _camera_basis()
+    light = np.array(LIGHT_DIRECTION, dtype=np.float64)
+    light /= np.linalg.norm(light)
+
+    # Первый проход — границы модели на экране
+    lo = np.full(2, np.inf)
+    hi = np.full(2, -np.inf)
+    for start in range(0, len(triangles), CHUNK_TRIANGLES):
+        flat = np.asarray(triangles[start:start + CHUNK_TRIANGLES], dtype=np.float64).reshape(-1, 3)
+        screen = flat @ basis[:2].T
+        lo = np.minimum(lo, screen.min(axis=0))
+        hi = np.maximum(hi, screen.max(axis=0))
+
+    margin = size * 0.05
+    extent = float(max((hi - lo).max(), 1e-9)) if len(triangles) else 1.0
+    scale = (size - 2 * margin) / extent
+    # Центрируем модель в кадре
+    offset = (size - (hi - lo) * scale) / 2 if len(triangles) else np.zeros(2)
+
+    zbuf = np.full(size * size, -np.inf)
+    shade = np.zeros(size * size)
+    rng = np.random.default_rng(0)
+
+    for start in range(0, len(triangles), CHUNK_TRIANGLES):
+        cam = np.asarray(triangles[start:start + CHUNK_TRIANGLES], dtype=np.float64) @ basis.T
+        # Пиксельные координаты: x вправо, y вниз
+        px = np.empty_like(cam)
+        px[..., 0] = (cam[..., 0] - lo[0]) * scale + offset[0]
+        px[..., 1] = (hi[1] - cam[..., 1]) * scale + offset[1]
+        px[..., 2] = cam[..., 2]
+
+        e1 = cam[:, 1] - cam[:, 0]
+        e2 = cam[:, 2] - cam[:, 0]
+        normal = np.cross(e1, e2)
+        length = np.linalg.norm(normal, axis=1)
+        length[length == 0] = 1.0
+        # Нормали в STL часто развёрнуты, поэтому освещаем обе стороны
+        intensity = 0.3 + 0.7 * np.abs(normal @ light) / length
+
+        area_px = 0.5 * np.abs(normal[:, 2]) * scale * scale
+        # Модель вписана в кадр, так что площадь треугольника не больше size²
+        counts = np.maximum(1, np.ceil(area_px * SAMPLES_PER_PIXEL)).astype(np.int64)
+        total = int(counts.sum())
+        if total > SAMPLE_BUDGET:
+            counts = np.maximum(1, counts * SAMPLE_BUDGET // total)
+            total = int(counts.sum())
+
+        tri_idx = np.repeat(np.arange(len(cam)), counts)
+        # Равномерная точка в треугольнике: барицентрические координаты через sqrt
+        s = np.sqrt(rng.random(total))
+        r = rng.random(total)
+        a = (1 - s)[:, None]
+        b = (s * (1 - r))[:, None]
+        c = (s * r)[:, None]
+        points = a * px[tri_idx, 0] + b * px[tri_idx, 1] + c * px[tri_idx, 2]
+
+        ix = np.clip(points[:, 0].astype(np.int64), 0, size - 1)
+        iy = np.clip(points[:, 1].astype(np.int64), 0, size - 1)
+        pixel = iy * size + ix
+        depth = points[:, 2]
+
+        # Для каждого пикселя — самая близкая к камере точка куска
+        order = np.lexsort((-depth, pixel))
+        sorted_pixel = pixel[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_pixel[1:] != sorted_pixel[:-1]
+        best = order[first]
+
+        p = pixel[best]
+        d = depth[best]
+        closer = d > zbuf[p]
+        zbuf[p[closer]] = d[closer]
+        shade[p[closer]] = intensity[tri_idx[best[closer]]]
+
+    covered = np.isfinite(zbuf)
+    _fill_holes(shade.reshape(size, size), covered.reshape(size, size))
+    image = np.empty((size * size, 3), dtype=np.uint8)
+    image[:] = BACKGROUND
+    image[covered] = (np.outer(shade[covered], MODEL_COLOR)).astype(np.uint8)
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(encode_png(image.reshape(size, size, 3)))
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def _fill_holes(shade: np.ndarray, covered: np.ndarray):
+    """Закрасить одиночные пропуски внутри модели по соседним пикселям"""
+    padded_cov = np.pad(covered, 1)
+    padded_shade = np.pad(shade, 1)
+    neighbours = [(slice(0, -2), slice(1, -1)), (slice(2, None), slice(1, -1)),
+                  (slice(1, -1), slice(0, -2)), (slice(1, -1), slice(2, None))]
+    count = sum(padded_cov[n].astype(np.int8) for n in neighbours)
+    holes = ~covered & (count >= 3)
+    if holes.any():
+        total = sum(np.where(padded_cov[n], padded_shade[n], 0.0) for n in neighbours)
+        shade[holes] = total[holes] / count[holes]
+        covered[holes] = True
+
+def encode_png(image: np.ndarray) -> bytes:
+    """RGB-массив (h, w, 3) uint8 в PNG"""
+    height, width, _ = image.shape
+    # Перед каждой строкой — байт фильтра 0 (без фильтра)
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, -1)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', header)
+        + chunk(b'IDAT', zlib.compress(raw.tobytes(), 9))
+        + chunk(b'IEND', b'')
+    )
+
+class PreviewCache:
+    """Превью моделей на диске (data/previews/<hash>.png) с вытеснением по размеру.
+
+    Ключ — SHA-256 файла, поэтому одинаковые модели делят одно превью.
+    Порядок использования хранится в памяти и в mtime файлов: при
+    превышении max_bytes удаляются давно не открывавшиеся превью.
+    """
+
+    def __init__(self, root: str = 'data/previews', max_bytes: int = 50 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+        entries = []
+        for entry in os.scandir(root):
+            if entry.name.endswith('.png'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        entries.sort()
+        self._entries: OrderedDict = OrderedDict((h, size) for _, h, size in entries)
+        self._total = sum(self._entries.values())
+
+    def path_for(self, file_hash: str) -> str:
+        return os.path.join(self.root, f"{file_hash}.png")
+
+    def get(self, file_hash: str) -> Optional[str]:
+        """Путь к превью или None; отмечает превью как недавно использованное"""
+        with self._lock:
+            if file_hash not in self._entries:
+                return None
+            path = self.path_for(file_hash)
+            if not os.path.exists(path):
+                self._total -= self._entries.pop(file_hash)
+                return None
+            self._entries.move_to_end(file_hash)
+            os.utime(path)
+            return path
+
+    def add(self, file_hash: str):
+        """Учесть превью, которое воркер записал в path_for(file_hash)"""
+        path = self.path_for(file_hash)
+        if not os.path.exists(path):
+            return
+        with self._lock:
+            self._total -= self._entries.pop(file_hash, 0)
+            size = os.path.getsize(path)
+            self._entries[file_hash] = size
+            self._total += size
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            file_hash, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self.path_for(file_hash))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,115 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Поля, по которым можно фильтровать заявки в query()
+FILTER_FIELDS = ('status', 'group', 'purpose', 'telegram_id')
+
+ORDER_ASC = 'asc'
+ORDER_DESC = 'desc'
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+def _to_base36(number: int) -> str:
+    text = ''
+    while True:
+        number, rest = divmod(number, 36)
+        text = _DIGITS[rest] + text
+        if not number:
+            return text
+
+def encode_cursor(direction: str, sort_value: Optional[str], request_id: str) -> str:
+    """Курсор для callback_data: направление, дата в base36 и id (около 16 байт).
+
+    direction: 'a' — страница после заявки, 'b' — перед ней.
+    """
+    digits = ''.join(c for c in (sort_value or '') if c.isdigit())
+    return f"{direction}{_to_base36(int(digits or 0))}~{request_id}"
+
+def decode_cursor(cursor: str) -> Tuple[str, Tuple[str, str]]:
+    """Обратное к encode_cursor: направление и ключ сортировки (дата, id)"""
+    direction, rest = cursor[0], cursor[1:]
+    stamp, request_id = rest.split('~', 1)
+    number = int(stamp, 36)
+    if not number:
+        return direction, ('', request_id)
+    d = str(number).zfill(14)
+    return direction, (f"{d[0:4]}-{d[4:6]}-{d[6:8]} {d[8:10]}:{d[10:12]}:{d[12:14]}", request_id)
+
+def offset_cursor(offset: int) -> str:
+    """Курсор «с offset-й заявки» — запасной, когда обычный не влезает в callback_data.
+
+    Страница по смещению может сдвинуться, если между показами заявки добавили
+    или удалили; соседние страницы от неё снова получают обычные курсоры.
+    """
+    return f"o{_to_base36(offset)}"
+
+def decode_offset(cursor: str) -> Optional[int]:
+    """Смещение из offset_cursor; None — курсор обычный"""
+    return int(cursor[1:], 36) if cursor.startswith('o') else None
+
+def matches(request: Dict, filters: Dict) -> bool:
+    return all(
+        str(request.get(field)) == str(value)
+        for field, value in filters.items()
+        if value is not None
+    )
+
+def paginate_rows(rows: Iterable[Dict], sort_field: str, order: str = ORDER_ASC,
+                  cursor: Optional[str] = None, limit: int = 5) -> Dict:
+    """Страница из уже отсортированных в порядке показа заявок.
+
+    Возвращает {'items', 'next', 'prev', 'offset'}: курсоры соседних страниц
+    или None и номер первой заявки страницы среди всех подходящих.
+    """
+    def key(row):
+        return (row.get(sort_field) or '', row.get('id'))
+
+    def beyond(row, mark) -> bool:
+        return key(row) > mark if order == ORDER_ASC else key(row) < mark
+
+    items: List[Dict] = []
+    has_prev = has_next = False
+    offset = decode_offset(cursor) if cursor is not None else 0
+
+    if offset is not None:
+        for i, row in enumerate(rows):
+            if i < offset:
+                has_prev = True
+                continue
+            if len(items) == limit:
+                has_next = True
+                break
+            items.append(row)
+    else:
+        offset = 0
+        direction, mark = decode_cursor(cursor)
+        if direction == 'a':
+            for row in rows:
+                if not beyond(row, mark):
+                    has_prev = True
+                    offset += 1
+                    continue
+                if len(items) == limit:
+                    has_next = True
+                    break
+                items.append(row)
+        else:
+            window = deque(maxlen=limit + 1)
+            for row in rows:
+                if beyond(row, mark) or key(row) == mark:
+                    has_next = True
+                    break
+                window.append(row)
+                offset += 1
+            items = list(window)
+            if len(items) > limit:
+                has_prev = True
+                items = items[1:]
+            offset -= len(items)
+
+    return {
+        'items': items,
+        'next': encode_cursor('a', items[-1].get(sort_field), items[-1]['id']) if has_next and items else None,
+        'prev': encode_cursor('b', items[0].get(sort_field), items[0]['id']) if has_prev and items else None,
+        'offset': offset,
+    }
@@ -0,0 +1,351 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+POLICY_FIFO = 'fifo'
+POLICY_SJF = 'sjf'
+POLICY_FAIR = 'fair'
+POLICIES = (POLICY_FIFO, POLICY_SJF, POLICY_FAIR)
+
+# Как долго расписание считается свежим, если очередь не менялась (секунды)
+SCHEDULE_TTL = 60
+
+class FenwickTree:
+    """Дерево Фенвика: сумма на префиксе и изменение элемента за O(log n).
+
+    Растёт удвоением (с пересборкой за O(n), в среднем O(1) на элемент).
+    """
+
+    def __init__(self, size: int = 64):
+        self._values = [0.0] * (size + 1)
+        self._tree = [0.0] * (size + 1)
+
+    def __len__(self) -> int:
+        return len(self._values) - 1
+
+    def add(self, index: int, delta: float):
+        """Прибавить delta к элементу index (нумерация с 1)"""
+        if index > len(self):
+            self._grow(index)
+        self._values[index] += delta
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> float:
+        """Сумма элементов 1..index"""
+        index = min(index, len(self))
+        total = 0.0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _grow(self, index: int):
+        size = len(self)
+        while size < index:
+            size *= 2
+        self._values += [0.0] * (size + 1 - len(self._values))
+        # Сборка за O(n): каждый узел добавляет себя к родителю
+        self._tree = list(self._values)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                self._tree[parent] += self._tree[i]
+
+class QueueIndex:
+    """Порядковый индекс очереди по номеру постановки (seq).
+
+    Два дерева Фенвика — число заявок и сумма минут печати — дают за O(log n)
+    точное место заявки среди ожидающих и объём работы перед ней.
+    """
+
+    def __init__(self):
+        self._count = FenwickTree()
+        self._minutes = FenwickTree()
+
+    def add(self, seq: int, minutes: float):
+        self._count.add(seq, 1)
+        self._minutes.add(seq, minutes)
+
+    def remove(self, seq: int, minutes: float):
+        self._count.add(seq, -1)
+        self._minutes.add(seq, -minutes)
+
+    def change_minutes(self, seq: int, old: float, new: float):
+        self._minutes.add(seq, new - old)
+
+    def ahead(self, seq: int):
+        """Сколько заявок и минут печати стоит перед заявкой seq"""
+        return int(self._count.prefix(seq - 1)), self._minutes.prefix(seq - 1)
+
+class PrintQueueScheduler:
+    """Распределение заявок «В очереди» по нескольким принтерам.
+
+    Порядок задаёт политика:
+    - fifo — по времени подачи;
+    - sjf — сначала короткие задания (по оценке времени печати);
+    - fair — взвешенная справедливая очередь между группами: каждой заявке
+      выдаётся виртуальное время окончания start + minutes / weight, поэтому
+      группа с большим потоком заявок не вытесняет остальные.
+
+    Очередь — куча с ленивым удалением: следующая заявка берётся за O(log n).
+    Состояние обновляется по событиям БД (subscribe). Для fifo место и
+    ожидание берутся из QueueIndex за O(log n); для остальных политик —
+    из расписания, которое пересчитывается только после изменений.
+    """
+
+    def __init__(self, printers: List[str], policy: str = POLICY_FIFO,
+                 group_weights: Optional[Dict[str, float]] = None, default_minutes: float = 60):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика очереди: {policy}")
+        self.printers = list(printers) or ['Принтер 1']
+        self.policy = policy
+        self.group_weights = group_weights or {}
+        self.default_minutes = default_minutes
+
+        self._lock = threading.RLock()
+        self._heap: List = []
+        self._pending: Dict[str, Dict] = {}
+        self._running: Dict[str, Dict] = {}
+        self._seq = 0
+        self._index = QueueIndex()
+        # Справедливая очередь: виртуальное время и последнее окончание по группам
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+
+        self._version = 0
+        self._schedule: Dict[str, Dict] = {}
+        self._schedule_version = -1
+        self._schedule_time = 0.0
+
+    # --- Состояние ---
+
+    def load(self, requests: List[Dict]):
+        """Заполнить очередь из БД при запуске (заявки в порядке подачи)"""
+        with self._lock:
+            for request in requests:
+                self._update(request)
+
+    def on_db_event(self, event: str, request: Dict):
+        """Подписчик БД: держит очередь и занятость принтеров в актуальном виде"""
+        with self._lock:
+            if event in ('delete', 'archive', 'purge_archive'):
+                self._remove(request.get('id'))
+            else:
+                self._update(request)
+
+    def _minutes(self, request: Dict) -> float:
+        stats = request.get('model_stats') or {}
+        return stats.get('estimated_minutes') or self.default_minutes
+
+    def _update(self, request: Dict):
+        request_id = request.get('id')
+        status = request.get('status')
+        minutes = self._minutes(request)
+
+        if status == 'В очереди':
+            entry = self._pending.get(request_id)
+            if entry is None:
+                self._running.pop(request_id, None)
+                self._enqueue(request_id, request.get('group', ''), minutes)
+            elif entry['minutes'] != minutes:
+                # Оценка пришла из обработки модели — ключ sjf/fair меняется
+                self._rekey(entry, minutes)
+            else:
+                # Поменялись поля, не влияющие на очередь
+                return
+        elif status == 'В работе':
+            entry = self._dequeue(request_id)
+            if entry is not None and self.policy == POLICY_FAIR:
+                self._virtual_time = max(self._virtual_time, entry['start_tag'])
+            self._start(request_id, request, minutes)
+        else:
+            self._remove(request_id)
+            return
+        self._version += 1
+
+    def _remove(self, request_id: str):
+        # Запись в куче остаётся и будет пропущена при извлечении (или при пересборке)
+        if self._dequeue(request_id) is not None or self._running.pop(request_id, None) is not None:
+            self._version += 1
+
+    def _dequeue(self, request_id: str) -> Optional[Dict]:
+        entry = self._pending.pop(request_id, None)
+        if entry is not None:
+            self._index.remove(entry['seq'], entry['minutes'])
+            if not self._pending:
+                # Очередь опустела — начинаем нумерацию заново, чтобы индекс не рос бесконечно
+                self._seq = 0
+                self._index = QueueIndex()
+            self._compact_heap()
+        return entry
+
+    def _enqueue(self, request_id: str, group: str, minutes: float):
+        self._seq += 1
+        entry = {'id': request_id, 'seq': self._seq, 'group': group, 'minutes': minutes, 'start_tag': 0.0}
+        if self.policy == POLICY_FAIR:
+            entry['start_tag'] = max(self._virtual_time, self._last_finish.get(group, 0.0))
+        self._pending[request_id] = entry
+        self._index.add(entry['seq'], minutes)
+        self._push(entry)
+        if self.policy == POLICY_FAIR:
+            self._last_finish[group] = entry['key'][0]
+
+    def _rekey(self, entry: Dict, minutes: float):
+        old_finish = entry['key'][0]
+        self._index.change_minutes(entry['seq'], entry['minutes'], minutes)
+        entry['minutes'] = minutes
+        self._push(entry)
+        # Последняя заявка группы сдвигает точку отсчёта для следующих
+        if self.policy == POLICY_FAIR and self._last_finish.get(entry['group']) == old_finish:
+            self._last_finish[entry['group']] = entry['key'][0]
+
+    def _push(self, entry: Dict):
+        if self.policy == POLICY_FIFO:
+            key = (entry['seq'],)
+        elif self.policy == POLICY_SJF:
+            key = (entry['minutes'], entry['seq'])
+        else:
+            weight = self.group_weights.get(entry['group'], 1.0)
+            key = (entry['start_tag'] + entry['minutes'] / weight, entry['seq'])
+        entry['key'] = key
+        heapq.heappush(self._heap, (key, entry['id']))
+        self._compact_heap()
+
+    def _compact_heap(self):
+        """Пересобрать кучу из _pending, когда устаревших записей больше, чем живых.
+
+        Иначе каждая постановка и смена ключа оставляли бы запись навсегда:
+        next_pending вызывается редко и чистит только верх кучи. O(n) раз в
+        O(n) изменений — в среднем O(1) на изменение.
+        """
+        if len(self._heap) > 2 * len(self._pending) + 16:
+            self._heap = [(entry['key'], request_id) for request_id, entry in self._pending.items()]
+            heapq.heapify(self._heap)
+
+    def _start(self, request_id: str, request: Dict, minutes: float):
+        job = self._running.get(request_id)
+        printer = request.get('printer')
+        if printer not in self.printers:
+            printer = job['printer'] if job else self._free_printer()
+        if job is None:
+            started = request.get('started_at')
+            job = {
+                'started': datetime.strptime(started, '%Y-%m-%d %H:%M:%S') if started else datetime.now(),
+            }
+            self._running[request_id] = job
+        job['printer'] = printer
+        job['minutes'] = minutes
+
+    # --- Принтеры ---
+
+    def _free_at(self, now: datetime) -> Dict[str, datetime]:
+        free_at = {name: now for name in self.printers}
+        for job in self._running.values():
+            remaining = job['started'] + timedelta(minutes=job['minutes']) - now
+            free_at[job['printer']] += max(remaining, timedelta(0))
+        return free_at
+
+    def _free_printer(self) -> str:
+        free_at = self._free_at(datetime.now())
+        return min(self.printers, key=lambda name: free_at[name])
+
+    def printer_of(self, request_id: str) -> Optional[str]:
+        with self._lock:
+            job = self._running.get(request_id)
+            return job['printer'] if job else None
+
+    def printers_status(self) -> List[Dict]:
+        """Принтеры: какие заявки печатаются и когда освободится"""
+        with self._lock:
+            now = datetime.now()
+            free_at = self._free_at(now)
+            return [
+                {
+                    'name': name,
+                    'requests': [i for i, job in self._running.items() if job['printer'] == name],
+                    'free_at': free_at[name] if free_at[name] > now else None,
+                }
+                for name in self.printers
+            ]
+
+    # --- Очередь ---
+
+    def next_pending(self) -> Optional[str]:
+        """Следующая заявка по политике (без извлечения)"""
+        with self._lock:
+            while self._heap:
+                key, request_id = self._heap[0]
+                entry = self._pending.get(request_id)
+                if entry is not None and entry['key'] == key:
+                    return request_id
+                heapq.heappop(self._heap)
+            return None
+
+    def upcoming(self, count: int) -> List[str]:
+        """Первые count ожидающих заявок в порядке политики, O(n log count)"""
+        with self._lock:
+            return [entry['id'] for entry in heapq.nsmallest(count, self._pending.values(), key=lambda e: e['key'])]
+
+    def schedule(self) -> Dict[str, Dict]:
+        """Расписание очереди: для каждой заявки место, принтер и ожидаемое начало"""
+        with self._lock:
+            fresh = time.monotonic() - self._schedule_time < SCHEDULE_TTL
+            if self._schedule_version == self._version and fresh:
+                return self._schedule
+
+            now = datetime.now()
+            free_at = self._free_at(now)
+            printers = [(free_at[name], i, name) for i, name in enumerate(self.printers)]
+            heapq.heapify(printers)
+
+            schedule = {}
+            order = sorted(self._pending.values(), key=lambda e: e['key'])
+            for position, entry in enumerate(order):
+                start, i, name = heapq.heappop(printers)
+                schedule[entry['id']] = {'position': position, 'printer': name, 'start': start}
+                heapq.heappush(printers, (start + timedelta(minutes=entry['minutes']), i, name))
+
+            self._schedule = schedule
+            self._schedule_version = self._version
+            self._schedule_time = time.monotonic()
+            return schedule
+
+    def position(self, request_id: str) -> Optional[Dict]:
+        """Место в очереди (0 — следующая) и ожидаемое начало печати.
+
+        Единственный источник оценки и для пользователя, и для карточки
+        заявки у админа, чтобы они видели одно и то же время.
+        """
+        if self.policy != POLICY_FIFO:
+            return self.schedule().get(request_id)
+
+        with self._lock:
+            entry = self._pending.get(request_id)
+            if entry is None:
+                return None
+            count, minutes = self._index.ahead(entry['seq'])
+            return {'position': count, 'printer': None, 'start': self._fluid_start(minutes)}
+
+    def _fluid_start(self, work_minutes: float) -> datetime:
+        """Когда принтеры вместе выполнят work_minutes работы сверх текущей.
+
+        Работа делится между принтерами поровну («наливом»): сначала
+        догружаются те, что освобождаются раньше. O(p log p) по числу принтеров.
+        """
+        now = datetime.now()
+        free = sorted((t - now).total_seconds() / 60 for t in self._free_at(now).values())
+        level = free[0]
+        for i in range(len(free)):
+            next_level = free[i + 1] if i + 1 < len(free) else float('inf')
+            # Работа, которая помещается, пока уровень поднимается до следующего принтера
+            capacity = (next_level - level) * (i + 1)
+            if work_minutes <= capacity:
+                level += work_minutes / (i + 1)
+                break
+            work_minutes -= capacity
+            level = next_level
+        return now + timedelta(minutes=level)
@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Лимит Telegram на длину текста сообщения
+TELEGRAM_TEXT_LIMIT = 4096
+
+VIEW_MY_REQUESTS = 'my_requests'
+VIEW_REQUESTS = 'requests'
+VIEW_ARCHIVE = 'archive'
+
+def paginate_blocks(blocks: List[str], limit: int, reserve: Optional[List[int]] = None) -> List[List[int]]:
+    """Разбить блоки текста на страницы не длиннее limit символов.
+
+    Возвращает номера блоков по страницам; reserve — сколько места
+    оставить под каждый блок для строк, дописываемых при показе.
+    """
+    pages: List[List[int]] = [[]]
+    used = 0
+    for i, block in enumerate(blocks):
+        size = len(block) + (reserve[i] if reserve else 0)
+        if pages[-1] and used + size > limit:
+            pages.append([])
+            used = 0
+        pages[-1].append(i)
+        used += size
+    return pages
+
+class RenderCache:
+    """Кэш готовых текстов экранов по ключу (экран, владелец, страница).
+
+    Сбрасывается по событиям БД: изменение заявки пользователя сбрасывает
+    только его /my_requests, изменение активных заявок — список у админов,
+    архивация — страницы архива. Повторный показ без изменений ничего не стоит.
+    """
+
+    def __init__(self, max_owners: int = 1000):
+        self.max_owners = max_owners
+        self._lock = threading.Lock()
+        # view -> owner -> {page: value}; порядок владельцев — LRU
+        self._views: Dict[str, OrderedDict] = {}
+        # Счётчик сбросов по экранам: страница, отрисованная до сброса, не кладётся в кэш
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, view: str, owner: Any, page: int) -> Optional[Any]:
+        with self._lock:
+            owners = self._views.get(view)
+            pages = owners.get(owner) if owners is not None else None
+            if pages is None or page not in pages:
+                self.misses += 1
+                return None
+            owners.move_to_end(owner)
+            self.hits += 1
+            return pages[page]
+
+    def generation(self, view: str) -> int:
+        """Запомнить перед отрисовкой и передать в put"""
+        with self._lock:
+            return self._generations.get(view, 0)
+
+    def put(self, view: str, owner: Any, page: int, value: Any, generation: Optional[int] = None):
+        with self._lock:
+            if generation is not None and generation != self._generations.get(view, 0):
+                return
+            owners = self._views.setdefault(view, OrderedDict())
+            owners.setdefault(owner, {})[page] = value
+            owners.move_to_end(owner)
+            while len(owners) > self.max_owners:
+                owners.popitem(last=False)
+
+    def invalidate(self, view: str, owner: Any = None):
+        """Сбросить экран целиком или только страницы одного владельца"""
+        with self._lock:
+            self._generations[view] = self._generations.get(view, 0) + 1
+            if owner is None:
+                self._views.pop(view, None)
+            elif view in self._views:
+                self._views[view].pop(owner, None)
+
+    def on_db_event(self, event: str, request: Dict):
+        """Подписчик БД: сбросить экраны, на которых видна изменённая заявка"""
+        if event != 'purge_archive':
+            self.invalidate(VIEW_MY_REQUESTS, str(request.get('telegram_id')))
+            self.invalidate(VIEW_REQUESTS)
+        if event in ('archive', 'purge_archive'):
+            self.invalidate(VIEW_ARCHIVE)
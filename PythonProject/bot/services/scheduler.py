@@ -4,10 +4,17 @@ from datetime import datetime, timedelta
 import os
 import shutil
 
+from bot.services.export import FORMAT_CSV
+
+# Получатель выгрузок в ExportService для бэкапов
+BACKUP_CONSUMER = 'backup'
+
 class SchedulerService:
-    def __init__(self, sheets_service):
+    def __init__(self, sheets_service, blob_store=None, export_service=None):
         self.scheduler = BackgroundScheduler()
         self.sheets_service = sheets_service
+        self.blob_store = blob_store
+        self.export_service = export_service
     
     def start(self):
         self.scheduler.add_job(
@@ -24,6 +31,14 @@ class SchedulerService:
             replace_existing=True
         )
         
+        # Между полными бэкапами — ежедневные бэкапы изменений
+        self.scheduler.add_job(
+            self.create_daily_delta_backup,
+            CronTrigger(day_of_week='mon-sat', hour=23, minute=0),
+            id='daily_delta_backup',
+            replace_existing=True
+        )
+        
         self.scheduler.add_job(
             self.delete_old_backups,
             CronTrigger(day_of_week='sun', hour=23, minute=30),
@@ -45,7 +60,12 @@ class SchedulerService:
                         request_date = datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
                         if request_date < one_week_ago:
                             file_path = request.get('file_path', '')
-                            if file_path and os.path.exists(file_path):
+                            file_hash = request.get('file_hash', '')
+                            if self.blob_store and file_hash and self.blob_store.is_blob(file_path):
+                                # Общий файл удаляется только вместе с последней ссылкой
+                                if self.blob_store.release(file_hash, request.get('id')):
+                                    print(f"Удален файл {file_path} для заявки {request.get('id')}")
+                            elif file_path and os.path.exists(file_path):
                                 os.remove(file_path)
                                 print(f"Удален файл {file_path} для заявки {request.get('id')}")
                     except ValueError:
@@ -54,27 +74,29 @@ class SchedulerService:
             print(f"Ошибка при удалении старых файлов: {e}")
     
     def create_weekly_backup(self):
+        """Полный бэкап: активные заявки и архив"""
         try:
-            backup_dir = 'backups'
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f'{backup_dir}/backup_{timestamp}.csv'
-            
-            requests = self.sheets_service.get_all_requests()
-            
-            import csv
-            with open(backup_filename, 'w', newline='', encoding='utf-8') as f:
-                if requests:
-                    writer = csv.DictWriter(f, fieldnames=requests[0].keys())
-                    writer.writeheader()
-                    writer.writerows(requests)
-            
-            print(f"Создан бэкап: {backup_filename}")
+            backup_filename, count, _ = self.export_service.export(
+                FORMAT_CSV, BACKUP_CONSUMER, directory='backups', prefix='backup'
+            )
+            print(f"Создан бэкап: {backup_filename} ({count} заявок)")
             
         except Exception as e:
             print(f"Ошибка при создании бэкапа: {e}")
     
+    def create_daily_delta_backup(self):
+        """Бэкап заявок, изменённых после прошлого бэкапа; восстановление — полный бэкап + изменения по порядку"""
+        try:
+            if self.export_service.pending_changes(BACKUP_CONSUMER) == 0:
+                return
+            backup_filename, count, _ = self.export_service.export(
+                FORMAT_CSV, BACKUP_CONSUMER, delta=True, directory='backups', prefix='backup'
+            )
+            print(f"Создан бэкап изменений: {backup_filename} ({count} заявок)")
+            
+        except Exception as e:
+            print(f"Ошибка при создании бэкапа изменений: {e}")
+    
     def delete_old_backups(self):
         try:
             backup_dir = 'backups'
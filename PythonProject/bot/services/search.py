@@ -0,0 +1,189 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, List, Set, Tuple
+
+# Поля заявки, по которым ищет /find
+SEARCH_FIELDS = ('id', 'first_name', 'last_name', 'group', 'purpose', 'file_name', 'comment', 'username')
+# Что показывать в результатах без обращения к БД
+SUMMARY_FIELDS = ('id', 'first_name', 'last_name', 'group', 'status', 'date')
+
+# С какой длины слова допускается одна опечатка
+FUZZY_MIN_LENGTH = 4
+SCORE_EXACT = 3
+SCORE_PREFIX = 2
+SCORE_FUZZY = 1
+
+# Слова из букв и цифр; «_» и знаки препинания — разделители (12_model.stl → 12, model, stl)
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(str(text or '').lower().replace('ё', 'е'))
+
+def _fuzzy(token: str) -> bool:
+    """Опечатки ищем только в словах (имена, цели), а не в номерах и id"""
+    return len(token) >= FUZZY_MIN_LENGTH and token.isalpha()
+
+def _deletes(token: str) -> Set[str]:
+    """Слово и все варианты без одной буквы (соседство по удалениям)"""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Расстояние Дамерау — Левенштейна не больше 1"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+class SearchIndex:
+    """Инвертированный индекс по активным заявкам и архиву для /find.
+
+    Слово → множество id заявок. Словарь хранится отсортированным, поэтому
+    поиск по началу слова — bisect. Опечатки (одна замена, вставка, удаление
+    или перестановка соседних букв) находятся через словарь удалений:
+    у слов на расстоянии 1 совпадает хотя бы один вариант без одной буквы.
+    Индекс обновляется по событиям БД, пересборки не требуется.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocabulary: List[str] = []
+        self._deletes: Dict[str, Set[str]] = {}
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        self._summaries: Dict[str, Dict] = {}
+
+    def load(self, requests: List[Dict], archive: List[Dict]):
+        for request in requests:
+            self.index(request, archived=False)
+        for request in archive:
+            self.index(request, archived=True)
+
+    def on_db_event(self, event: str, request: Dict):
+        """Подписчик БД"""
+        if event in ('delete', 'purge_archive'):
+            self.remove(request.get('id'))
+        else:
+            self.index(request, archived=event == 'archive')
+
+    def index(self, request: Dict, archived: bool = False):
+        request_id = request.get('id')
+        tokens = {t for field in SEARCH_FIELDS for t in tokenize(request.get(field))}
+        summary = {field: request.get(field) for field in SUMMARY_FIELDS}
+        summary['archived'] = archived
+
+        with self._lock:
+            old = self._doc_tokens.get(request_id, set())
+            for token in old - tokens:
+                self._unlink(token, request_id)
+            for token in tokens - old:
+                self._link(token, request_id)
+            self._doc_tokens[request_id] = tokens
+            self._summaries[request_id] = summary
+
+    def remove(self, request_id: str):
+        with self._lock:
+            for token in self._doc_tokens.pop(request_id, set()):
+                self._unlink(token, request_id)
+            self._summaries.pop(request_id, None)
+
+    def _link(self, token: str, request_id: str):
+        ids = self._postings.get(token)
+        if ids is None:
+            ids = self._postings[token] = set()
+            insort(self._vocabulary, token)
+            if _fuzzy(token):
+                for variant in _deletes(token):
+                    self._deletes.setdefault(variant, set()).add(token)
+        ids.add(request_id)
+
+    def _unlink(self, token: str, request_id: str):
+        ids = self._postings.get(token)
+        if ids is None:
+            return
+        ids.discard(request_id)
+        if ids:
+            return
+        del self._postings[token]
+        del self._vocabulary[bisect_left(self._vocabulary, token)]
+        if not _fuzzy(token):
+            return
+        for variant in _deletes(token):
+            tokens = self._deletes.get(variant)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._deletes[variant]
+
+    def _match_term(self, term: str) -> List[Tuple[Set[str], int]]:
+        """Группы заявок, подходящих под слово запроса, с оценкой совпадения"""
+        groups = []
+        start = bisect_left(self._vocabulary, term)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            groups.append((self._postings[token], SCORE_EXACT if token == term else SCORE_PREFIX))
+
+        if _fuzzy(term):
+            candidates = set()
+            for variant in _deletes(term):
+                candidates |= self._deletes.get(variant, set())
+            for token in candidates:
+                if not token.startswith(term) and _within_one_edit(term, token):
+                    groups.append((self._postings[token], SCORE_FUZZY))
+        return groups
+
+    @staticmethod
+    def _scores(groups: List[Tuple[Set[str], int]]) -> Dict[str, int]:
+        scores: Dict[str, int] = {}
+        for ids, score in groups:
+            for request_id in ids:
+                if scores.get(request_id, 0) < score:
+                    scores[request_id] = score
+        return scores
+
+    def search(self, text: str, limit: int = 10) -> List[Dict]:
+        """Заявки, где нашлось каждое слово запроса (точно, по началу или с опечаткой)"""
+        terms = tokenize(text)
+        if not terms:
+            return []
+
+        with self._lock:
+            matched = [self._match_term(term) for term in set(terms)]
+            # Начинаем с самого редкого слова: пересечение сразу становится маленьким
+            matched.sort(key=lambda groups: sum(len(ids) for ids, _ in groups))
+
+            total = self._scores(matched[0])
+            for groups in matched[1:]:
+                if len(total) * len(groups) < sum(len(ids) for ids, _ in groups):
+                    # Кандидатов мало — проверяем каждого по группам слова
+                    narrowed = {}
+                    for request_id, score in total.items():
+                        best = max((s for ids, s in groups if request_id in ids), default=0)
+                        if best:
+                            narrowed[request_id] = score + best
+                else:
+                    scores = self._scores(groups)
+                    narrowed = {r: score + scores[r] for r, score in total.items() if r in scores}
+                total = narrowed
+                if not total:
+                    return []
+
+            ranked = heapq.nlargest(
+                limit,
+                total.items(),
+                key=lambda item: (item[1], self._summaries[item[0]].get('date') or '')
+            )
+            return [dict(self._summaries[request_id], score=score) for request_id, score in ranked]
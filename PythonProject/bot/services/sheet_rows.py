@@ -0,0 +1,105 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# 'Заявки'!A5:J7 → 5, 7
+_RANGE_ROWS = re.compile(r'![A-Z]+(\d+)(?::[A-Z]+(\d+))?$')
+
+def parse_updated_range(updated_range: str) -> Tuple[int, int]:
+    """Первая и последняя строка из updatedRange ответа values.append"""
+    match = _RANGE_ROWS.search(updated_range or '')
+    if not match:
+        raise ValueError(f"Не удалось разобрать диапазон: {updated_range}")
+    first = int(match.group(1))
+    return first, int(match.group(2) or first)
+
+class SheetRowIndex:
+    """id заявки → номер строки в Google Таблице, без чтения таблицы на каждый поиск.
+
+    Индекс хранится в файле и строится заново по столбцу A (rebuild) при
+    запуске или когда обнаружено расхождение: values.append положил строки
+    не туда, куда ожидалось (таблицу правили вручную). Дописанные ботом
+    строки учитываются по updatedRange ответа, без лишних запросов.
+    Файл привязан к таблице и листу: индекс от другой таблицы не загрузится.
+    """
+
+    def __init__(self, path: str = 'data/sheet_rows.json', spreadsheet_id: str = '', sheet_name: str = ''):
+        self.path = path
+        self.sheet_key = f"{spreadsheet_id}/{sheet_name}"
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._last_row = 0
+        # False — индексу нельзя верить, пока его не построят заново
+        self.ready = False
+        self.rebuilds = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        if state.get('sheet') != self.sheet_key:
+            return
+        self._rows = {str(k): int(v) for k, v in state.get('rows', {}).items()}
+        self._last_row = int(state.get('last_row', 0))
+        self.ready = True
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'sheet': self.sheet_key, 'last_row': self._last_row, 'rows': self._rows},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, request_id: str) -> Optional[int]:
+        with self._lock:
+            return self._rows.get(str(request_id))
+
+    @property
+    def next_row(self) -> int:
+        """Куда values.append должен положить следующую строку"""
+        with self._lock:
+            return self._last_row + 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def rebuild(self, column: List[str]):
+        """Построить заново по значениям столбца A (column[0] — строка 1)"""
+        rows: Dict[str, int] = {}
+        for i, value in enumerate(column, 1):
+            if value:
+                # Дубликат ID — как и раньше, считается первая строка
+                rows.setdefault(str(value), i)
+        with self._lock:
+            self._rows = rows
+            self._last_row = len(column)
+            self.ready = True
+            self.rebuilds += 1
+            self._save()
+
+    def appended(self, request_ids: List[str], first_row: int) -> bool:
+        """Учесть строки, дописанные с first_row подряд.
+
+        False — строки легли не в конец известной части таблицы, индекс
+        устарел (ready сбрасывается) и его нужно построить заново.
+        """
+        with self._lock:
+            if self.ready and first_row != self._last_row + 1:
+                self.ready = False
+                return False
+            for offset, request_id in enumerate(request_ids):
+                self._rows[str(request_id)] = first_row + offset
+            self._last_row = max(self._last_row, first_row + len(request_ids) - 1)
+            self._save()
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self.ready = False
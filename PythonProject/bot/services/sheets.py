@@ -1,35 +1,34 @@
 import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime
 import os
 import json
 
+from bot.services.google_endpoint import api_endpoint, google_credentials, gspread_session
+from bot.services.sheet_rows import SheetRowIndex, parse_updated_range
+
 class SheetsService:
     def __init__(self, sheet_id):
         self.sheet_id = sheet_id
         self.client = None
         self.sheet = None
         self.worksheet = None
+        self._headers = None
         self._authenticate()
+        # Номера строк по ID — без поиска по всему листу
+        self.rows = SheetRowIndex('data/sheet_rows_gspread.json', self.sheet.id, self.worksheet.title)
     
     def _authenticate(self):
-        service_account_key = os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY', '')
-        
-        if not service_account_key:
-            raise ValueError("GOOGLE_SERVICE_ACCOUNT_KEY не найден в переменных окружения")
-        
-        try:
-            creds_dict = json.loads(service_account_key)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"GOOGLE_SERVICE_ACCOUNT_KEY содержит невалидный JSON: {e}")
-        
         scopes = [
             'https://www.googleapis.com/auth/spreadsheets',
             'https://www.googleapis.com/auth/drive'
         ]
         
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        self.client = gspread.authorize(creds)
+        if api_endpoint():
+            # Локальный стенд: без токенов, запросы уходят на GOOGLE_API_ENDPOINT
+            self.client = gspread.authorize(None, session=gspread_session())
+        else:
+            creds = google_credentials(scopes)
+            self.client = gspread.authorize(creds)
         
         try:
             self.sheet = self.client.open_by_key(self.sheet_id)
@@ -61,14 +60,15 @@ class SheetsService:
             request_data.get('telegram_id', ''),
             request_data.get('username', '')
         ]
-        self.worksheet.append_row(row)
-        row_number = len(self.worksheet.get_all_values())
+        result = self.worksheet.append_row(row)
+        row_number, _ = parse_updated_range(result['updates']['updatedRange'])
+        if not self.rows.appended([request_data.get('id', '')], row_number):
+            self._rebuild_rows()
         self._update_row_color(row_number, 'white')
     
     def update_status(self, request_id, new_status):
-        cell = self.worksheet.find(str(request_id))
-        if cell:
-            row_number = cell.row
+        row_number = self._find_row(request_id)
+        if row_number:
             self.worksheet.update_cell(row_number, 7, new_status)
             
             if new_status == 'В очереди':
@@ -97,9 +97,30 @@ class SheetsService:
         records = self.get_all_requests()
         return sum(1 for r in records if r.get('Статус') == 'В очереди')
     
+    def _rebuild_rows(self):
+        self.rows.rebuild(self.worksheet.col_values(1))
+
+    def _find_row(self, request_id):
+        if not self.rows.ready:
+            self._rebuild_rows()
+        return self.rows.get(str(request_id))
+
+    def _record_at(self, row_number):
+        """Одна строка листа как запись get_all_records"""
+        if self._headers is None:
+            self._headers = self.worksheet.row_values(1)
+        values = self.worksheet.row_values(row_number)
+        values += [''] * (len(self._headers) - len(values))
+        return dict(zip(self._headers, values))
+
     def get_request_by_id(self, request_id):
-        records = self.get_all_requests()
-        for record in records:
-            if str(record.get('ID')) == str(request_id):
-                return record
-        return None
+        row_number = self._find_row(request_id)
+        if not row_number:
+            return None
+        record = self._record_at(row_number)
+        if str(record.get('ID')) == str(request_id):
+            return record
+        # Строки сдвинулись (лист правили вручную) — перестроить индекс и прочитать ещё раз
+        self._rebuild_rows()
+        row_number = self.rows.get(str(request_id))
+        return self._record_at(row_number) if row_number else None
@@ -0,0 +1,224 @@
+import random
+import threading
+from typing import Dict, List, Optional
+
+from bot.services.google_sheets import LAST_COLUMN, read_id_column, request_to_row, row_color_request
+from bot.services.sheet_rows import SheetRowIndex, parse_updated_range
+from bot.utils.config import SHEET_HEADERS
+
+# Какой статус показывать в таблице после события БД
+EVENT_STATUS = {
+    'archive': 'Архив',
+    'delete': 'Удалена',
+}
+
+class SheetsSyncEngine:
+    """Фоновая синхронизация заявок с Google Таблицей (write-behind).
+
+    Подписан на события БД: изменение только запоминается (последнее
+    на заявку — повторные изменения схлопываются) и сразу возвращает
+    управление. Раз в interval секунд отдельный поток отправляет всё
+    накопленное: values.batchUpdate для строк, которые уже есть в таблице,
+    один values.append для новых и один batchUpdate с цветами. Номера строк
+    берутся из SheetRowIndex; столбец A читается только при первой отправке
+    после запуска и при расхождении индекса с таблицей. При ошибке пачка
+    возвращается в очередь, повтор — с экспоненциальной задержкой. Задержки
+    и сбои таблицы бот не замечает.
+    """
+
+    def __init__(self, service, spreadsheet_id: str, sheet_name: str = 'Заявки',
+                 interval: float = 10, max_backoff: float = 300,
+                 rows: Optional[SheetRowIndex] = None):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.rows = rows if rows is not None else SheetRowIndex(spreadsheet_id=spreadsheet_id, sheet_name=sheet_name)
+        # Индекс сверяется с таблицей один раз после запуска
+        self._rows_checked = False
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        # id заявки → (строка таблицы, статус); порядок — первого изменения
+        self._pending: Dict[str, tuple] = {}
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sheet_id: Optional[int] = None
+        self._failures = 0
+        self.api_calls = 0
+        self.flushed = 0
+        self.last_error: Optional[str] = None
+
+    # --- Очередь ---
+
+    def on_db_event(self, event: str, request: Dict):
+        """Подписчик БД: только запомнить изменение (вызывается под блокировкой БД)"""
+        if event == 'purge_archive':
+            # Строка остаётся в таблице как история
+            return
+        status = EVENT_STATUS.get(event, request.get('status'))
+        # Строка собирается сразу: «Последнее обновление» — время изменения, а не отправки
+        row = request_to_row(request, status)
+        with self._lock:
+            self._pending[request.get('id')] = (row, status)
+
+    def load(self, requests: List[Dict]):
+        """Поставить в очередь все активные заявки (сверка таблицы после перезапуска)"""
+        for request in requests:
+            self.on_db_event('set', request)
+
+    def _requeue(self, batch: Dict[str, tuple]):
+        """Вернуть неотправленную пачку; более свежие изменения тех же заявок важнее"""
+        with self._lock:
+            self._pending = {**batch, **self._pending}
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    # --- Поток ---
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sheets-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Остановить поток, попытавшись отправить накопленное"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            delay = self.interval
+            if self._failures:
+                delay = min(self.max_backoff, self.interval * 2 ** self._failures)
+                delay *= random.uniform(0.8, 1.2)
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+            stopping = self._stopping.is_set()
+            try:
+                self.flush()
+                self._failures = 0
+            except Exception as e:
+                self._failures += 1
+                self.last_error = str(e)
+                print(f"Ошибка синхронизации с Google Таблицей (попытка {self._failures}): {e}")
+            if stopping:
+                return
+
+    # --- Отправка ---
+
+    def _call(self, request):
+        self.api_calls += 1
+        return request.execute()
+
+    def _resolve_sheet_id(self) -> int:
+        if self._sheet_id is None:
+            meta = self._call(self.service.spreadsheets().get(
+                spreadsheetId=self.spreadsheet_id,
+                fields='sheets.properties(sheetId,title)'
+            ))
+            sheets = meta.get('sheets', [])
+            self._sheet_id = next(
+                (s['properties']['sheetId'] for s in sheets if s['properties'].get('title') == self.sheet_name),
+                sheets[0]['properties']['sheetId'] if sheets else 0
+            )
+        return self._sheet_id
+
+    def _rebuild_rows(self):
+        # Пока индекс не построен заново, ему нельзя верить — при ошибке попробуем в следующий раз
+        self._rows_checked = False
+        result = self._call(self.service.spreadsheets().values().get(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{self.sheet_name}!A:A"
+        ))
+        self.rows.rebuild(read_id_column(result))
+        self._rows_checked = True
+
+    def _append(self, new: List[tuple]):
+        """Дописать новые заявки одним values.append и запомнить их строки"""
+        ids = [request_id for request_id, _ in new]
+        values = [row for _, row in new]
+        if self.rows.next_row == 1:
+            # Пустой лист — сначала заголовок
+            ids.insert(0, SHEET_HEADERS[0])
+            values.insert(0, SHEET_HEADERS)
+        result = self._call(self.service.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{self.sheet_name}!A:{LAST_COLUMN}",
+            valueInputOption='USER_ENTERED',
+            insertDataOption='INSERT_ROWS',
+            body={'values': values}
+        ))
+        first_row, _ = parse_updated_range(result['updates']['updatedRange'])
+        if not self.rows.appended(ids, first_row):
+            # Таблицу правили вручную: строки уже записаны, номера берём из столбца A
+            print("Строки Google Таблицы сдвинулись, индекс строк строится заново")
+            self._rebuild_rows()
+
+    def flush(self) -> int:
+        """Отправить накопленные изменения; вернуть число заявок"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            sheet_id = self._resolve_sheet_id()
+            # Индекс не сверен или устарел (расхождение, неудачное перестроение) —
+            # без него ничего не пишем: строки легли бы не туда или задвоились
+            if not self._rows_checked or not self.rows.ready:
+                self._rebuild_rows()
+
+            data: List[Dict] = []
+            new: List[tuple] = []
+            for request_id, (row, status) in batch.items():
+                row_index = self.rows.get(request_id)
+                if row_index is None:
+                    # Удалённую, не успевшую попасть в таблицу, не дописываем
+                    if status != EVENT_STATUS['delete']:
+                        new.append((request_id, row))
+                    continue
+                data.append({
+                    'range': f"{self.sheet_name}!A{row_index}:{LAST_COLUMN}{row_index}",
+                    'values': [row],
+                })
+
+            if data:
+                self._call(self.service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={'valueInputOption': 'USER_ENTERED', 'data': data}
+                ))
+            if new:
+                self._append(new)
+
+            formats = [
+                row_color_request(sheet_id, self.rows.get(request_id), status)
+                for request_id, (_, status) in batch.items()
+                if self.rows.get(request_id) is not None
+            ]
+            if formats:
+                self._call(self.service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={'requests': formats}
+                ))
+        except Exception:
+            self._requeue(batch)
+            raise
+
+        self.flushed += len(batch)
+        return len(batch)
+
+    def metrics(self) -> Dict:
+        return {
+            'pending': self.pending_count(),
+            'flushed': self.flushed,
+            'api_calls': self.api_calls,
+            'rows': len(self.rows),
+            'row_rebuilds': self.rows.rebuilds,
+            'failures': self._failures,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,418 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from bot.services.query import FILTER_FIELDS, ORDER_ASC, decode_cursor, decode_offset, encode_cursor
+
+# Поля заявки, хранящиеся отдельными столбцами; остальные поля уходят в JSON-столбец extra
+COLUMNS = [
+    'id', 'date', 'first_name', 'last_name', 'group', 'purpose', 'status',
+    'file_name', 'file_path', 'telegram_id', 'username', 'comment',
+    'completed_date', 'archived_date'
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    date TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    "group" TEXT,
+    purpose TEXT,
+    status TEXT,
+    file_name TEXT,
+    file_path TEXT,
+    telegram_id TEXT,
+    username TEXT,
+    comment TEXT,
+    completed_date TEXT,
+    archived_date TEXT,
+    archived INTEGER NOT NULL DEFAULT 0,
+    extra TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_requests_id ON requests(id);
+CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(archived, status);
+CREATE INDEX IF NOT EXISTS idx_requests_telegram_id ON requests(telegram_id);
+CREATE INDEX IF NOT EXISTS idx_requests_archived_date ON requests(archived_date);
+CREATE INDEX IF NOT EXISTS idx_requests_date ON requests(archived, date, id);
+CREATE INDEX IF NOT EXISTS idx_requests_archive_order ON requests(archived, archived_date, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _quote(column: str) -> str:
+    return f'"{column}"'
+
+class SQLiteDatabase:
+    """БД заявок на SQLite (WAL) с тем же набором методов, что и LocalDatabase.
+
+    При первом запуске переносит данные из requests.json/archive.json.
+    """
+
+    def __init__(self, db_file='data/requests.db', json_file='data/requests.json',
+                 archive_file='data/archive.json'):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._conn = sqlite3.connect(db_file, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._migrate_from_json(json_file, archive_file)
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def _migrate_from_json(self, json_file: str, archive_file: str):
+        """Однократный перенос заявок из JSON-файлов"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if row:
+                return
+
+            migrated = 0
+            for path, archived in ((json_file, 0), (archive_file, 1)):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        records = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    records = []
+                for request in records:
+                    self._insert(conn, request, archived)
+                    migrated += 1
+
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_migrated', ?)",
+                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),)
+            )
+        if migrated:
+            print(f"Перенесено заявок из JSON в SQLite: {migrated}")
+
+    @staticmethod
+    def _split(fields: Dict):
+        """Поля заявки → (столбцы, extra).
+
+        Столбец telegram_id текстовый (индекс и фильтры по строке), поэтому
+        нестроковое значение дополнительно сохраняется в extra и при чтении
+        возвращается с исходным типом, как в LocalDatabase.
+        """
+        columns = {k: v for k, v in fields.items() if k in COLUMNS}
+        extra = {k: v for k, v in fields.items() if k not in COLUMNS}
+        telegram_id = fields.get('telegram_id')
+        if telegram_id is not None and not isinstance(telegram_id, str):
+            extra['telegram_id'] = telegram_id
+        return columns, extra
+
+    @classmethod
+    def _insert(cls, conn, request: Dict, archived: int = 0) -> bool:
+        """Вставить заявку; False — заявка с таким id уже есть"""
+        _, extra = cls._split(request)
+        values = [request.get(c) for c in COLUMNS]
+        columns = ', '.join(_quote(c) for c in COLUMNS)
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        cursor = conn.execute(
+            f"INSERT OR IGNORE INTO requests ({columns}, archived, extra) VALUES ({placeholders}, ?, ?)",
+            values + [archived, json.dumps(extra, ensure_ascii=False) if extra else None]
+        )
+        return cursor.rowcount > 0
+
+    @staticmethod
+    def _row_to_request(row) -> Dict:
+        request = {c: row[c] for c in COLUMNS}
+        if request['archived_date'] is None:
+            del request['archived_date']
+        if row['extra']:
+            request.update(json.loads(row['extra']))
+        return request
+
+    def _select(self, where: str = '', params: tuple = ()) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM requests {where} ORDER BY seq", params).fetchall()
+        return [self._row_to_request(row) for row in rows]
+
+    def _set(self, request_id: str, fields: Dict, expected_status: Optional[str] = None) -> bool:
+        columns, extra = self._split(fields)
+
+        # Подписчики получают события в порядке изменений: _emit под той же блокировкой
+        with self._lock:
+            with self._transaction() as conn:
+                row = conn.execute(
+                    "SELECT status, extra FROM requests WHERE id = ? AND archived = 0", (request_id,)
+                ).fetchone()
+                if row is None:
+                    return False
+                if expected_status is not None and row['status'] != expected_status:
+                    return False
+                if extra or 'telegram_id' in columns:
+                    merged = json.loads(row['extra']) if row['extra'] else {}
+                    if 'telegram_id' in columns:
+                        # Прежний исходный тип больше не действителен
+                        merged.pop('telegram_id', None)
+                    merged.update(extra)
+                    columns['extra'] = json.dumps(merged, ensure_ascii=False) if merged else None
+                if columns:
+                    assignments = ', '.join(f"{_quote(c)} = ?" for c in columns)
+                    conn.execute(
+                        f"UPDATE requests SET {assignments} WHERE id = ?",
+                        list(columns.values()) + [request_id]
+                    )
+                updated = self._fetch(conn, "WHERE id = ?", (request_id,))
+            self._emit('set', updated)
+        return True
+
+    def _fetch(self, conn, where: str, params: tuple) -> List[Dict]:
+        rows = conn.execute(f"SELECT * FROM requests {where} ORDER BY seq", params).fetchall()
+        return [self._row_to_request(row) for row in rows]
+
+    def subscribe(self, callback):
+        """Подписаться на изменения: callback(event, request), как в LocalDatabase"""
+        self._listeners.append(callback)
+
+    def _emit(self, event: str, requests: List[Dict]):
+        """Вызывается под self._lock после COMMIT (см. LocalDatabase.subscribe)"""
+        for callback in self._listeners:
+            for request in requests:
+                try:
+                    callback(event, dict(request))
+                except Exception as e:
+                    print(f"Ошибка подписчика БД ({event}): {e}")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # --- Заявки ---
+
+    def add_request(self, request_data: Dict):
+        request = {
+            'id': request_data.get('id', ''),
+            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'first_name': request_data.get('first_name', ''),
+            'last_name': request_data.get('last_name', ''),
+            'group': request_data.get('group', ''),
+            'purpose': request_data.get('purpose', ''),
+            'status': 'В очереди',
+            'file_name': request_data.get('file_name', ''),
+            'file_path': request_data.get('file_path', ''),
+            'file_hash': request_data.get('file_hash', ''),
+            'file_size': request_data.get('file_size', 0),
+            'stl_format': request_data.get('stl_format', ''),
+            'triangles': request_data.get('triangles', 0),
+            'tg_file_id': request_data.get('tg_file_id', ''),
+            'upload_mode': request_data.get('upload_mode', 'eager'),
+            'telegram_id': request_data.get('telegram_id', ''),
+            'username': request_data.get('username', ''),
+            'comment': '',
+            'completed_date': None
+        }
+        with self._lock:
+            with self._transaction() as conn:
+                inserted = self._insert(conn, request)
+            if inserted:
+                self._emit('add', [request])
+
+    def update_status(self, request_id: str, new_status: str, expected_status: Optional[str] = None) -> bool:
+        """Сменить статус; с expected_status — только если заявка всё ещё в этом статусе"""
+        return self._set(request_id, {'status': new_status}, expected_status)
+
+    def get_all_requests(self) -> List[Dict]:
+        return self._select("WHERE archived = 0")
+
+    def get_pending_requests(self) -> List[Dict]:
+        return self._select("WHERE archived = 0 AND status = ?", ('В очереди',))
+
+    def get_in_progress_requests(self) -> List[Dict]:
+        return self._select("WHERE archived = 0 AND status = ?", ('В работе',))
+
+    def get_completed_requests(self) -> List[Dict]:
+        return self._select("WHERE archived = 0 AND status = ?", ('Готово',))
+
+    def get_pending_count(self) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM requests WHERE archived = 0 AND status = ?", ('В очереди',)
+            ).fetchone()
+        return row[0]
+
+    def get_request_by_id(self, request_id: str) -> Optional[Dict]:
+        requests = self._select("WHERE id = ? AND archived = 0", (request_id,))
+        return requests[0] if requests else None
+
+    def get_user_requests(self, telegram_id) -> List[Dict]:
+        """Активные заявки пользователя"""
+        return self._select("WHERE telegram_id = ? AND archived = 0", (str(telegram_id),))
+
+    def query(self, filters: Optional[Dict] = None, order: str = ORDER_ASC, cursor: Optional[str] = None,
+              limit: int = 5, archived: bool = False) -> Dict:
+        """Страница заявок с фильтрами и курсором (см. LocalDatabase.query); поиск по индексу"""
+        sort_field = 'archived_date' if archived else 'date'
+        # Пустое поле сортировки — как '' (см. LocalDatabase.query), иначе сравнение с NULL теряет строки
+        sort_key = f"COALESCE({sort_field}, '')"
+        where = ["archived = ?"]
+        params: list = [1 if archived else 0]
+        for field in FILTER_FIELDS:
+            value = (filters or {}).get(field)
+            if value is not None:
+                where.append(f"{_quote(field)} = ?")
+                params.append(str(value))
+
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM requests WHERE {' AND '.join(where)}", params
+            ).fetchone()[0]
+
+            # Страница «назад» выбирается в обратном порядке и потом разворачивается
+            direction = None
+            forward = order == ORDER_ASC
+            base_where, base_params = list(where), list(params)
+            offset = decode_offset(cursor) if cursor else 0
+            if offset is None:
+                direction, mark = decode_cursor(cursor)
+                after = (direction == 'a') == forward
+                where.append(f"({sort_key}, id) {'>' if after else '<'} (?, ?)")
+                params.extend(mark)
+                if direction == 'b':
+                    forward = not forward
+
+            sort = 'ASC' if forward else 'DESC'
+            rows = self._conn.execute(
+                f"SELECT * FROM requests WHERE {' AND '.join(where)} "
+                f"ORDER BY {sort_key} {sort}, id {sort} LIMIT ? OFFSET ?",
+                params + [limit + 1, 0 if direction else offset]
+            ).fetchall()
+
+            more = len(rows) > limit
+            items = [self._row_to_request(row) for row in rows[:limit]]
+            if direction == 'b':
+                items.reverse()
+
+            if direction and items:
+                # Номер первой заявки страницы — для offset_cursor (см. LocalDatabase.query)
+                first = (items[0].get(sort_field) or '', items[0]['id'])
+                offset = self._conn.execute(
+                    f"SELECT COUNT(*) FROM requests WHERE {' AND '.join(base_where)} "
+                    f"AND ({sort_key}, id) {'<' if order == ORDER_ASC else '>'} (?, ?)",
+                    base_params + list(first)
+                ).fetchone()[0]
+            elif direction:
+                offset = 0
+
+        has_next = (more and direction != 'b') or direction == 'b'
+        has_prev = (more and direction == 'b') or direction == 'a' or (not direction and offset > 0)
+        return {
+            'items': items,
+            'next': encode_cursor('a', items[-1].get(sort_field), items[-1]['id']) if has_next and items else None,
+            'prev': encode_cursor('b', items[0].get(sort_field), items[0]['id']) if has_prev and items else None,
+            'offset': offset,
+            'total': total,
+        }
+
+    def iter_requests(self, archived: bool = False, batch_size: int = 500) -> Iterator[Dict]:
+        """Все активные (или архивные) заявки порциями по seq (см. LocalDatabase.iter_requests)"""
+        last_seq = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT * FROM requests WHERE archived = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (1 if archived else 0, last_seq, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_seq = rows[-1]['seq']
+            for row in rows:
+                yield self._row_to_request(row)
+
+    def delete_request(self, request_id: str) -> bool:
+        with self._lock:
+            with self._transaction() as conn:
+                deleted = self._fetch(conn, "WHERE id = ? AND archived = 0", (request_id,))
+                conn.execute("DELETE FROM requests WHERE id = ? AND archived = 0", (request_id,))
+            self._emit('delete', deleted)
+        return bool(deleted)
+
+    def update_fields(self, request_id: str, fields: Dict) -> bool:
+        """Записать произвольные поля заявки (результаты обработки и т.п.)"""
+        return self._set(request_id, dict(fields))
+
+    def add_comment(self, request_id: str, comment: str) -> bool:
+        """Добавить комментарий к заявке"""
+        return self._set(request_id, {'comment': comment})
+
+    def archive_request(self, request_id: str) -> bool:
+        """Переместить заявку в архив"""
+        archived_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            with self._transaction() as conn:
+                cursor = conn.execute(
+                    "UPDATE requests SET archived = 1, archived_date = COALESCE(archived_date, ?) "
+                    "WHERE id = ? AND archived = 0",
+                    (archived_date, request_id)
+                )
+                archived = self._fetch(conn, "WHERE id = ?", (request_id,)) if cursor.rowcount else []
+            self._emit('archive', archived)
+        return bool(archived)
+
+    def get_archive(self) -> List[Dict]:
+        """Получить все архивные заявки"""
+        return self._select("WHERE archived = 1")
+
+    def clean_old_archive(self, days: int = 14) -> int:
+        """Очистить архив старше указанного количества дней"""
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            with self._transaction() as conn:
+                purged = self._fetch(conn, "WHERE archived = 1 AND archived_date < ?", (cutoff,))
+                conn.execute("DELETE FROM requests WHERE archived = 1 AND archived_date < ?", (cutoff,))
+            self._emit('purge_archive', purged)
+        return len(purged)
+
+    def manual_cleanup(self) -> Dict[str, int]:
+        """Ручная очистка старых заявок из основной БД"""
+        archived_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            with self._transaction() as conn:
+                moved = self._fetch(conn, "WHERE archived = 0 AND status = ?", ('Готово',))
+                conn.execute(
+                    "UPDATE requests SET archived = 1, archived_date = COALESCE(archived_date, ?) "
+                    "WHERE archived = 0 AND status = ?",
+                    (archived_date, 'Готово')
+                )
+            for request in moved:
+                request.setdefault('archived_date', archived_date)
+            self._emit('archive', moved)
+
+        return {
+            'moved_to_archive': len(moved),
+            'cleaned_from_archive': self.clean_old_archive(14)
+        }
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT под общей блокировкой соединения"""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.lock.release()
+        return False
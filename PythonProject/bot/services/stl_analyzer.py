@@ -0,0 +1,101 @@
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Запись треугольника двоичного STL: нормаль, три вершины, атрибут — 50 байт
+STL_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+BINARY_HEADER_SIZE = 84
+# Треугольников за один шаг вычислений (ограничивает память на Raspberry Pi)
+CHUNK_TRIANGLES = 1 << 18
+
+_VERTEX_RE = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+def load_triangles(path: str, stl_format: Optional[str] = None) -> np.ndarray:
+    """Вершины треугольников массивом (n, 3, 3).
+
+    Двоичный STL отображается в память без копирования (np.memmap),
+    текстовый разбирается целиком.
+    """
+    if stl_format is None:
+        stl_format = detect_format(path)
+
+    if stl_format == 'binary':
+        count = (os.path.getsize(path) - BINARY_HEADER_SIZE) // STL_DTYPE.itemsize
+        if count <= 0:
+            return np.empty((0, 3, 3), dtype='<f4')
+        records = np.memmap(path, dtype=STL_DTYPE, mode='r', offset=BINARY_HEADER_SIZE, shape=(count,))
+        return records['vertices']
+
+    with open(path, 'rb') as f:
+        coords = _VERTEX_RE.findall(f.read())
+    return np.array(coords, dtype=np.float64).reshape(-1, 3, 3)
+
+def detect_format(path: str) -> str:
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        head = f.read(BINARY_HEADER_SIZE)
+    if len(head) == BINARY_HEADER_SIZE:
+        count = int(np.frombuffer(head, dtype='<u4', offset=80)[0])
+        if BINARY_HEADER_SIZE + count * STL_DTYPE.itemsize == size:
+            return 'binary'
+    return 'ascii' if head.lstrip().startswith(b'solid') else 'binary'
+
+def estimate_print_minutes(volume_cm3: float, rate_cm3_per_hour: float, overhead_minutes: float) -> int:
+    """Грубая оценка времени печати по объёму модели"""
+    return int(round(overhead_minutes + volume_cm3 / rate_cm3_per_hour * 60))
+
+def analyze_stl(path: str, stl_format: Optional[str] = None,
+                rate_cm3_per_hour: float = 10.0, overhead_minutes: float = 10.0,
+                bed_mm: Optional[Tuple[float, float, float]] = None) -> Dict:
+    """Объём, площадь поверхности, габариты и оценка времени печати модели (единицы STL — мм)"""
+    triangles = load_triangles(path, stl_format)
+    count = len(triangles)
+
+    volume = 0.0
+    area = 0.0
+    bbox_min = np.full(3, np.inf)
+    bbox_max = np.full(3, -np.inf)
+
+    for start in range(0, count, CHUNK_TRIANGLES):
+        raw = triangles[start:start + CHUNK_TRIANGLES]
+        flat = raw.reshape(-1, 3)
+        bbox_min = np.minimum(bbox_min, flat.min(axis=0))
+        bbox_max = np.maximum(bbox_max, flat.max(axis=0))
+
+        chunk = np.asarray(raw, dtype=np.float64)
+        v0 = chunk[:, 0]
+        e1 = chunk[:, 1] - v0
+        e2 = chunk[:, 2] - v0
+        # Векторное произведение рёбер: его длина — удвоенная площадь треугольника
+        c = np.empty_like(e1)
+        c[:, 0] = e1[:, 1] * e2[:, 2] - e1[:, 2] * e2[:, 1]
+        c[:, 1] = e1[:, 2] * e2[:, 0] - e1[:, 0] * e2[:, 2]
+        c[:, 2] = e1[:, 0] * e2[:, 1] - e1[:, 1] * e2[:, 0]
+
+        # Объём — сумма ориентированных тетраэдров с вершиной в начале координат:
+        # v0 · (v1 × v2) = v0 · (e1 × e2)
+        volume += np.einsum('ij,ij->', v0, c) / 6.0
+        area += 0.5 * np.sqrt(np.einsum('ij,ij->i', c, c)).sum()
+
+    size = (bbox_max - bbox_min) if count else np.zeros(3)
+    volume_cm3 = abs(volume) / 1000.0
+
+    stats = {
+        'triangles': count,
+        'volume_cm3': round(float(volume_cm3), 2),
+        'area_cm2': round(float(area) / 100.0, 2),
+        'size_mm': [round(float(x), 1) for x in size],
+        'estimated_minutes': estimate_print_minutes(volume_cm3, rate_cm3_per_hour, overhead_minutes),
+    }
+    if bed_mm:
+        # Разрешаем повернуть модель в плоскости стола
+        x, y = sorted(size[:2])
+        bx, by = sorted(bed_mm[:2])
+        stats['fits_printer'] = bool(x <= bx and y <= by and size[2] <= bed_mm[2])
+    return stats
@@ -0,0 +1,95 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Лимит, передаваемый базовому классу: его семафор берётся до очереди чата,
+# поэтому настоящий лимит держит свой семафор, взятый уже после неё
+_BASE_LIMIT = 2 ** 31 - 1
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов с сохранением порядка внутри одного чата.
+
+    Апдейты разных чатов выполняются одновременно (не больше max_concurrent_updates),
+    апдейты одного чата — строго по очереди, поэтому состояния ConversationHandler
+    не перемешиваются. Сначала берётся блокировка чата, потом слот общего лимита,
+    чтобы ждущие своей очереди апдейты не занимали слоты других чатов.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates должен быть положительным")
+        super().__init__(_BASE_LIMIT)
+        self.limit = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks: Dict[Any, asyncio.Lock] = {}
+        self._chat_waiting: Dict[Any, int] = {}
+        self.queued = 0
+        self.in_flight = 0
+        self.processed = 0
+        self.max_queued = 0
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat_id = self._chat_key(update)
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        started = False
+
+        try:
+            async with self._chat_turn(chat_id):
+                async with self._slots:
+                    self.queued -= 1
+                    started = True
+                    self.in_flight += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+        finally:
+            if not started:
+                self.queued -= 1
+
+    @asynccontextmanager
+    async def _chat_turn(self, chat_id: Optional[int]):
+        """Дождаться очереди чата; апдейты без чата не упорядочиваются"""
+        if chat_id is None:
+            yield
+            return
+
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        self._chat_waiting[chat_id] = self._chat_waiting.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._chat_waiting[chat_id] -= 1
+            if not self._chat_waiting[chat_id]:
+                # Никто больше не ждёт этот чат — блокировка не нужна
+                del self._chat_waiting[chat_id]
+                del self._chat_locks[chat_id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def metrics(self) -> Dict[str, int]:
+        """Текущая глубина очереди и число выполняющихся апдейтов"""
+        return {
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'processed': self.processed,
+            'max_queued': self.max_queued,
+            'active_chats': len(self._chat_locks),
+            'limit': self.limit,
+        }
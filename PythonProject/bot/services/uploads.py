@@ -0,0 +1,133 @@
+import hashlib
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+
+CHUNK_SIZE = 64 * 1024
+BINARY_HEADER_SIZE = 84
+BINARY_TRIANGLE_SIZE = 50
+# Сколько последних байт текстового STL держать для проверки endsolid
+ASCII_TAIL_SIZE = 1024
+
+class UploadRejected(Exception):
+    """Файл не прошёл проверку; текст исключения показывается пользователю"""
+
+class StlStreamValidator:
+    """Проверка STL по мере скачивания, за один проход.
+
+    Каждый кусок сразу пишется во временный файл, добавляется в SHA-256
+    и разбирается: по заголовку определяется двоичный или текстовый формат,
+    для двоичного размер сверяется с числом треугольников, для текстового
+    считаются блоки endfacet. Лишние или недостающие байты обрываются ошибкой.
+    """
+
+    def __init__(self, dest_path: str, max_size: int, expected_size: Optional[int] = None):
+        self.dest_path = dest_path
+        self.tmp_path = dest_path + '.part'
+        self.max_size = max_size
+        self.expected_size = expected_size
+        self.size = 0
+        self.format = None
+        self.triangles = 0
+        self._sha256 = hashlib.sha256()
+        self._head = b''
+        self._binary_size = None
+        self._tail = b''
+        self._file = open(self.tmp_path, 'wb')
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadRejected(f"Файл больше {self.max_size // (1024 * 1024)} МБ.")
+
+        self._sha256.update(chunk)
+        self._file.write(chunk)
+
+        if self.format is None:
+            self._head += chunk
+            if len(self._head) >= BINARY_HEADER_SIZE:
+                self._detect_format(self._head)
+                chunk = self._head
+                self._head = b''
+
+        if self.format == 'binary' and self.size > self._binary_size:
+            raise UploadRejected("Файл длиннее, чем указано в заголовке STL.")
+        if self.format == 'ascii':
+            # Хвост предыдущего куска — чтобы не потерять слово на стыке
+            data = self._tail + chunk
+            self.triangles += data.count(b'endfacet') - self._tail.count(b'endfacet')
+            self._tail = data[-ASCII_TAIL_SIZE:]
+
+    def _detect_format(self, head: bytes):
+        triangles = struct.unpack_from('<I', head, 80)[0]
+        binary_size = BINARY_HEADER_SIZE + triangles * BINARY_TRIANGLE_SIZE
+
+        # Некоторые программы пишут «solid» и в двоичный заголовок, поэтому
+        # текстовым считаем только заголовок без нулевых байт (в двоичном они
+        # почти всегда есть — хотя бы в старшем байте числа треугольников).
+        # Имя после solid может быть не ASCII, например кириллица в UTF-8
+        is_text = head.lstrip().startswith(b'solid') and b'\0' not in head[:BINARY_HEADER_SIZE]
+        if self.expected_size == binary_size or not is_text:
+            self.format = 'binary'
+            self.triangles = triangles
+            self._binary_size = binary_size
+        else:
+            self.format = 'ascii'
+
+    def finish(self) -> Dict:
+        """Проверить файл целиком и переместить его на место"""
+        self._file.close()
+
+        if self.format is None:
+            raise UploadRejected("Файл слишком короткий для STL.")
+        if self.expected_size is not None and self.size != self.expected_size:
+            raise UploadRejected("Файл скачался не полностью, попробуйте отправить его ещё раз.")
+        if self.format == 'binary' and self.size != self._binary_size:
+            raise UploadRejected("Файл обрезан: размер не совпадает с числом треугольников.")
+        if self.format == 'ascii' and b'endsolid' not in self._tail:
+            raise UploadRejected("Текстовый STL не заканчивается на endsolid — файл обрезан.")
+        if not self.triangles:
+            raise UploadRejected("В файле нет ни одного треугольника.")
+
+        os.replace(self.tmp_path, self.dest_path)
+        return {
+            'file_hash': self._sha256.hexdigest(),
+            'file_size': self.size,
+            'stl_format': self.format,
+            'triangles': self.triangles,
+        }
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+async def download_stl(file, dest_path: str, max_size: int, expected_size: Optional[int] = None) -> Dict:
+    """Скачать telegram.File в dest_path, проверяя STL на лету.
+
+    Возвращает хеш, размер, формат и число треугольников; при ошибке
+    проверки бросает UploadRejected и не оставляет файла на диске.
+    """
+    if expected_size and expected_size > max_size:
+        raise UploadRejected(f"Файл больше {max_size // (1024 * 1024)} МБ.")
+
+    validator = StlStreamValidator(dest_path, max_size, expected_size)
+    try:
+        if file.file_path.startswith(('http://', 'https://')):
+            async with httpx.AsyncClient(timeout=60) as client:
+                async with client.stream('GET', file.file_path) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        validator.write(chunk)
+        else:
+            # Локальный Bot API сервер отдаёт путь к файлу на диске
+            with Path(file.file_path).open('rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    validator.write(chunk)
+        return validator.finish()
+    except Exception:
+        validator.abort()
+        raise
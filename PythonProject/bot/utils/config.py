@@ -10,12 +10,64 @@ if not TELEGRAM_BOT_TOKEN:
 
 ADMIN_CHAT_IDS=505680140,5016152706,593011891
 
+# Локальная БД: 'json' — перезапись файла целиком, 'journal' — журнал изменений + снимок,
+# 'sqlite' — data/requests.db (при первом запуске переносит данные из JSON)
+DB_STORAGE_MODE = os.getenv('DB_STORAGE_MODE', 'json')
+# Через сколько записей журнала сворачивать его в снимок
+DB_COMPACT_EVERY = int(os.getenv('DB_COMPACT_EVERY', '500'))
+
+# Сколько апдейтов из разных чатов обрабатывать одновременно (внутри чата — по порядку)
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '8'))
+
+# Окно группировки уведомлений о новых заявках, секунды (0 — слать каждую сразу)
+ADMIN_DIGEST_WINDOW = float(os.getenv('ADMIN_DIGEST_WINDOW', '60'))
+
+# Максимальный размер .stl файла (Bot API отдаёт ботам файлы до 20 МБ)
+MAX_STL_SIZE_MB = int(os.getenv('MAX_STL_SIZE_MB', '20'))
+
+# Когда скачивать модели: 'eager' — сразу при подаче, 'lazy' — хранить только file_id и скачивать,
+# когда модель понадобится (превью, LAZY_PREFETCH ближайших заявок очереди)
+UPLOAD_MODE = os.getenv('UPLOAD_MODE', 'eager')
+LAZY_PREFETCH = int(os.getenv('LAZY_PREFETCH', '3'))
+# Предельный объём скачанных в режиме lazy моделей на диске
+LAZY_CACHE_MB = int(os.getenv('LAZY_CACHE_MB', '200'))
+
+# Оценка времени печати: скорость печати (см³/ч) и подготовка (мин)
+PRINT_RATE_CM3_PER_HOUR = float(os.getenv('PRINT_RATE_CM3_PER_HOUR', '10'))
+PRINT_OVERHEAD_MINUTES = float(os.getenv('PRINT_OVERHEAD_MINUTES', '10'))
+# Рабочая область принтера, мм (Ш x Г x В)
+PRINTER_BED_MM = tuple(float(x) for x in os.getenv('PRINTER_BED_MM', '220x220x250').split('x'))
+
+# Принтеры через запятую и порядок очереди: fifo, sjf (сначала короткие), fair (поровну между группами)
+PRINTERS = [p.strip() for p in os.getenv('PRINTERS', 'Принтер 1').split(',') if p.strip()]
+QUEUE_POLICY = os.getenv('QUEUE_POLICY', 'fifo')
+# Веса групп для fair, например 'ИВТ-21:2,ИВТ-22:1' (по умолчанию 1)
+GROUP_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (item.split(':') for item in os.getenv('GROUP_WEIGHTS', '').split(',') if ':' in item)
+}
+# Оценка времени печати, пока модель ещё не обработана, минуты
+PRINT_DEFAULT_MINUTES = float(os.getenv('PRINT_DEFAULT_MINUTES', '60'))
+
+# Процессов для обработки моделей (0 — по числу ядер)
+MODEL_WORKERS = int(os.getenv('MODEL_WORKERS', '0'))
+
+# Превью моделей: сторона картинки в пикселях и предельный размер кэша на диске
+PREVIEW_SIZE = int(os.getenv('PREVIEW_SIZE', '320'))
+PREVIEW_CACHE_MB = int(os.getenv('PREVIEW_CACHE_MB', '50'))
+
 # Google Integration (опционально)             не надо
 GOOGLE_SHEET_ID = os.getenv('GOOGLE_SHEET_ID')
 GOOGLE_SERVICE_ACCOUNT_JSON = os.getenv('GOOGLE_SERVICE_ACCOUNT_KEY')
 
+# Подменить адрес Google API (например, http://127.0.0.1:8099 — стенд tools/fake_google.py); ключ тогда не нужен
+GOOGLE_API_ENDPOINT = os.getenv('GOOGLE_API_ENDPOINT')
+
 # Включена ли синхронизация с Google Таблицей  не надо
-USE_GOOGLE_SHEETS = bool(GOOGLE_SHEET_ID and GOOGLE_SERVICE_ACCOUNT_JSON)
+USE_GOOGLE_SHEETS = bool(GOOGLE_SHEET_ID and (GOOGLE_SERVICE_ACCOUNT_JSON or GOOGLE_API_ENDPOINT))
+
+# Как часто отправлять накопленные изменения в Google Таблицу, секунды
+SHEETS_SYNC_INTERVAL = float(os.getenv('SHEETS_SYNC_INTERVAL', '10'))
 
 # Статусы и их цвета для Google Таблицы (RGB в диапазоне 0–1)
 STATUS_COLORS = {
@@ -11,9 +11,47 @@ from telegram.ext import (
 )
 from bot.handlers import user, admin
 from bot.services.local_db import LocalDatabase
+from bot.services.sqlite_db import SQLiteDatabase
+from bot.services.async_db import AsyncLocalDatabase
+from bot.services.update_processor import PerChatUpdateProcessor
+from bot.services.notifier import NotificationDispatcher
+from bot.services.digest import NewRequestDigest
+from bot.services.blob_store import BlobStore
+from bot.services.model_jobs import ModelJobQueue
+from bot.services.preview import PreviewCache
+from bot.services.render_cache import RenderCache
+from bot.services.search import SearchIndex
+from bot.services.export import ExportService
+from bot.services.lazy_files import UPLOAD_LAZY, LazyFileFetcher
+from bot.services.queue_scheduler import PrintQueueScheduler
 from bot.services.scheduler import SchedulerService
 from bot.utils.states import UserStates, AdminStates
-from bot.utils.config import TELEGRAM_BOT_TOKEN
+from bot.utils.config import (
+    TELEGRAM_BOT_TOKEN,
+    ADMIN_CHAT_IDS,
+    DB_STORAGE_MODE,
+    DB_COMPACT_EVERY,
+    UPDATE_CONCURRENCY,
+    ADMIN_DIGEST_WINDOW,
+    PRINT_RATE_CM3_PER_HOUR,
+    PRINT_OVERHEAD_MINUTES,
+    PRINTER_BED_MM,
+    MODEL_WORKERS,
+    PREVIEW_SIZE,
+    PREVIEW_CACHE_MB,
+    PRINTERS,
+    QUEUE_POLICY,
+    GROUP_WEIGHTS,
+    PRINT_DEFAULT_MINUTES,
+    MAX_STL_SIZE_MB,
+    UPLOAD_MODE,
+    LAZY_PREFETCH,
+    LAZY_CACHE_MB,
+    USE_GOOGLE_SHEETS,
+    GOOGLE_SHEET_ID,
+    SHEET_NAME,
+    SHEETS_SYNC_INTERVAL
+)
 # main.py
 
 from bot.handlers.admin import (
@@ -30,7 +68,6 @@ from bot.handlers.admin import (
     send_message_to_user,
     view_archive,
     cleanup_requests,
-    navigate_pages,
     back_to_admin_menu,
     manage_groups,
     manage_purposes,
@@ -42,7 +79,8 @@ from bot.handlers.admin import (
     save_purpose,
     remove_purpose,
     delete_purpose,
-    export_to_excel  # ← ДОБАВЬТЕ ЭТУ СТРОКУ
+    export_menu,
+    export_requests
 )
 
 logging.basicConfig(
@@ -51,27 +89,137 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def post_init(application: Application):
+    notifier = NotificationDispatcher(application.bot)
+    await notifier.start()
+    application.bot_data['notifier'] = notifier
+    application.bot_data['admin_digest'] = NewRequestDigest(notifier, ADMIN_CHAT_IDS, ADMIN_DIGEST_WINDOW)
+    lazy_files = application.bot_data.get('lazy_files')
+    if lazy_files:
+        await lazy_files.start()
+
+async def post_shutdown(application: Application):
+    lazy_files = application.bot_data.get('lazy_files')
+    if lazy_files:
+        await lazy_files.stop()
+    digest = application.bot_data.get('admin_digest')
+    if digest:
+        await digest.stop()
+    notifier = application.bot_data.get('notifier')
+    if notifier:
+        await notifier.stop()
+
 def main():
     if not TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN не установлен!")
         return
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    update_processor = PerChatUpdateProcessor(UPDATE_CONCURRENCY)
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(update_processor)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    application.bot_data['update_processor'] = update_processor
     
    
     application.bot_data['groups'] = ['ИВТ-21', 'ИВТ-22', 'ИВТ-23', 'ИВТ-24']
     application.bot_data['purposes'] = ['Учебный проект', 'Курсовая работа', 'Диплом', 'Личное использование', 'Другое']
     
     try:
-        db = LocalDatabase('data/requests.json', 'data/archive.json')
-        application.bot_data['db'] = db
+        if DB_STORAGE_MODE == 'sqlite':
+            db = SQLiteDatabase('data/requests.db', 'data/requests.json', 'data/archive.json')
+        else:
+            db = LocalDatabase(
+                'data/requests.json',
+                'data/archive.json',
+                storage_mode=DB_STORAGE_MODE,
+                compact_every=DB_COMPACT_EVERY
+            )
+        # Обработчики работают с БД через асинхронный фасад, планировщик — напрямую
+        async_db = AsyncLocalDatabase(db)
+        application.bot_data['db'] = async_db
         logger.info("Локальная база данных инициализирована")
     except Exception as e:
         logger.error(f"Ошибка инициализации БД: {e}")
         return
     
+    blob_store = BlobStore('uploads/blobs', 'data/blob_refs.json')
+    db.subscribe(blob_store.on_db_event)
+    application.bot_data['blob_store'] = blob_store
+    
+    render_cache = RenderCache()
+    db.subscribe(render_cache.on_db_event)
+    application.bot_data['render_cache'] = render_cache
+    
+    search_index = SearchIndex()
+    search_index.load(db.get_all_requests(), db.get_archive())
+    db.subscribe(search_index.on_db_event)
+    application.bot_data['search_index'] = search_index
+    
+    export_service = ExportService(db, 'data/exports', 'data/export_state.json', 'data/export_changes.log')
+    db.subscribe(export_service.on_db_event)
+    application.bot_data['export_service'] = export_service
+    
+    sheets_sync = None
+    if USE_GOOGLE_SHEETS:
+        # Таблица обновляется в фоне пачками; обработчики её не ждут
+        from bot.services import google_sheets
+        from bot.services.sheets_sync import SheetsSyncEngine
+        if google_sheets.service:
+            sheets_sync = SheetsSyncEngine(
+                google_sheets.service, GOOGLE_SHEET_ID, SHEET_NAME, SHEETS_SYNC_INTERVAL,
+                rows=google_sheets.sheet_rows
+            )
+            sheets_sync.load(db.get_all_requests())
+            db.subscribe(sheets_sync.on_db_event)
+            sheets_sync.start()
+            application.bot_data['sheets_sync'] = sheets_sync
+            logger.info("Синхронизация с Google Таблицей запущена")
+    
+    queue_scheduler = PrintQueueScheduler(PRINTERS, QUEUE_POLICY, GROUP_WEIGHTS, PRINT_DEFAULT_MINUTES)
+    queue_scheduler.load(db.get_all_requests())
+    db.subscribe(queue_scheduler.on_db_event)
+    application.bot_data['queue_scheduler'] = queue_scheduler
+    
+    preview_cache = PreviewCache('data/previews', PREVIEW_CACHE_MB * 1024 * 1024)
+    application.bot_data['preview_cache'] = preview_cache
+    
+    model_jobs = ModelJobQueue(
+        db,
+        max_workers=MODEL_WORKERS or None,
+        rate_cm3_per_hour=PRINT_RATE_CM3_PER_HOUR,
+        overhead_minutes=PRINT_OVERHEAD_MINUTES,
+        bed_mm=PRINTER_BED_MM,
+        preview_cache=preview_cache,
+        preview_size=PREVIEW_SIZE
+    )
+    application.bot_data['model_jobs'] = model_jobs
+    resumed = model_jobs.resume()
+    if resumed:
+        logger.info(f"Возобновлена обработка моделей: {resumed}")
+    
+    if UPLOAD_MODE == UPLOAD_LAZY:
+        # Модели скачиваются по требованию и заранее для ближайших заявок очереди
+        lazy_files = LazyFileFetcher(
+            application.bot,
+            async_db,
+            blob_store,
+            model_jobs,
+            queue_scheduler,
+            max_bytes=LAZY_CACHE_MB * 1024 * 1024,
+            max_size=MAX_STL_SIZE_MB * 1024 * 1024,
+            prefetch_count=LAZY_PREFETCH
+        )
+        lazy_files.load(db.get_all_requests())
+        db.subscribe(lazy_files.on_db_event)
+        application.bot_data['lazy_files'] = lazy_files
+    
     try:
-        scheduler_service = SchedulerService(db)
+        scheduler_service = SchedulerService(db, blob_store, export_service)
         scheduler_service.start()
         application.bot_data['scheduler_service'] = scheduler_service
         logger.info("Планировщик задач запущен")
@@ -91,12 +239,18 @@ def main():
     )
     
     admin_conv_handler = ConversationHandler(
-        entry_points=[CommandHandler('admin', admin.admin_menu)],
+        entry_points=[
+            CommandHandler('admin', admin.admin_menu),
+            # Кнопки «Детали» из уведомлений о новых заявках
+            CallbackQueryHandler(admin.open_request_from_notification, pattern='^detail_'),
+        ],
         states={
             AdminStates.VIEW_REQUESTS: [
-                CallbackQueryHandler(admin.view_requests, pattern='^view_requests$'),
+                CallbackQueryHandler(admin.view_requests, pattern='^(view_requests$|rq:)'),
                 CallbackQueryHandler(admin.view_request_detail, pattern='^detail_'),
-                CallbackQueryHandler(admin.view_archive, pattern='^view_archive$'),
+                CallbackQueryHandler(admin.view_archive, pattern='^(view_archive$|ar:)'),
+                CallbackQueryHandler(admin.view_printers, pattern='^view_printers$'),
+                CallbackQueryHandler(admin.dispatch_next, pattern='^dispatch_'),
                 CallbackQueryHandler(admin.cleanup_requests, pattern='^cleanup_requests$'),
                 CallbackQueryHandler(admin.manage_groups, pattern='^manage_groups$'),
                 CallbackQueryHandler(admin.manage_purposes, pattern='^manage_purposes$'),
@@ -104,11 +258,12 @@ def main():
                 CallbackQueryHandler(admin.complete_request, pattern='^complete_'),
                 CallbackQueryHandler(admin.archive_request, pattern='^archive_'),
                 CallbackQueryHandler(admin.send_file_to_admin, pattern='^send_file_admin_'),
+                CallbackQueryHandler(admin.send_model_preview, pattern='^preview_'),
                 CallbackQueryHandler(admin.start_add_comment, pattern='^add_comment_'),
                 CallbackQueryHandler(admin.start_message_user, pattern='^message_user_'),
-                CallbackQueryHandler(admin.navigate_pages, pattern='^(next_page|prev_page)$'),
                 CallbackQueryHandler(admin.back_to_admin_menu, pattern='^admin_main_menu$'),
-                CallbackQueryHandler(export_to_excel, pattern='^export_excel$'),
+                CallbackQueryHandler(export_menu, pattern='^export_menu$'),
+                CallbackQueryHandler(export_requests, pattern='^export:'),
                 CallbackQueryHandler(admin.add_group, pattern='^add_group$'),
                 CallbackQueryHandler(admin.remove_group, pattern='^remove_group$'),
                 CallbackQueryHandler(admin.delete_group, pattern='^delete_group_'),
@@ -150,11 +305,20 @@ def main():
     
     application.add_handler(CommandHandler('start', user.start))
     application.add_handler(CommandHandler('my_requests', user.my_requests))
+    application.add_handler(CallbackQueryHandler(user.my_requests_page, pattern=r'^my_requests_\d+$'))
+    application.add_handler(CommandHandler('stats', admin.show_stats))
+    application.add_handler(CommandHandler('find', admin.find_requests))
+    application.add_handler(CommandHandler('export', admin.export_command))
     application.add_handler(user_conv_handler)
     application.add_handler(admin_conv_handler)
     
     logger.info("Бот запущен!")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
+    model_jobs.shutdown()
+    if sheets_sync:
+        sheets_sync.stop()
+    export_service.close()
+    async_db.close()
 
 if __name__ == '__main__':
     main()
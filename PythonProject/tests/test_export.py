@@ -0,0 +1,140 @@
+import csv
+import json
+import os
+
+import pytest
+
+from bot.services.export import FORMAT_COLUMNAR, FORMAT_CSV, ExportService, read_columnar
+from bot.services.local_db import LocalDatabase
+from bot.services.scheduler import BACKUP_CONSUMER, SchedulerService
+
+def read_csv(path: str) -> list:
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def open_service(db, tmp_path, **kwargs) -> ExportService:
+    service = ExportService(
+        db,
+        directory=str(tmp_path / 'exports'),
+        state_file=str(tmp_path / 'export_state.json'),
+        changes_file=str(tmp_path / 'export_changes.log'),
+        **kwargs
+    )
+    db.subscribe(service.on_db_event)
+    return service
+
+@pytest.fixture
+def db(tmp_path):
+    database = LocalDatabase(db_file=str(tmp_path / 'requests.json'), archive_file=str(tmp_path / 'archive.json'))
+    for request_id in ('a', 'b', 'c', 'd'):
+        database.add_request({'id': request_id, 'telegram_id': 1, 'first_name': 'Иван'})
+    return database
+
+def test_first_delta_is_full_export(db, tmp_path):
+    service = open_service(db, tmp_path)
+
+    path, count, partial = service.export(FORMAT_CSV, 'admin', delta=True)
+
+    assert not partial
+    assert count == 4
+    assert '_delta' not in os.path.basename(path)
+
+def test_delta_contains_only_changes_since_watermark(db, tmp_path):
+    service = open_service(db, tmp_path)
+    service.export(FORMAT_CSV, 'admin')
+    assert service.pending_changes('admin') == 0
+
+    db.update_status('a', 'В работе')
+    db.add_comment('a', 'первое')
+    db.add_comment('a', 'второе')
+    db.archive_request('c')
+    db.add_request({'id': 'e', 'telegram_id': 2})
+    assert service.pending_changes('admin') == 3
+
+    path, count, partial = service.export(FORMAT_CSV, 'admin', delta=True)
+
+    assert partial
+    rows = {row['id']: row for row in read_csv(path)}
+    assert count == 3
+    assert set(rows) == {'a', 'c', 'e'}
+    # По заявке — последнее изменение и её последний снимок
+    assert rows['a']['change'] == 'set'
+    assert rows['a']['comment'] == 'второе'
+    assert rows['c']['change'] == 'archive'
+    assert rows['e']['change'] == 'add'
+
+    # Отметка сдвинулась: повторная выгрузка пустая
+    assert service.pending_changes('admin') == 0
+    _, count, partial = service.export(FORMAT_CSV, 'admin', delta=True)
+    assert partial and count == 0
+
+def test_consumers_have_separate_watermarks(db, tmp_path):
+    service = open_service(db, tmp_path)
+    service.export(FORMAT_CSV, 'admin')
+    service.export(FORMAT_CSV, BACKUP_CONSUMER)
+
+    db.update_status('a', 'Готово')
+    service.export(FORMAT_CSV, 'admin', delta=True)
+    db.update_status('b', 'Готово')
+
+    assert service.pending_changes('admin') == 1
+    assert service.pending_changes(BACKUP_CONSUMER) == 2
+    path, count, _ = service.export(FORMAT_COLUMNAR, BACKUP_CONSUMER, delta=True)
+    assert count == 2
+    assert sorted(row['id'] for row in read_columnar(path)) == ['a', 'b']
+
+def test_watermark_survives_restart(db, tmp_path):
+    service = open_service(db, tmp_path)
+    service.export(FORMAT_CSV, 'admin')
+    db.update_status('b', 'В работе')
+    service.close()
+    db._listeners.clear()
+
+    reloaded = open_service(db, tmp_path)
+    db.update_status('d', 'В работе')
+
+    path, count, partial = reloaded.export(FORMAT_CSV, 'admin', delta=True)
+    assert partial
+    assert sorted(row['id'] for row in read_csv(path)) == ['b', 'd']
+
+def test_consumer_behind_trimmed_log_gets_full_export(db, tmp_path):
+    service = open_service(db, tmp_path, max_changes=4)
+    service.export(FORMAT_CSV, 'admin')
+    for i in range(6):
+        db.add_request({'id': f"n{i}", 'telegram_id': 3})
+
+    assert service.pending_changes('admin') is None
+    _, count, partial = service.export(FORMAT_CSV, 'admin', delta=True)
+    assert not partial
+    assert count == 10
+
+def test_idle_consumer_expires(db, tmp_path):
+    service = open_service(db, tmp_path, watermark_ttl_days=1)
+    service.export(FORMAT_CSV, 'old')
+    service._exported_at['old'] = '2000-01-01 00:00:00'
+    service.export(FORMAT_CSV, 'admin')
+
+    assert service.pending_changes('old') is None
+    with open(tmp_path / 'export_state.json', encoding='utf-8') as f:
+        assert 'old' not in json.load(f)['watermarks']
+
+def test_weekly_full_then_daily_delta_backup(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = open_service(db, tmp_path)
+    scheduler = SchedulerService(sheets_service=None, export_service=service)
+
+    scheduler.create_weekly_backup()
+    scheduler.create_daily_delta_backup()
+    files = sorted(os.listdir('backups'))
+    # Без изменений бэкап изменений не создаётся
+    assert len(files) == 1 and '_delta' not in files[0]
+    assert len(read_csv(os.path.join('backups', files[0]))) == 4
+
+    db.update_status('d', 'Готово')
+    scheduler.create_daily_delta_backup()
+
+    delta = [name for name in os.listdir('backups') if '_delta' in name]
+    assert len(delta) == 1
+    rows = read_csv(os.path.join('backups', delta[0]))
+    assert [(row['id'], row['status']) for row in rows] == [('d', 'Готово')]
+    assert service.pending_changes(BACKUP_CONSUMER) == 0
@@ -0,0 +1,130 @@
+import json
+import os
+
+import pytest
+
+from bot.services.local_db import STORAGE_JOURNAL, LocalDatabase
+
+def open_db(tmp_path, **kwargs) -> LocalDatabase:
+    return LocalDatabase(
+        db_file=str(tmp_path / 'requests.json'),
+        archive_file=str(tmp_path / 'archive.json'),
+        storage_mode=STORAGE_JOURNAL,
+        **kwargs
+    )
+
+def add(db: LocalDatabase, request_id: str, telegram_id: int = 1):
+    db.add_request({'id': request_id, 'telegram_id': telegram_id, 'first_name': 'Иван'})
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@pytest.fixture
+def crashed(tmp_path):
+    """БД, «упавшая» без close(): изменения есть только в журнале"""
+    db = open_db(tmp_path, compact_every=1000)
+    add(db, 'a')
+    add(db, 'b')
+    add(db, 'c', telegram_id=2)
+    db.update_status('a', 'В работе')
+    db.update_fields('b', {'comment': 'тонкие стенки'})
+    db.archive_request('c')
+    db.delete_request('b')
+    db._log.close()
+    return tmp_path
+
+def test_reload_replays_journal(crashed):
+    assert read_json(crashed / 'requests.json') == []
+
+    db = open_db(crashed)
+
+    assert [r['id'] for r in db.get_all_requests()] == ['a']
+    assert db.get_request_by_id('a')['status'] == 'В работе'
+    assert db.get_request_by_id('b') is None
+    assert [r['id'] for r in db.get_archive()] == ['c']
+    assert db.query({'status': 'В работе'})['total'] == 1
+    assert db.get_user_requests(2) == []
+    db.close()
+
+def test_reload_folds_journal_into_snapshot(crashed):
+    db = open_db(crashed)
+    db.close()
+
+    assert [r['id'] for r in read_json(crashed / 'requests.json')] == ['a']
+    assert [r['id'] for r in read_json(crashed / 'archive.json')] == ['c']
+    assert os.path.getsize(crashed / 'requests.log') == 0
+
+def test_reload_skips_torn_last_record(crashed):
+    with open(crashed / 'requests.log', 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "request": {"id": "d"')
+
+    db = open_db(crashed)
+
+    assert [r['id'] for r in db.get_all_requests()] == ['a']
+    db.close()
+
+def test_compaction_writes_snapshot_and_truncates_log(tmp_path):
+    db = open_db(tmp_path, compact_every=3)
+    for request_id in ('a', 'b', 'c'):
+        add(db, request_id)
+    # Третья запись запустила компакцию в фоне
+    db._compaction_thread.join()
+    add(db, 'd')
+
+    snapshot = [r['id'] for r in read_json(tmp_path / 'requests.json')]
+    assert snapshot == ['a', 'b', 'c']
+    assert not os.path.exists(tmp_path / 'requests.log.compacting')
+    with open(tmp_path / 'requests.log', 'r', encoding='utf-8') as f:
+        assert [json.loads(line)['request']['id'] for line in f] == ['d']
+
+    db._log.close()
+    reloaded = open_db(tmp_path)
+    assert [r['id'] for r in reloaded.get_all_requests()] == ['a', 'b', 'c', 'd']
+    reloaded.close()
+
+def test_reload_replays_unfinished_compaction(tmp_path):
+    db = open_db(tmp_path, compact_every=1000)
+    add(db, 'a')
+    add(db, 'b')
+    db._log.close()
+    # Компакция упала после переименования журнала, но до записи снимка
+    os.replace(tmp_path / 'requests.log', tmp_path / 'requests.log.compacting')
+    with open(tmp_path / 'requests.log', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'op': 'set', 'id': 'a', 'fields': {'status': 'Готово'}}) + '\n')
+
+    reloaded = open_db(tmp_path)
+
+    assert [r['id'] for r in reloaded.get_all_requests()] == ['a', 'b']
+    assert reloaded.get_request_by_id('a')['status'] == 'Готово'
+    assert not os.path.exists(tmp_path / 'requests.log.compacting')
+    reloaded.close()
+
+def test_crash_between_snapshot_files_keeps_archived_request(tmp_path, monkeypatch):
+    db = open_db(tmp_path, compact_every=1000)
+    add(db, 'a')
+    add(db, 'c')
+    db.compact()
+    db.archive_request('c')
+
+    # Сбой после записи первого файла снимка: второй не заменён
+    written = []
+    real_write = LocalDatabase._write_json_atomic
+
+    def crash_after_first(path, data):
+        if written:
+            raise OSError('сбой')
+        written.append(path)
+        real_write(path, data)
+
+    monkeypatch.setattr(LocalDatabase, '_write_json_atomic', staticmethod(crash_after_first))
+    db.compact()
+    monkeypatch.undo()
+    db._log.close()
+    assert os.path.exists(tmp_path / 'requests.log.compacting')
+
+    reloaded = open_db(tmp_path)
+
+    assert [r['id'] for r in reloaded.get_all_requests()] == ['a']
+    assert [r['id'] for r in reloaded.get_archive()] == ['c']
+    reloaded.close()
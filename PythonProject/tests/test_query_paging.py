@@ -0,0 +1,102 @@
+import pytest
+
+from bot.services.local_db import LocalDatabase
+from bot.services.query import decode_cursor, decode_offset, encode_cursor, offset_cursor
+from bot.services.sqlite_db import SQLiteDatabase
+
+STATUSES = ('В очереди', 'В работе', 'Готово')
+
+def fill(db):
+    for i in range(23):
+        db.add_request({'id': f"r{i:02d}", 'telegram_id': i % 3, 'first_name': 'Иван'})
+        # Одинаковые даты — порядок внутри решает id
+        db.update_fields(f"r{i:02d}", {
+            'date': f"2025-01-0{1 + i % 4} 10:00:00",
+            'status': STATUSES[i % 3],
+        })
+    # Заявка без даты сортируется как пустая строка
+    db.update_fields('r05', {'date': None})
+
+@pytest.fixture(params=['local', 'sqlite'])
+def db(request, tmp_path):
+    if request.param == 'local':
+        database = LocalDatabase(db_file=str(tmp_path / 'requests.json'), archive_file=str(tmp_path / 'archive.json'))
+    else:
+        database = SQLiteDatabase(
+            db_file=str(tmp_path / 'requests.db'),
+            json_file=str(tmp_path / 'none.json'),
+            archive_file=str(tmp_path / 'none_archive.json'),
+        )
+    fill(database)
+    return database
+
+def ids(page) -> list:
+    return [r['id'] for r in page['items']]
+
+def test_cursor_roundtrip():
+    cursor = encode_cursor('a', '2025-01-02 10:00:00', 'r07')
+    assert decode_cursor(cursor) == ('a', ('2025-01-02 10:00:00', 'r07'))
+    assert decode_cursor(encode_cursor('b', None, 'r05')) == ('b', ('', 'r05'))
+    assert decode_offset(offset_cursor(0)) == 0
+    assert decode_offset(offset_cursor(1234)) == 1234
+    assert decode_offset(cursor) is None
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('filters', [None, {'status': 'В очереди'}])
+def test_paging_forward_backward_and_by_offset(db, order, filters):
+    full = ids(db.query(filters, order=order, limit=100))
+    assert full
+    assert len(full) == db.query(filters, order=order)['total']
+
+    # Вперёд по курсорам: страницы подряд, offset — номер первой заявки
+    pages = []
+    cursor = None
+    while True:
+        page = db.query(filters, order=order, cursor=cursor, limit=4)
+        assert ids(page) == full[page['offset']:page['offset'] + len(page['items'])]
+        assert bool(page['prev']) == (page['offset'] > 0)
+        pages.append(page)
+        if not page['next']:
+            break
+        cursor = page['next']
+    assert sum((ids(p) for p in pages), []) == full
+
+    # Назад по курсорам до самого начала
+    page = pages[-1]
+    while page['prev']:
+        page = db.query(filters, order=order, cursor=page['prev'], limit=4)
+        assert ids(page) == full[page['offset']:page['offset'] + len(page['items'])]
+    assert page['offset'] == 0
+    assert ids(page) == full[:4]
+
+    # Та же страница по смещению — с теми же соседями
+    for page in pages:
+        by_offset = db.query(filters, order=order, cursor=offset_cursor(page['offset']), limit=4)
+        assert ids(by_offset) == ids(page)
+        assert bool(by_offset['prev']) == bool(page['prev'])
+        assert bool(by_offset['next']) == bool(page['next'])
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_backends_agree(tmp_path, order):
+    local = LocalDatabase(db_file=str(tmp_path / 'requests.json'), archive_file=str(tmp_path / 'archive.json'))
+    sqlite = SQLiteDatabase(
+        db_file=str(tmp_path / 'requests.db'),
+        json_file=str(tmp_path / 'none.json'),
+        archive_file=str(tmp_path / 'none_archive.json'),
+    )
+    for database in (local, sqlite):
+        fill(database)
+
+    for filters in (None, {'status': 'Готово'}, {'telegram_id': 1}):
+        cursors = {'local': None, 'sqlite': None}
+        while True:
+            local_page = local.query(filters, order=order, cursor=cursors['local'], limit=3)
+            sqlite_page = sqlite.query(filters, order=order, cursor=cursors['sqlite'], limit=3)
+            assert ids(local_page) == ids(sqlite_page)
+            assert local_page['total'] == sqlite_page['total']
+            assert local_page['offset'] == sqlite_page['offset']
+            assert local_page['next'] == sqlite_page['next']
+            assert local_page['prev'] == sqlite_page['prev']
+            if not local_page['next']:
+                break
+            cursors = {'local': local_page['next'], 'sqlite': sqlite_page['next']}
@@ -0,0 +1,117 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot.services.queue_scheduler import (
+    POLICY_FIFO, POLICY_SJF, FenwickTree, PrintQueueScheduler, QueueIndex
+)
+
+def request(request_id: str, status: str = 'В очереди', minutes: float = None, group: str = 'ИВТ-21') -> dict:
+    data = {'id': request_id, 'status': status, 'group': group}
+    if minutes is not None:
+        data['model_stats'] = {'estimated_minutes': minutes}
+    return data
+
+def positions(scheduler: PrintQueueScheduler, ids) -> dict:
+    return {i: scheduler.position(i)['position'] for i in ids if scheduler.position(i)}
+
+def test_fenwick_prefix_matches_sums_across_growth():
+    tree = FenwickTree(size=4)
+    values = [0.0] * 201
+    rng = random.Random(1)
+    for _ in range(500):
+        index = rng.randint(1, 200)
+        delta = rng.randint(-5, 5)
+        tree.add(index, delta)
+        values[index] += delta
+        probe = rng.randint(0, 250)
+        assert tree.prefix(probe) == sum(values[1:probe + 1])
+
+def test_queue_index_ahead_after_remove_and_change():
+    index = QueueIndex()
+    for seq, minutes in enumerate([10, 20, 30, 40], 1):
+        index.add(seq, minutes)
+
+    assert index.ahead(4) == (3, 60)
+    index.remove(2, 20)
+    assert index.ahead(4) == (2, 40)
+    index.change_minutes(3, 30, 5)
+    assert index.ahead(4) == (2, 15)
+    assert index.ahead(1) == (0, 0)
+
+def test_fifo_positions_after_insert_remove_and_status_change():
+    scheduler = PrintQueueScheduler(['P1'])
+    scheduler.load([request(i) for i in 'abcde'])
+    assert positions(scheduler, 'abcde') == {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4}
+
+    scheduler.on_db_event('delete', request('b'))
+    assert positions(scheduler, 'abcde') == {'a': 0, 'c': 1, 'd': 2, 'e': 3}
+
+    scheduler.on_db_event('set', request('a', status='В работе'))
+    assert scheduler.position('a') is None
+    assert scheduler.printer_of('a') == 'P1'
+    assert positions(scheduler, 'cde') == {'c': 0, 'd': 1, 'e': 2}
+
+    # Вернули в очередь — встаёт в конец
+    scheduler.on_db_event('set', request('a'))
+    assert positions(scheduler, 'acde') == {'c': 0, 'd': 1, 'e': 2, 'a': 3}
+    assert scheduler.printer_of('a') is None
+
+    scheduler.on_db_event('add', request('f'))
+    assert scheduler.position('f')['position'] == 4
+    assert scheduler.next_pending() == 'c'
+
+def test_fifo_start_splits_work_ahead_between_printers():
+    scheduler = PrintQueueScheduler(['P1', 'P2'], default_minutes=60)
+    scheduler.load([request(i) for i in 'abcd'])
+
+    now = datetime.now()
+    for position, request_id in enumerate('abcd'):
+        # Перед заявкой position * 60 минут работы на два свободных принтера
+        expected = now + timedelta(minutes=30 * position)
+        assert abs(scheduler.position(request_id)['start'] - expected) < timedelta(seconds=5)
+
+    scheduler.on_db_event('set', request('a', status='В работе'))
+    now = datetime.now()
+    # P1 занят a ещё час, перед c одна заявка b: она уходит на свободный P2
+    assert abs(scheduler.position('c')['start'] - (now + timedelta(minutes=60))) < timedelta(seconds=5)
+
+def test_sjf_order_follows_new_estimate():
+    scheduler = PrintQueueScheduler(['P1'], policy=POLICY_SJF)
+    scheduler.load([request('a', minutes=30), request('b', minutes=20), request('c', minutes=10)])
+    assert scheduler.upcoming(3) == ['c', 'b', 'a']
+
+    scheduler.on_db_event('set', request('c', minutes=90))
+    assert scheduler.next_pending() == 'b'
+    assert scheduler.upcoming(3) == ['b', 'a', 'c']
+    assert scheduler.position('c')['position'] == 2
+
+@pytest.mark.parametrize('policy', [POLICY_FIFO, POLICY_SJF])
+def test_heap_compaction_keeps_heap_bounded(policy):
+    scheduler = PrintQueueScheduler(['P1'], policy=policy)
+    rng = random.Random(2)
+    live = {}
+    for _ in range(5000):
+        request_id = f"r{rng.randint(0, 300)}"
+        action = rng.random()
+        if action < 0.5:
+            minutes = rng.randint(1, 100)
+            scheduler.on_db_event('set', request(request_id, minutes=minutes))
+            live[request_id] = minutes
+        elif action < 0.8:
+            scheduler.on_db_event('delete', request(request_id))
+            live.pop(request_id, None)
+        else:
+            scheduler.on_db_event('set', request(request_id, status='Готово'))
+            live.pop(request_id, None)
+        assert len(scheduler._heap) <= 2 * len(scheduler._pending) + 17
+
+    assert set(scheduler._pending) == set(live)
+    expected = scheduler.upcoming(len(live))
+    order = []
+    while scheduler.next_pending():
+        request_id = scheduler.next_pending()
+        order.append(request_id)
+        scheduler.on_db_event('set', request(request_id, status='В работе'))
+    assert order == expected
@@ -0,0 +1,85 @@
+import pytest
+
+from bot.services.local_db import LocalDatabase
+from bot.services.search import SCORE_EXACT, SCORE_FUZZY, SCORE_PREFIX, SearchIndex, tokenize
+
+REQUESTS = [
+    {'id': 'a1', 'first_name': 'Михаил', 'last_name': 'Смирнов', 'group': 'ИВТ-21',
+     'purpose': 'Курсовой проект', 'file_name': 'kronshtein_v2.stl', 'date': '2025-01-01 10:00:00'},
+    {'id': 'b2', 'first_name': 'Алёна', 'last_name': 'Смирнова', 'group': 'ИВТ-22',
+     'purpose': 'Диплом', 'file_name': 'korpus.stl', 'date': '2025-01-02 10:00:00'},
+    {'id': 'c3', 'first_name': 'Пётр', 'last_name': 'Иванов', 'group': 'ПИ-31',
+     'purpose': 'Хобби', 'file_name': 'gear_12.stl', 'date': '2025-01-03 10:00:00'},
+]
+
+@pytest.fixture
+def index():
+    search_index = SearchIndex()
+    search_index.load(REQUESTS, [])
+    return search_index
+
+def found(index: SearchIndex, text: str) -> dict:
+    return {r['id']: r['score'] for r in index.search(text)}
+
+def test_tokenize_splits_and_normalizes():
+    assert tokenize('Алёна_Gear-12.STL') == ['алена', 'gear', '12', 'stl']
+
+def test_exact_match(index):
+    assert found(index, 'иванов') == {'c3': SCORE_EXACT}
+    assert found(index, 'Алена') == {'b2': SCORE_EXACT}
+
+def test_prefix_match(index):
+    assert found(index, 'смирнов') == {'a1': SCORE_EXACT, 'b2': SCORE_PREFIX}
+    assert found(index, 'кронш') == {}
+    assert found(index, 'kron') == {'a1': SCORE_PREFIX}
+
+def test_one_typo_match(index):
+    # Замена, пропуск, лишняя буква и перестановка соседних
+    assert found(index, 'ивонов') == {'c3': SCORE_FUZZY}
+    assert found(index, 'ивнов') == {'c3': SCORE_FUZZY}
+    assert found(index, 'ивановв') == {'c3': SCORE_FUZZY}
+    assert found(index, 'виданов') == {}
+    assert found(index, 'иавнов') == {'c3': SCORE_FUZZY}
+    # Две опечатки — уже не совпадение
+    assert found(index, 'ивоноф') == {}
+
+def test_short_words_and_numbers_are_not_fuzzy(index):
+    assert found(index, '13') == {}
+    assert found(index, '12') == {'c3': SCORE_EXACT}
+
+def test_all_terms_must_match(index):
+    assert found(index, 'смирнова диплом') == {'b2': 2 * SCORE_EXACT}
+    assert found(index, 'смирнов хобби') == {}
+
+def test_reindex_drops_old_words(index):
+    index.on_db_event('set', dict(REQUESTS[2], last_name='Петров'))
+
+    assert found(index, 'иванов') == {}
+    assert found(index, 'петров') == {'c3': SCORE_EXACT}
+
+def test_delete_and_archive_events(tmp_path):
+    db = LocalDatabase(db_file=str(tmp_path / 'requests.json'), archive_file=str(tmp_path / 'archive.json'))
+    index = SearchIndex()
+    db.subscribe(index.on_db_event)
+    for request in REQUESTS:
+        db.add_request(request)
+        db.update_fields(request['id'], {'date': request['date']})
+
+    db.delete_request('c3')
+    assert found(index, 'иванов') == {}
+    assert found(index, 'ивонов') == {}
+
+    db.archive_request('b2')
+    results = index.search('диплом')
+    assert [r['id'] for r in results] == ['b2']
+    assert results[0]['archived'] is True
+
+    db.clean_old_archive(days=-1)
+    assert found(index, 'диплом') == {}
+    assert found(index, 'алена') == {}
+
+    # От удалённых заявок в словарях ничего не осталось
+    index.remove('a1')
+    assert index._postings == {}
+    assert index._vocabulary == []
+    assert index._deletes == {}
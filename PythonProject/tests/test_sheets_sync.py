@@ -0,0 +1,177 @@
+import pytest
+
+pytest.importorskip('googleapiclient')
+
+from tools.fake_google import ApiError, FakeGoogle, FakeGoogleServer  # noqa: E402
+
+SPREADSHEET_ID = 'test-sheet'
+SHEET_NAME = 'Заявки'
+
+def make_request(i: int, status: str = 'В очереди') -> dict:
+    return {
+        'id': f"r{i:03d}",
+        'first_name': 'Иван',
+        'last_name': f"Петров{i}",
+        'group': 'ИВТ-21',
+        'purpose': 'Курсовой проект',
+        'file_name': f"model_{i}.stl",
+        'status': status,
+        'date': '2025-01-01 10:00:00',
+        'telegram_id': 1000 + i,
+    }
+
+@pytest.fixture
+def fake(monkeypatch):
+    stand = FakeGoogle(sheet_name=SHEET_NAME)
+    server = FakeGoogleServer(stand).start()
+    monkeypatch.setenv('GOOGLE_API_ENDPOINT', server.endpoint)
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'test')
+    yield stand
+    server.stop()
+
+@pytest.fixture
+def make_engine(fake, tmp_path):
+    from bot.services import google_sheets
+    from bot.services.sheet_rows import SheetRowIndex
+    from bot.services.sheets_sync import SheetsSyncEngine
+
+    service = google_sheets.build_service()
+
+    def make():
+        rows = SheetRowIndex(str(tmp_path / 'sheet_rows.json'), SPREADSHEET_ID, SHEET_NAME)
+        return SheetsSyncEngine(service, SPREADSHEET_ID, SHEET_NAME, rows=rows)
+
+    return make
+
+def sheet(fake: FakeGoogle):
+    return fake.spreadsheet(SPREADSHEET_ID).sheets[0]
+
+def ids_in_sheet(fake: FakeGoogle) -> list:
+    """Столбец A без строки заголовка"""
+    return [row[0] if row else '' for row in sheet(fake).rows[1:]]
+
+def calls(fake: FakeGoogle) -> dict:
+    return fake.stats()['calls']
+
+def fail_on(monkeypatch, fake: FakeGoogle, operation: str, times: int = 1, before=None):
+    """Следующие times запросов operation получают 429"""
+    admit = fake.admit
+    left = {'count': times}
+
+    def failing(op):
+        admit(op)
+        if op == operation and left['count']:
+            left['count'] -= 1
+            if before:
+                before()
+            raise ApiError(429, 'Quota exceeded (test)')
+
+    monkeypatch.setattr(fake, 'admit', failing)
+
+def test_changes_are_batched(fake, make_engine):
+    engine = make_engine()
+    for i in range(20):
+        engine.on_db_event('add', make_request(i))
+    # Повторные изменения одной заявки схлопываются
+    engine.on_db_event('set', make_request(3, 'В работе'))
+    engine.on_db_event('set', make_request(3, 'Готово'))
+
+    assert engine.flush() == 20
+    assert calls(fake) == {
+        'sheets.get': 1,
+        'sheets.values.get': 1,
+        'sheets.values.append': 1,
+        'sheets.batchUpdate': 1,
+    }
+    assert ids_in_sheet(fake) == [f"r{i:03d}" for i in range(20)]
+
+    fake.reset()
+    for i in (2, 5, 7):
+        engine.on_db_event('set', make_request(i, 'В работе'))
+    assert engine.flush() == 3
+    # Строки уже известны: одна запись значений и одна — цветов, без чтения таблицы
+    assert calls(fake) == {'sheets.values.batchUpdate': 1, 'sheets.batchUpdate': 1}
+    assert engine.flush() == 0
+
+def test_row_lookup_after_append(fake, make_engine):
+    engine = make_engine()
+    for i in range(5):
+        engine.on_db_event('add', make_request(i))
+    engine.flush()
+    for i in range(5, 8):
+        engine.on_db_event('add', make_request(i))
+    engine.flush()
+
+    rows = ids_in_sheet(fake)
+    for i in range(8):
+        request_id = f"r{i:03d}"
+        assert rows[engine.rows.get(request_id) - 2] == request_id
+
+    engine.on_db_event('archive', make_request(6))
+    engine.flush()
+    row = sheet(fake).rows[engine.rows.get('r006') - 1]
+    assert row[0] == 'r006'
+    assert 'Архив' in row
+    assert len(ids_in_sheet(fake)) == 8
+
+    # После перезапуска индекс берётся из файла и сверяется одним чтением столбца A
+    restarted = make_engine()
+    assert restarted.rows.get('r006') == engine.rows.get('r006')
+    fake.reset()
+    restarted.on_db_event('set', make_request(1, 'Готово'))
+    restarted.flush()
+    assert calls(fake)['sheets.values.get'] == 1
+    assert 'sheets.values.append' not in calls(fake)
+    assert 'Готово' in sheet(fake).rows[restarted.rows.get('r001') - 1]
+
+def test_failed_batch_is_requeued(fake, make_engine, monkeypatch):
+    engine = make_engine()
+    for i in range(3):
+        engine.on_db_event('add', make_request(i))
+    engine.flush()
+
+    for i in range(3):
+        engine.on_db_event('set', make_request(i, 'В работе'))
+    # Пока пачка отправляется, заявка r001 меняется ещё раз — новое изменение важнее
+    fail_on(monkeypatch, fake, 'sheets.values.batchUpdate',
+            before=lambda: engine.on_db_event('set', make_request(1, 'Готово')))
+
+    with pytest.raises(Exception):
+        engine.flush()
+    assert engine.pending_count() == 3
+
+    assert engine.flush() == 3
+    rows = sheet(fake).rows
+    assert 'В работе' in rows[engine.rows.get('r000') - 1]
+    assert 'Готово' in rows[engine.rows.get('r001') - 1]
+    assert ids_in_sheet(fake) == ['r000', 'r001', 'r002']
+
+def test_writes_wait_for_rebuild_after_drift(fake, make_engine, monkeypatch):
+    engine = make_engine()
+    for i in range(3):
+        engine.on_db_event('add', make_request(i))
+    engine.flush()
+
+    # Строку вставили вручную: следующий append ляжет не туда, куда ждёт индекс
+    sheet(fake).rows.insert(1, ['manual'])
+    engine.on_db_event('add', make_request(3))
+    fail_on(monkeypatch, fake, 'sheets.values.get')
+    with pytest.raises(Exception):
+        engine.flush()
+    assert not engine.rows.ready
+
+    # Пока индекс не построен, ничего не пишется
+    fail_on(monkeypatch, fake, 'sheets.values.get')
+    fake.reset()
+    engine.on_db_event('set', make_request(0, 'Готово'))
+    with pytest.raises(Exception):
+        engine.flush()
+    assert set(calls(fake)) == {'sheets.values.get'}
+
+    engine.flush()
+    assert engine.rows.ready
+    rows = ids_in_sheet(fake)
+    # r003 записан один раз, r000 обновлён в своей (сдвинутой) строке
+    assert rows.count('r003') == 1
+    assert rows[engine.rows.get('r000') - 2] == 'r000'
+    assert 'Готово' in sheet(fake).rows[engine.rows.get('r000') - 1]
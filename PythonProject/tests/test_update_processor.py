@@ -0,0 +1,73 @@
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+from telegram import Update
+
+from bot.services.update_processor import PerChatUpdateProcessor
+
+def update_for(chat_id: int) -> Update:
+    update = MagicMock(spec=Update)
+    update.effective_chat.id = chat_id
+    return update
+
+async def handler(log: list, chat_id: int, name: str, duration: float):
+    log.append(('start', name, time.monotonic()))
+    await asyncio.sleep(duration)
+    log.append(('end', name, time.monotonic()))
+
+def run(processor: PerChatUpdateProcessor, jobs, delay: float = 0.01) -> list:
+    """Отдать апдейты процессору по одному с паузой delay; вернуть журнал обработчиков"""
+    log = []
+
+    async def main():
+        tasks = []
+        for chat_id, name, duration in jobs:
+            coroutine = handler(log, chat_id, name, duration)
+            tasks.append(asyncio.create_task(processor.process_update(update_for(chat_id), coroutine)))
+            await asyncio.sleep(delay)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return log
+
+def moment(log: list, event: str, name: str) -> float:
+    return next(t for e, n, t in log if e == event and n == name)
+
+def test_slow_chat_does_not_delay_other_chats():
+    processor = PerChatUpdateProcessor(2)
+    log = run(processor, [(1, 'a1', 0.5), (1, 'a2', 0.1), (1, 'a3', 0.1), (2, 'b1', 0.01)])
+
+    # a2 и a3 ждут очереди чата 1, но слот для чата 2 остаётся свободным
+    assert moment(log, 'start', 'b1') < moment(log, 'end', 'a1')
+
+def test_updates_of_one_chat_run_in_order():
+    processor = PerChatUpdateProcessor(4)
+    log = run(processor, [(1, f'a{i}', 0.02) for i in range(4)], delay=0)
+
+    starts = [name for event, name, _ in log if event == 'start']
+    assert starts == ['a0', 'a1', 'a2', 'a3']
+    for previous, current in zip(starts, starts[1:]):
+        assert moment(log, 'end', previous) <= moment(log, 'start', current)
+
+def test_limit_caps_parallel_chats():
+    processor = PerChatUpdateProcessor(2)
+    peak = 0
+
+    async def main():
+        nonlocal peak
+
+        async def work():
+            nonlocal peak
+            peak = max(peak, processor.in_flight)
+            await asyncio.sleep(0.02)
+
+        await asyncio.gather(*(processor.process_update(update_for(i), work()) for i in range(6)))
+
+    asyncio.run(main())
+
+    assert peak == 2
+    metrics = processor.metrics()
+    assert metrics['processed'] == 6
+    assert metrics['limit'] == 2
+    assert metrics['active_chats'] == 0
@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+
+from bot.services.uploads import StlStreamValidator, UploadRejected
+
+FACET = (
+    "facet normal 0 0 1\n"
+    "  outer loop\n"
+    "    vertex 0 0 0\n"
+    "    vertex 1 0 0\n"
+    "    vertex 0 1 0\n"
+    "  endloop\n"
+    "endfacet\n"
+)
+
+def ascii_stl(name: str, facets: int = 2) -> bytes:
+    return f"solid {name}\n{FACET * facets}endsolid {name}\n".encode('utf-8')
+
+def binary_stl(header: bytes, facets: int = 2) -> bytes:
+    triangle = struct.pack('<12fH', *([0.0] * 12), 0)
+    return header.ljust(80, b' ')[:80] + struct.pack('<I', facets) + triangle * facets
+
+def validate(tmp_path, data: bytes, chunk: int = 7, expected_size=None) -> dict:
+    validator = StlStreamValidator(str(tmp_path / 'model.stl'), max_size=10 ** 6, expected_size=expected_size)
+    try:
+        for start in range(0, len(data), chunk):
+            validator.write(data[start:start + chunk])
+        return validator.finish()
+    except Exception:
+        validator.abort()
+        raise
+
+def test_ascii_with_cyrillic_name(tmp_path):
+    data = ascii_stl('Кронштейн для полки, версия 2 — финальная')
+
+    result = validate(tmp_path, data, expected_size=len(data))
+
+    assert result['stl_format'] == 'ascii'
+    assert result['triangles'] == 2
+    assert (tmp_path / 'model.stl').read_bytes() == data
+
+def test_binary_with_solid_header(tmp_path):
+    data = binary_stl(b'solid exported by CAD', facets=3)
+
+    result = validate(tmp_path, data)
+
+    assert result['stl_format'] == 'binary'
+    assert result['triangles'] == 3
+
+def test_truncated_binary_is_rejected(tmp_path):
+    data = binary_stl(b'binary header', facets=3)
+
+    with pytest.raises(UploadRejected):
+        validate(tmp_path, data[:-10])
+    assert not (tmp_path / 'model.stl').exists()
+    assert not (tmp_path / 'model.stl.part').exists()
+
+def test_ascii_without_endsolid_is_rejected(tmp_path):
+    data = ascii_stl('Деталь')
+
+    with pytest.raises(UploadRejected):
+        validate(tmp_path, data[:-20])
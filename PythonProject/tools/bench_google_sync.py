@@ -0,0 +1,326 @@
+"""Сколько запросов к Google API уходит на операцию бота — замер на стенде tools/fake_google.py.
+
+    python -m tools.bench_google_sync                         # таблица результатов
+    python -m tools.bench_google_sync --requests 200 --latency-ms 120
+    python -m tools.bench_google_sync --rate-limit 60         # как квота Sheets: 60 запросов в минуту
+    python -m tools.bench_google_sync --json bench.json       # сохранить результат
+    python -m tools.bench_google_sync --baseline bench.json   # выход с кодом 1, если запросов стало больше
+
+Стенд поднимается в этом же процессе; --endpoint — взять уже запущенный
+(python -m tools.fake_google). Индексы строк и временные файлы пишутся во
+временный каталог, data/ бота не трогается. Операции, для которых не
+установлена библиотека (google-api-python-client, gspread), пропускаются.
+Сравнивать с базовым замером стоит без --rate-limit и --fail-rate:
+повторы после 429 тоже считаются запросами.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tools.fake_google import FakeGoogle, FakeGoogleServer  # noqa: E402
+
+SPREADSHEET_ID = 'bench-sheet'
+GSPREAD_SPREADSHEET_ID = 'bench-gspread'
+DRIVE_FOLDER_ID = 'bench-folder'
+
+class Stand:
+    """Счётчики стенда через его HTTP-интерфейс (работает и для внешнего стенда)"""
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+
+    def _call(self, path: str, method: str = 'GET') -> Dict:
+        request = urllib.request.Request(self.endpoint + path, method=method, data=b'' if method == 'POST' else None)
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    def stats(self) -> Dict:
+        return self._call('/_stats')
+
+    def reset(self):
+        self._call('/_reset', 'POST')
+
+def make_request(prefix: str, i: int) -> Dict:
+    return {
+        'id': f'{prefix}{i:05d}',
+        'first_name': 'Иван',
+        'last_name': f'Петров{i}',
+        'group': f'ИВТ-{21 + i % 4}',
+        'purpose': 'Курсовой проект',
+        'file_name': f'model_{i}.stl',
+        'file_path': f'uploads/model_{i}.stl',
+        'telegram_id': 100000 + i,
+        'username': f'user{i}',
+        'status': 'В очереди',
+        'comment': '',
+        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+class Bench:
+    def __init__(self, stand: Stand, retry_delay: float, timeout: float):
+        self.stand = stand
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.results: List[Dict] = []
+
+    def measure(self, operation: str, items: int, func: Callable[[], Optional[int]]):
+        self.stand.reset()
+        started = time.perf_counter()
+        retries = func() or 0
+        seconds = time.perf_counter() - started
+        stats = self.stand.stats()
+        self.results.append({
+            'operation': operation,
+            'items': items,
+            'round_trips': stats['total'],
+            'per_item': round(stats['total'] / items, 3) if items else None,
+            'throttled': stats['throttled'],
+            'retries': retries,
+            'seconds': round(seconds, 3),
+            'calls': stats['calls'],
+        })
+
+    def skip(self, operation: str, reason: str):
+        self.results.append({'operation': operation, 'skipped': reason})
+
+    def drain(self, engine) -> int:
+        """Отправлять накопленное, пока очередь не опустеет; вернуть число повторов после ошибок"""
+        retries = 0
+        deadline = time.monotonic() + self.timeout
+        while engine.pending_count():
+            try:
+                engine.flush()
+            except Exception as e:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Очередь не опустела за {self.timeout} с: {e}")
+                retries += 1
+                time.sleep(self.retry_delay)
+        return retries
+
+    def call_with_retry(self, func: Callable, *args) -> int:
+        """Синхронные функции бота ошибки 429 не повторяют — повторяет замер"""
+        retries = 0
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                func(*args)
+                return retries
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise
+                retries += 1
+                time.sleep(self.retry_delay)
+
+def bench_sync_engine(bench: Bench, count: int, interval: float):
+    names = ['sheets_sync: новые заявки', 'sheets_sync: смена статуса',
+             'sheets_sync: 3 изменения на заявку', 'sheets_sync: сверка после перезапуска']
+    try:
+        from bot.services import google_sheets
+        from bot.services.sheet_rows import SheetRowIndex
+        from bot.services.sheets_sync import SheetsSyncEngine
+        service = google_sheets.build_service()
+    except ImportError as e:
+        for name in names:
+            bench.skip(name, f"нет библиотеки: {e.name}")
+        return
+
+    sheet_name = google_sheets._sheet_name()
+    engine = SheetsSyncEngine(service, SPREADSHEET_ID, sheet_name, interval, rows=google_sheets.sheet_rows)
+    requests = [make_request('s', i) for i in range(count)]
+
+    def add():
+        for request in requests:
+            engine.on_db_event('add', request)
+        return bench.drain(engine)
+
+    def status():
+        for request in requests:
+            engine.on_db_event('set', {**request, 'status': 'В работе'})
+        return bench.drain(engine)
+
+    def burst():
+        for request in requests:
+            for status in ('В работе', 'Готово', 'Архив'):
+                engine.on_db_event('set', {**request, 'status': status})
+        return bench.drain(engine)
+
+    def restart():
+        # Новый процесс: индекс из файла, столбец A читается один раз
+        restarted = SheetsSyncEngine(
+            service, SPREADSHEET_ID, sheet_name, interval,
+            rows=SheetRowIndex(google_sheets.sheet_rows.path, SPREADSHEET_ID, sheet_name)
+        )
+        restarted.load(requests)
+        return bench.drain(restarted)
+
+    for name, func, items in zip(names, (add, status, burst, restart), (count, count, count * 3, count)):
+        bench.measure(name, items, func)
+
+def bench_sheet_helpers(bench: Bench, count: int):
+    names = ['google_sheets.append_new_request_to_sheet', 'google_sheets.update_sheet_row']
+    try:
+        from bot.services import google_sheets
+    except ImportError as e:
+        for name in names:
+            bench.skip(name, f"нет библиотеки: {e.name}")
+        return
+    if google_sheets.service is None:
+        for name in names:
+            bench.skip(name, "клиент Sheets не создан (нет google-api-python-client)")
+        return
+
+    requests = [make_request('h', i) for i in range(count)]
+
+    def append():
+        return sum(bench.call_with_retry(google_sheets.append_new_request_to_sheet, r) for r in requests)
+
+    def update():
+        return sum(bench.call_with_retry(google_sheets.update_sheet_row, {**r, 'status': 'Готово'}) for r in requests)
+
+    bench.measure(names[0], count, append)
+    bench.measure(names[1], count, update)
+
+def bench_sheets_service(bench: Bench, count: int):
+    names = ['SheetsService: открытие', 'SheetsService.add_request',
+             'SheetsService.update_status', 'SheetsService.get_request_by_id']
+    try:
+        from bot.services.sheets import SheetsService
+    except ImportError as e:
+        for name in names:
+            bench.skip(name, f"нет библиотеки: {e.name}")
+        return
+
+    holder = {}
+
+    def open_sheet():
+        holder['service'] = SheetsService(GSPREAD_SPREADSHEET_ID)
+
+    bench.measure(names[0], 1, open_sheet)
+    service = holder['service']
+    # Пустой лист стенда — заголовки, как у новой таблицы
+    service._init_worksheet()
+    requests = [make_request('g', i) for i in range(count)]
+
+    bench.measure(names[1], count, lambda: sum(bench.call_with_retry(service.add_request, r) for r in requests))
+    bench.measure(names[2], count, lambda: sum(
+        bench.call_with_retry(service.update_status, r['id'], 'В работе') for r in requests
+    ))
+    bench.measure(names[3], count, lambda: sum(
+        bench.call_with_retry(service.get_request_by_id, r['id']) for r in requests
+    ))
+
+def bench_drive(bench: Bench, count: int, workdir: str):
+    names = ['DriveService.upload_file', 'DriveService.list_files_in_folder',
+             'DriveService.get_file_info', 'DriveService.delete_file']
+    try:
+        from bot.services.drive import DriveService
+        drive = DriveService(DRIVE_FOLDER_ID)
+    except ImportError as e:
+        for name in names:
+            bench.skip(name, f"нет библиотеки: {e.name}")
+        return
+
+    path = os.path.join(workdir, 'bench.stl')
+    with open(path, 'wb') as f:
+        f.write(b'\0' * 80 + (0).to_bytes(4, 'little'))
+    file_ids: List[str] = []
+
+    def upload():
+        for i in range(count):
+            file_ids.append(drive.upload_file(path, f'bench_{i}.stl')[1])
+
+    bench.measure(names[0], count, upload)
+    bench.measure(names[1], 1, drive.list_files_in_folder)
+    bench.measure(names[2], count, lambda: [drive.get_file_info(file_id) for file_id in file_ids] and None)
+    bench.measure(names[3], count, lambda: [drive.delete_file(file_id) for file_id in file_ids] and None)
+
+def print_table(results: List[Dict]):
+    width = max(len(r['operation']) for r in results)
+    print(f"{'Операция':<{width}}  {'шт.':>5}  {'запросов':>8}  {'на шт.':>7}  {'429':>4}  {'сек':>7}")
+    for r in results:
+        if 'skipped' in r:
+            print(f"{r['operation']:<{width}}  пропущено: {r['skipped']}")
+            continue
+        print(f"{r['operation']:<{width}}  {r['items']:>5}  {r['round_trips']:>8}  "
+              f"{r['per_item']:>7}  {r['throttled']:>4}  {r['seconds']:>7}")
+
+def compare(results: List[Dict], baseline_path: str) -> bool:
+    """Сравнить с сохранённым замером; False — где-то запросов стало больше"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r['operation']: r for r in json.load(f) if 'skipped' not in r}
+    ok = True
+    for r in results:
+        before = baseline.get(r['operation'])
+        if 'skipped' in r or not before:
+            continue
+        if before['items'] != r['items']:
+            print(f"~ {r['operation']}: другое число заявок ({before['items']} → {r['items']}), не сравнивается")
+            continue
+        if r['round_trips'] > before['round_trips']:
+            ok = False
+            print(f"✗ {r['operation']}: запросов {before['round_trips']} → {r['round_trips']}")
+        elif r['round_trips'] < before['round_trips']:
+            print(f"✓ {r['operation']}: запросов {before['round_trips']} → {r['round_trips']}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Замер запросов к Google API на операцию бота')
+    parser.add_argument('--requests', type=int, default=50, help='заявок в каждом сценарии')
+    parser.add_argument('--files', type=int, default=5, help='файлов в сценариях Drive')
+    parser.add_argument('--endpoint', help='адрес уже запущенного стенда (по умолчанию — свой)')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--rate-limit', type=int, default=0, help='запросов за окно, дальше 429')
+    parser.add_argument('--rate-window', type=float, default=60)
+    parser.add_argument('--fail-rate', type=float, default=0, help='доля случайных ответов 429')
+    parser.add_argument('--retry-delay', type=float, default=1, help='пауза перед повтором после ошибки, секунды')
+    parser.add_argument('--timeout', type=float, default=300, help='предел одного сценария, секунды')
+    parser.add_argument('--json', dest='json_path', help='сохранить результаты в файл')
+    parser.add_argument('--baseline', help='сравнить с сохранённым результатом')
+    args = parser.parse_args()
+
+    server = None
+    endpoint = args.endpoint
+    if not endpoint:
+        fake = FakeGoogle(args.latency_ms, args.jitter_ms, args.rate_limit, args.rate_window, args.fail_rate)
+        server = FakeGoogleServer(fake).start()
+        endpoint = server.endpoint
+
+    # Модули бота читают настройки при импорте, поэтому окружение — до импорта
+    os.environ['GOOGLE_API_ENDPOINT'] = endpoint
+    os.environ['GOOGLE_SHEET_ID'] = SPREADSHEET_ID
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'bench')
+    workdir = tempfile.mkdtemp(prefix='bench_google_')
+    os.chdir(workdir)
+
+    bench = Bench(Stand(endpoint), args.retry_delay, args.timeout)
+    try:
+        bench_sync_engine(bench, args.requests, interval=0)
+        bench_sheet_helpers(bench, args.requests)
+        bench_sheets_service(bench, args.requests)
+        bench_drive(bench, args.files, workdir)
+    finally:
+        if server:
+            server.stop()
+
+    print_table(bench.results)
+    if args.json_path:
+        with open(os.path.join(ROOT, args.json_path) if not os.path.isabs(args.json_path) else args.json_path,
+                  'w', encoding='utf-8') as f:
+            json.dump(bench.results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        baseline = args.baseline if os.path.isabs(args.baseline) else os.path.join(ROOT, args.baseline)
+        if not compare(bench.results, baseline):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
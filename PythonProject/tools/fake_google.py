@@ -0,0 +1,542 @@
+"""Локальный стенд Google Sheets v4 и Drive v3 для замеров без обращения к Google.
+
+Реализует только то, что вызывают bot/services/google_sheets.py, sheets_sync.py,
+sheets.py (gspread) и drive.py. Таблицы и файлы хранятся в памяти, таблица
+с неизвестным ID создаётся при первом обращении. Задержку ответа и отказы 429
+(превышение квоты) можно настроить; GET /_stats — сколько запросов какого вида
+пришло, POST /_reset — обнулить счётчики.
+
+Запуск отдельно и бот против него:
+
+    python -m tools.fake_google --port 8099 --latency-ms 150 --rate-limit 60
+    GOOGLE_API_ENDPOINT=http://127.0.0.1:8099 GOOGLE_SHEET_ID=fake python main.py
+
+Упрощения: values.append дописывает после последней непустой строки листа
+(без поиска «таблицы» внутри диапазона), значения хранятся и отдаются
+строками, форматирование и права доступа только подсчитываются.
+"""
+import argparse
+import email.parser
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+SPREADSHEET_MIME = 'application/vnd.google-apps.spreadsheet'
+DEFAULT_COLUMNS = 26
+
+# A1, A, 5, AB12 — столбец и/или строка
+_CELL = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+class ApiError(Exception):
+    """Ответ с ошибкой в формате Google API"""
+
+    STATUS = {400: 'INVALID_ARGUMENT', 404: 'NOT_FOUND', 429: 'RESOURCE_EXHAUSTED'}
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def payload(self) -> Dict:
+        return {'error': {'code': self.code, 'message': self.message, 'status': self.STATUS.get(self.code, 'UNKNOWN')}}
+
+def column_number(letters: str) -> int:
+    number = 0
+    for ch in letters.upper():
+        number = number * 26 + ord(ch) - ord('A') + 1
+    return number
+
+def column_letters(number: int) -> str:
+    letters = ''
+    while number:
+        number, rest = divmod(number - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+def quote_title(title: str) -> str:
+    if re.fullmatch(r'[A-Za-z0-9_]+', title):
+        return title
+    return "'" + title.replace("'", "''") + "'"
+
+def as_cell(value) -> str:
+    """Значение так, как его вернёт values.get (FORMATTED_VALUE)"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    return str(value)
+
+class Sheet:
+    def __init__(self, sheet_id: int, title: str, index: int):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.index = index
+        self.rows: List[List[str]] = []
+        self.formats = 0
+
+    def properties(self) -> Dict:
+        return {
+            'sheetId': self.sheet_id,
+            'title': self.title,
+            'index': self.index,
+            'sheetType': 'GRID',
+            'gridProperties': {
+                'rowCount': max(1000, len(self.rows)),
+                'columnCount': max([DEFAULT_COLUMNS] + [len(row) for row in self.rows]),
+            },
+        }
+
+    def last_row(self) -> int:
+        for i in range(len(self.rows), 0, -1):
+            if any(self.rows[i - 1]):
+                return i
+        return 0
+
+    def write(self, row: int, column: int, values: List[List]):
+        for r, values_row in enumerate(values, row):
+            while len(self.rows) < r:
+                self.rows.append([])
+            cells = self.rows[r - 1]
+            for c, value in enumerate(values_row, column):
+                while len(cells) < c:
+                    cells.append('')
+                cells[c - 1] = as_cell(value)
+
+    def read(self, bounds: Tuple[int, int, int, int], major: str = 'ROWS') -> List[List[str]]:
+        first_row, first_col, last_row, last_col = bounds
+        grid = []
+        for r in range(first_row, min(last_row, len(self.rows)) + 1):
+            cells = self.rows[r - 1]
+            grid.append([cells[c - 1] if c <= len(cells) else '' for c in range(first_col, last_col + 1)])
+        if major == 'COLUMNS':
+            grid = [list(column) for column in zip(*grid)]
+        # Как и Google: без пустых хвостов строк и пустых строк в конце
+        grid = [row[:max((i + 1 for i, v in enumerate(row) if v), default=0)] for row in grid]
+        while grid and not grid[-1]:
+            grid.pop()
+        return grid
+
+class Spreadsheet:
+    def __init__(self, spreadsheet_id: str, title: str, sheet_name: str):
+        self.spreadsheet_id = spreadsheet_id
+        self.title = title
+        self.sheets: List[Sheet] = []
+        self._sheet_ids = itertools.count(0)
+        self.add_sheet(sheet_name)
+
+    def add_sheet(self, title: str) -> Sheet:
+        sheet = Sheet(next(self._sheet_ids), title, len(self.sheets))
+        self.sheets.append(sheet)
+        return sheet
+
+    def metadata(self) -> Dict:
+        return {
+            'spreadsheetId': self.spreadsheet_id,
+            'properties': {'title': self.title, 'locale': 'ru_RU', 'timeZone': 'Europe/Moscow'},
+            'sheets': [{'properties': sheet.properties()} for sheet in self.sheets],
+        }
+
+    def resolve(self, a1_range: str) -> Tuple[Sheet, Tuple[int, int, int, int]]:
+        """Лист и границы (строка, столбец, строка, столбец) диапазона в нотации A1"""
+        title, _, cells = a1_range.rpartition('!')
+        if not title:
+            # Только имя листа или только ячейки первого листа
+            if any(sheet.title == cells for sheet in self.sheets) or not _is_a1(cells):
+                title, cells = cells, ''
+        if title.startswith("'") and title.endswith("'"):
+            title = title[1:-1].replace("''", "'")
+        sheet = next((s for s in self.sheets if s.title == title), None) if title else self.sheets[0]
+        if sheet is None:
+            raise ApiError(400, f'Unable to parse range: {a1_range}')
+
+        max_row = max(len(sheet.rows), 1)
+        max_col = max([DEFAULT_COLUMNS] + [len(row) for row in sheet.rows])
+        if not cells:
+            return sheet, (1, 1, max_row, max_col)
+        start, _, end = cells.partition(':')
+        start_col, start_row = _CELL.match(start).groups()
+        bounds = [int(start_row or 1), column_number(start_col) if start_col else 1]
+        if end:
+            end_col, end_row = _CELL.match(end).groups()
+        else:
+            end_col, end_row = start_col, start_row
+        bounds.append(int(end_row) if end_row else max_row)
+        bounds.append(column_number(end_col) if end_col else max_col)
+        return sheet, tuple(bounds)
+
+def _is_a1(cells: str) -> bool:
+    return all(_CELL.match(part) and part for part in cells.split(':'))
+
+class FakeGoogle:
+    """Состояние стенда и разбор запросов; HTTP — в FakeGoogleServer"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, rate_limit: int = 0,
+                 rate_window: float = 60, fail_rate: float = 0, sheet_name: str = 'Заявки'):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Не больше rate_limit запросов за rate_window секунд (0 — без ограничения)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        # Доля запросов, получающих 429 случайно
+        self.fail_rate = fail_rate
+        self.sheet_name = sheet_name
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.calls = Counter()
+        self.throttled = 0
+        self.spreadsheets: Dict[str, Spreadsheet] = {}
+        self.files: Dict[str, Dict] = {}
+        self._uploads: Dict[str, Dict] = {}
+        self._ids = itertools.count(1)
+
+    # --- Квоты и статистика ---
+
+    def delay(self):
+        """Задержка ответа; выдерживается до разбора запроса, параллельные запросы ждут одновременно"""
+        seconds = (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    def admit(self, operation: str):
+        """Учесть запрос; ApiError(429), если квота исчерпана"""
+        with self._lock:
+            self.calls[operation] += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > self.rate_window:
+                self._recent.popleft()
+            limited = self.rate_limit and len(self._recent) >= self.rate_limit
+            if limited or (self.fail_rate and random.random() < self.fail_rate):
+                self.throttled += 1
+                raise ApiError(429, "Quota exceeded (fake rate limit)")
+            self._recent.append(now)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'total': sum(self.calls.values()), 'throttled': self.throttled, 'calls': dict(self.calls)}
+
+    def reset(self, data: bool = False):
+        with self._lock:
+            self.calls.clear()
+            self.throttled = 0
+            self._recent.clear()
+            if data:
+                self.spreadsheets.clear()
+                self.files.clear()
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}{next(self._ids):06d}"
+
+    def spreadsheet(self, spreadsheet_id: str) -> Spreadsheet:
+        if spreadsheet_id not in self.spreadsheets:
+            self.spreadsheets[spreadsheet_id] = Spreadsheet(spreadsheet_id, spreadsheet_id, self.sheet_name)
+        return self.spreadsheets[spreadsheet_id]
+
+    # --- Маршрутизация ---
+
+    def handle(self, method: str, path: str, query: Dict[str, str], body: bytes,
+               headers: Dict[str, str], base_url: str) -> Tuple[int, Dict, Dict]:
+        """(код, JSON ответа, доп. заголовки)"""
+        segments = [unquote(s) for s in path.strip('/').split('/')]
+
+        if segments[:2] == ['v4', 'spreadsheets'] and len(segments) > 2:
+            return self._sheets(method, segments[2:], query, _json(body))
+        if segments[:3] == ['drive', 'v3', 'files']:
+            return self._drive(method, segments[3:], query, _json(body), base_url)
+        if segments[:4] == ['upload', 'drive', 'v3', 'files']:
+            return self._upload(method, query, body, headers, base_url)
+        raise ApiError(404, f'Unknown endpoint: {method} {path}')
+
+    # --- Sheets v4 ---
+
+    def _sheets(self, method: str, segments: List[str], query: Dict, body: Dict):
+        head = segments[0]
+        if len(segments) == 1 and head.endswith(':batchUpdate') and method == 'POST':
+            self.admit('sheets.batchUpdate')
+            return self._batch_update(self.spreadsheet(head[:-len(':batchUpdate')]), body)
+        book = self.spreadsheet(head)
+        if len(segments) == 1 and method == 'GET':
+            self.admit('sheets.get')
+            return 200, book.metadata(), {}
+        if segments[1:] == ['values:batchUpdate'] and method == 'POST':
+            self.admit('sheets.values.batchUpdate')
+            responses = [self._write(book, item['range'], item.get('values', [])) for item in body.get('data', [])]
+            return 200, {
+                'spreadsheetId': book.spreadsheet_id,
+                'totalUpdatedRows': sum(r['updatedRows'] for r in responses),
+                'totalUpdatedCells': sum(r['updatedCells'] for r in responses),
+                'responses': responses,
+            }, {}
+        if len(segments) == 3 and segments[1] == 'values':
+            a1_range = segments[2]
+            if a1_range.endswith(':append') and method == 'POST':
+                self.admit('sheets.values.append')
+                return self._append(book, a1_range[:-len(':append')], body.get('values', []))
+            if method == 'GET':
+                self.admit('sheets.values.get')
+                sheet, bounds = book.resolve(a1_range)
+                major = query.get('majorDimension', 'ROWS')
+                result = {'range': _a1(sheet, bounds), 'majorDimension': major}
+                values = sheet.read(bounds, major)
+                if values:
+                    result['values'] = values
+                return 200, result, {}
+            if method == 'PUT':
+                self.admit('sheets.values.update')
+                return 200, self._write(book, a1_range, body.get('values', [])), {}
+        raise ApiError(404, f"Unknown Sheets call: {method} {'/'.join(segments)}")
+
+    def _write(self, book: Spreadsheet, a1_range: str, values: List[List]) -> Dict:
+        sheet, (row, column, _, _) = book.resolve(a1_range)
+        sheet.write(row, column, values)
+        width = max((len(r) for r in values), default=0)
+        last_row = row + max(len(values), 1) - 1
+        return {
+            'spreadsheetId': book.spreadsheet_id,
+            'updatedRange': _a1(sheet, (row, column, last_row, column + max(width, 1) - 1)),
+            'updatedRows': len(values),
+            'updatedColumns': width,
+            'updatedCells': sum(len(r) for r in values),
+        }
+
+    def _append(self, book: Spreadsheet, a1_range: str, values: List[List]):
+        sheet, (_, column, _, _) = book.resolve(a1_range)
+        first_row = sheet.last_row() + 1
+        sheet.write(first_row, column, values)
+        width = max((len(r) for r in values), default=0)
+        return 200, {
+            'spreadsheetId': book.spreadsheet_id,
+            'tableRange': _a1(sheet, (1, column, first_row - 1, column + max(width, 1) - 1)) if first_row > 1 else None,
+            'updates': {
+                'spreadsheetId': book.spreadsheet_id,
+                'updatedRange': _a1(sheet, (first_row, column, first_row + len(values) - 1, column + max(width, 1) - 1)),
+                'updatedRows': len(values),
+                'updatedColumns': width,
+                'updatedCells': sum(len(r) for r in values),
+            },
+        }, {}
+
+    def _batch_update(self, book: Spreadsheet, body: Dict):
+        replies = []
+        for request in body.get('requests', []):
+            kind = next(iter(request), '')
+            if kind == 'addSheet':
+                sheet = book.add_sheet(request['addSheet'].get('properties', {}).get('title', f'Sheet{len(book.sheets) + 1}'))
+                replies.append({'addSheet': {'properties': sheet.properties()}})
+                continue
+            if kind in ('repeatCell', 'updateCells', 'updateBorders'):
+                sheet_id = request[kind].get('range', {}).get('sheetId', 0)
+                sheet = next((s for s in book.sheets if s.sheet_id == sheet_id), None)
+                if sheet is None:
+                    raise ApiError(400, f'No grid with id: {sheet_id}')
+                sheet.formats += 1
+            replies.append({})
+        return 200, {'spreadsheetId': book.spreadsheet_id, 'replies': replies}, {}
+
+    # --- Drive v3 ---
+
+    def _create_file(self, metadata: Dict, content: bytes = b'') -> Dict:
+        file_id = self._new_id('file')
+        file = {
+            'kind': 'drive#file',
+            'id': file_id,
+            'name': metadata.get('name', 'Untitled'),
+            'mimeType': metadata.get('mimeType', 'application/octet-stream'),
+            'parents': metadata.get('parents', []),
+            'createdTime': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'webViewLink': f'https://drive.google.com/file/d/{file_id}/view',
+            'size': str(len(content)),
+        }
+        self.files[file_id] = file
+        if file['mimeType'] == SPREADSHEET_MIME:
+            # gspread создаёт таблицы через Drive
+            self.spreadsheets[file_id] = Spreadsheet(file_id, file['name'], 'Sheet1')
+        return file
+
+    def _drive(self, method: str, segments: List[str], query: Dict, body: Dict, base_url: str):
+        if not segments:
+            if method == 'POST':
+                self.admit('drive.files.create')
+                return 200, self._create_file(body), {}
+            if method == 'GET':
+                self.admit('drive.files.list')
+                files = list(self.files.values())
+                parent = re.search(r"'([^']+)' in parents", query.get('q', ''))
+                if parent:
+                    files = [f for f in files if parent.group(1) in f['parents']]
+                return 200, {'kind': 'drive#fileList', 'files': files}, {}
+        else:
+            file = self.files.get(segments[0])
+            if len(segments) == 2 and segments[1] == 'permissions' and method == 'POST':
+                self.admit('drive.permissions.create')
+                if file is None:
+                    raise ApiError(404, f'File not found: {segments[0]}')
+                return 200, {'kind': 'drive#permission', 'id': self._new_id('perm'), **body}, {}
+            if len(segments) == 1 and method == 'GET':
+                self.admit('drive.files.get')
+                if file is None:
+                    raise ApiError(404, f'File not found: {segments[0]}')
+                return 200, file, {}
+            if len(segments) == 1 and method == 'DELETE':
+                self.admit('drive.files.delete')
+                if self.files.pop(segments[0], None) is None:
+                    raise ApiError(404, f'File not found: {segments[0]}')
+                self.spreadsheets.pop(segments[0], None)
+                return 204, {}, {}
+        raise ApiError(404, f"Unknown Drive call: {method} files/{'/'.join(segments)}")
+
+    def _upload(self, method: str, query: Dict, body: bytes, headers: Dict[str, str], base_url: str):
+        upload_type = query.get('uploadType', 'media')
+        if upload_type == 'resumable' and 'upload_id' not in query:
+            self.admit('drive.files.upload')
+            upload_id = self._new_id('upload')
+            self._uploads[upload_id] = {'metadata': _json(body), 'content': b''}
+            location = f"{base_url}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+            return 200, {}, {'Location': location}
+        if upload_type == 'resumable':
+            # Куски сессии — тоже запросы к API
+            self.admit('drive.files.upload')
+            upload = self._uploads.get(query['upload_id'])
+            if upload is None:
+                raise ApiError(404, 'Upload session not found')
+            upload['content'] += body
+            total = _content_total(headers.get('Content-Range'))
+            if total is not None and len(upload['content']) < total:
+                return 308, {}, {'Range': f"bytes=0-{len(upload['content']) - 1}"}
+            del self._uploads[query['upload_id']]
+            return 200, self._create_file(upload['metadata'], upload['content']), {}
+
+        self.admit('drive.files.upload')
+        if upload_type == 'multipart':
+            message = email.parser.BytesParser().parsebytes(
+                f"Content-Type: {headers.get('Content-Type', '')}\r\n\r\n".encode() + body
+            )
+            parts = message.get_payload()
+            metadata = json.loads(parts[0].get_payload(decode=True) or b'{}')
+            content = parts[1].get_payload(decode=True) if len(parts) > 1 else b''
+            return 200, self._create_file(metadata, content), {}
+        return 200, self._create_file({}, body), {}
+
+def _json(body: bytes) -> Dict:
+    try:
+        return json.loads(body) if body else {}
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return {}
+
+def _a1(sheet: Sheet, bounds: Tuple[int, int, int, int]) -> str:
+    first_row, first_col, last_row, last_col = bounds
+    return f"{quote_title(sheet.title)}!{column_letters(first_col)}{first_row}:{column_letters(last_col)}{last_row}"
+
+def _content_total(content_range: Optional[str]) -> Optional[int]:
+    """Полный размер из 'bytes 0-99/1000'; None — неизвестен"""
+    match = re.search(r'/(\d+)$', content_range or '')
+    return int(match.group(1)) if match else None
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'FakeGoogle/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, code: int, payload: Dict, headers: Optional[Dict] = None):
+        data = b'' if code in (204, 308) and not payload else json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        fake: FakeGoogle = self.server.fake
+
+        if parts.path == '/_stats':
+            return self._send(200, fake.stats())
+        if parts.path == '/_reset':
+            fake.reset(data=query.get('data') == '1')
+            return self._send(200, fake.stats())
+
+        base_url = f"http://{self.headers.get('Host', '%s:%s' % self.server.server_address[:2])}"
+        fake.delay()
+        try:
+            with self.server.state_lock:
+                code, payload, headers = fake.handle(self.command, parts.path, query, body, self.headers, base_url)
+        except ApiError as e:
+            return self._send(e.code, e.payload())
+        except (ValueError, KeyError, AttributeError, IndexError) as e:
+            return self._send(400, ApiError(400, f'Bad request: {e}').payload())
+        self._send(code, payload, headers)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+class FakeGoogleServer:
+    """HTTP-сервер стенда в фоновом потоке (для тестов и замеров в одном процессе)"""
+
+    def __init__(self, fake: Optional[FakeGoogle] = None, host: str = '127.0.0.1', port: int = 0,
+                 verbose: bool = False):
+        self.fake = fake or FakeGoogle()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self.fake
+        self.httpd.verbose = verbose
+        # Данные стенда меняются по одному запросу за раз
+        self.httpd.state_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeGoogleServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-google', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный стенд Google Sheets v4 / Drive v3')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=0, help='задержка каждого ответа')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='случайная добавка к задержке')
+    parser.add_argument('--rate-limit', type=int, default=0, help='запросов за окно, дальше 429 (0 — без ограничения)')
+    parser.add_argument('--rate-window', type=float, default=60, help='окно ограничения, секунды')
+    parser.add_argument('--fail-rate', type=float, default=0, help='доля случайных ответов 429')
+    parser.add_argument('--sheet-name', default='Заявки', help='лист новой таблицы')
+    parser.add_argument('-v', '--verbose', action='store_true', help='печатать каждый запрос')
+    args = parser.parse_args()
+
+    fake = FakeGoogle(args.latency_ms, args.jitter_ms, args.rate_limit, args.rate_window,
+                      args.fail_rate, args.sheet_name)
+    server = FakeGoogleServer(fake, args.host, args.port, args.verbose)
+    print(f"Стенд Google API: {server.endpoint} (GOOGLE_API_ENDPOINT={server.endpoint})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(json.dumps(fake.stats(), ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
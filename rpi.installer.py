@@ -44,7 +44,7 @@ def main():
     requirements = [
         "python-telegram-bot==20.7",
         "APScheduler",
-        "pandas",
+        "numpy",
         "openpyxl"
     ]
     req_file = os.path.join(python_project_dir, "requirements.txt")